@@ -0,0 +1,152 @@
+"""
+HTTP API for the CRAG graph.
+
+One async graph, index and component pool are shared by every request a
+worker process serves. Scale out with more workers:
+
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+
+Endpoints:
+    POST /query         {"question": ...} -> the complete answer as JSON
+    POST /query/stream  {"question": ...} -> server-sent events: node, token, answer, trace
+    GET  /health        liveness, plus whether the index is loaded
+    GET  /metrics       Prometheus counters of this worker (?format=json for JSON)
+"""
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from openai import AuthenticationError, OpenAIError
+from pydantic import BaseModel, Field
+
+from src.components import get_retriever, grading_stats, index_registry, prompt_registry, speculation_stats
+from src.state.graph import astream_answer, build_async_graph, forget_thread, thread_config
+from src.utils.environment import setup_environment
+from src.utils.instrumentation import get_logger, metrics
+from src.utils.settings import get_bool, get_data_dir, get_int
+
+# Questions answered at once by one worker; the rest wait their turn
+API_MAX_CONCURRENCY = get_int("CRAG_API_MAX_CONCURRENCY", 32)
+# Build or load the index at startup instead of on the first question
+API_WARM_INDEX = get_bool("CRAG_API_WARM_INDEX", True)
+
+logger = get_logger(__name__)
+
+
+class QueryRequest(BaseModel):
+    question: str = Field(min_length=1)
+    # Conversation thread; a new one per request when omitted
+    thread_id: Optional[str] = None
+
+
+class QueryResponse(BaseModel):
+    question: str
+    answer: str
+    nodes: List[str]
+    seconds: float
+    # Per-node seconds, LLM calls, tokens, cost, cache hits and branch
+    trace: Dict[str, Any]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_environment()
+    app.state.graph, _, _ = build_async_graph()
+    app.state.slots = asyncio.Semaphore(API_MAX_CONCURRENCY)
+    if API_WARM_INDEX and any(get_data_dir().glob("*.pdf")):
+        try:
+            await asyncio.to_thread(get_retriever)
+        except Exception as e:
+            # Still serve; the index is built again on the first question
+            logger.warning(f"Index warm-up failed: {e}")
+    yield
+
+
+app = FastAPI(title="Corrective RAG", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "index": index_registry.fingerprint(),
+        "prompts": prompt_registry.versions(),
+    }
+
+
+@app.get("/metrics")
+async def get_metrics(format: str = "prometheus"):
+    """Counters of this worker process since it started."""
+    if format == "json":
+        return {
+            **metrics.snapshot(),
+            "grading": {k: v for k, v in vars(grading_stats).items() if not k.startswith("_")},
+            "speculation": {k: v for k, v in vars(speculation_stats).items() if not k.startswith("_")},
+        }
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/query", response_model=QueryResponse)
+async def query(request: QueryRequest):
+    started = time.perf_counter()
+    nodes, answer, trace = [], None, {}
+    config = thread_config(request.thread_id)
+    async with app.state.slots:
+        try:
+            async for kind, value in astream_answer(app.state.graph, request.question, config):
+                if kind == "node":
+                    nodes.append(value)
+                elif kind == "answer":
+                    answer = value
+                elif kind == "trace":
+                    trace = value
+        except AuthenticationError as e:
+            raise HTTPException(status_code=401, detail=f"API key validation failed: {e}")
+        except OpenAIError as e:
+            raise HTTPException(status_code=502, detail=f"OpenAI API error: {e}")
+        finally:
+            if request.thread_id is None:
+                forget_thread(app.state.graph, config)
+    return QueryResponse(
+        question=request.question,
+        answer=answer,
+        nodes=nodes,
+        seconds=round(time.perf_counter() - started, 3),
+        trace=trace,
+    )
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    async def events():
+        started = time.perf_counter()
+        config = thread_config(request.thread_id)
+        async with app.state.slots:
+            try:
+                async for kind, value in astream_answer(app.state.graph, request.question, config):
+                    if kind == "answer":
+                        yield _sse("answer", {"answer": value, "seconds": round(time.perf_counter() - started, 3)})
+                    elif kind == "trace":
+                        yield _sse("trace", value)
+                    else:
+                        yield _sse(kind, {kind: value})
+            except Exception as e:
+                # Headers are already sent; report the failure in the stream
+                yield _sse("error", {"error": str(e)})
+            finally:
+                if request.thread_id is None:
+                    forget_thread(app.state.graph, config)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,66 +1,56 @@
 import streamlit as st
 from pathlib import Path
 import os
-# Patch SQLite with pysqlite3
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-from langgraph.graph import END, StateGraph, START
-from langgraph.checkpoint.memory import MemorySaver
-from src.state.graph_state import (
-    GraphState,
-    retrieve,
-    generate,
-    grade_documents,
-    transform_query,
-    web_search,
-    decide_to_generate,
-)
+from src.state.graph import build_graph, stream_answer
 from src.utils.environment import setup_environment, set_env_st
+from src.utils.settings import get_data_dir
+from src.components import component_pool, get_retriever, index_registry
+from src.components.loader import MAX_FILES
 from openai import AuthenticationError, OpenAIError
 
-def build_graph():
-    """Build and compile the LangGraph."""
-    # Memory updates to langgraph: Need to convert to DSPy
-    memory = MemorySaver()
-    workflow = StateGraph(GraphState)
-    
-    # Define the nodes
-    workflow.add_node("retrieve", retrieve)
-    workflow.add_node("grade_documents", grade_documents)
-    workflow.add_node("generate", generate)
-    workflow.add_node("transform_query", transform_query)
-    workflow.add_node("web_search_node", web_search)
-    
-    # Build graph
-    workflow.add_edge(START, "retrieve")
-    workflow.add_edge("retrieve", "grade_documents")
-    workflow.add_conditional_edges(
-        "grade_documents",
-        decide_to_generate,
-        {
-            "transform_query": "transform_query",
-            "generate": "generate",
-        },
-    )
-    workflow.add_edge("transform_query", "web_search_node")
-    workflow.add_edge("web_search_node", "generate")
-    workflow.add_edge("generate", END)
-    
-    config = {"configurable": {"thread_id": 2}}
-    app = workflow.compile(checkpointer=memory)
-    
-    return app, config, memory
+# Workflow boxes: (graph node, CSS class, title, description)
+WORKFLOW_BOXES = [
+    ("retrieve", "process-box", "📚 Retrieve", "Extract relevant documents from the knowledge base"),
+    ("transform_query", "process-box", "❓ Query Processing", "Process and understand user query"),
+    ("grade_documents", "process-box", "🎯 Relevance Check", "Grade document relevance to query"),
+    ("web_search_node", "process-box process-box-websearch", "🌐 Web Search", "Search external sources if needed"),
+    ("generate", "process-box", "✨ Generate", "Create final response"),
+]
+
+def render_workflow(placeholder, active=None):
+    """Draw the workflow boxes, lighting up the node that is running"""
+    boxes = []
+    for node, css_class, title, description in WORKFLOW_BOXES:
+        if node == active:
+            css_class += " process-box-active"
+        boxes.append(
+            f'<div class="{css_class}">'
+            f'<div class="box-title">{title}</div>'
+            f'<div class="box-description">{description}</div>'
+            '</div>'
+        )
+    placeholder.markdown("\n".join(boxes), unsafe_allow_html=True)
 
-def stream_graph_updates(graph, user_input: str, config: dict):
-    """Stream graph updates and return the final response"""
+def stream_graph_updates(graph, user_input: str, config: dict, on_node=None, on_token=None, on_trace=None):
+    """Stream graph updates and return the final response
+
+    Args:
+        on_node: Called with the name of each node as it starts
+        on_token: Called with each token of the answer as it is generated
+        on_trace: Called with the question's trace once the graph ends
+    """
     try:
-        responses = []
-        for event in graph.stream({"question": user_input}, config=config):
-            for value in event.values():
-                response = value.get("generation", "No generation yet.")
-                responses.append(response)
-        return responses[-1] if responses else "No response generated."
+        response = "No response generated."
+        for kind, value in stream_answer(graph, user_input, config):
+            if kind == "node" and on_node is not None:
+                on_node(value)
+            elif kind == "token" and on_token is not None:
+                on_token(value)
+            elif kind == "answer":
+                response = value
+            elif kind == "trace" and on_trace is not None:
+                on_trace(value)
+        return response
         
     except AuthenticationError:
         st.error("API key validation failed during processing.")
@@ -189,7 +179,7 @@ def cleanup_data_folder(force=False):
     Args:
         force (bool): If True, removes all files without checking session state
     """
-    data_folder = Path("data")
+    data_folder = get_data_dir()
     if data_folder.exists():
         try:
             files_removed = []
@@ -213,7 +203,7 @@ def create_data_folder(clean=False):
     Args:
         clean (bool): If True, cleans existing files (default: False)
     """
-    data_folder = Path("data")
+    data_folder = get_data_dir()
     
     # Only create if it doesn't exist
     if not data_folder.exists():
@@ -273,6 +263,11 @@ def main():
 
     # Create three columns with specific ratios
     col1, sep1, col2, sep2, col3 = st.columns([1, 0.2, 4, 0.2, 1])
+
+    # Workflow boxes go first in the right column so they can light up while a prompt runs
+    with col3:
+        workflow_placeholder = st.empty()
+        render_workflow(workflow_placeholder)
     
     # Part 1: PDF Upload Section (Left)
     with col1:
@@ -297,10 +292,12 @@ def main():
                             except:
                                 pass
                             st.session_state.uploaded_files.remove(file_name)
+                            # Delete only this file's chunks from the index
+                            index_registry.remove_file(data_folder / file_name)
                             st.rerun()
 
             # File uploader
-            if len(st.session_state.uploaded_files) < 2:
+            if len(st.session_state.uploaded_files) < MAX_FILES:
                 uploaded_file = st.file_uploader(
                     "Choose PDF" if not st.session_state.uploaded_files else "Add another PDF",
                     type=['pdf'],
@@ -310,11 +307,20 @@ def main():
                 if uploaded_file is not None:
                     if uploaded_file.name not in st.session_state.uploaded_files:
                         if save_uploaded_file(uploaded_file, data_folder):
-                            st.session_state.uploaded_files.append(uploaded_file.name)
-                            st.success(f"File {uploaded_file.name} uploaded successfully!")
-                            st.rerun()
+                            file_path = data_folder / uploaded_file.name
+                            try:
+                                # Upsert only this file's chunks into the index
+                                index_registry.add_file(file_path)
+                            except Exception as e:
+                                # Unreadable PDF or failed embedding: keep it out of the corpus
+                                file_path.unlink(missing_ok=True)
+                                st.error(f"Could not index {uploaded_file.name}: {str(e)}")
+                            else:
+                                st.session_state.uploaded_files.append(uploaded_file.name)
+                                st.success(f"File {uploaded_file.name} uploaded successfully!")
+                                st.rerun()
             else:
-                st.warning("Maximum 2 files can be uploaded. Remove existing files to upload new ones.")
+                st.warning(f"Maximum {MAX_FILES} files can be uploaded. Remove existing files to upload new ones.")
             
             # API Key input
             st.session_state.api_key = st.text_input(
@@ -344,7 +350,12 @@ def main():
                             # Set up environment with API key
                             set_env_st("OPENAI_API_KEY", st.session_state.api_key.strip())
                             set_env_st("TAVILY_API_KEY", st.session_state.tavily_key.strip())
+                            # Chains and tools hold the keys they were built with
+                            component_pool.reload()
                             
+                            # Build the index up front so the first question doesn't pay for it
+                            get_retriever(data_folder)
+
                             # Initialize graph
                             st.session_state.graph, st.session_state.graph_config, st.session_state.memory = build_graph()
                             st.success("PDFs processed and graph initialized!")
@@ -407,14 +418,34 @@ def main():
             if st.session_state.graph is None:
                 st.error("Please process PDFs first!")
             else:
+                st.markdown("### Reply")
+                reply_placeholder = st.empty()
+                tokens = []
+
+                def show_token(token):
+                    # Show the answer as it is generated
+                    tokens.append(token)
+                    reply_placeholder.markdown("".join(tokens) + "▌")
+
+                def show_trace(trace):
+                    # Latency, LLM usage and route of this answer
+                    st.caption(
+                        f"{trace['seconds']:.2f}s · {trace['llm_calls']} LLM calls · "
+                        f"{trace['prompt_tokens'] + trace['completion_tokens']} tokens · "
+                        f"${trace['cost_usd']:.4f} · route: {trace['branch']}"
+                    )
+
                 with st.spinner("Generating response..."):
                     response = stream_graph_updates(
                         st.session_state.graph,
                         user_prompt,
-                        st.session_state.graph_config
+                        st.session_state.graph_config,
+                        on_node=lambda node: render_workflow(workflow_placeholder, node),
+                        on_token=show_token,
+                        on_trace=show_trace,
                     )
-                    st.markdown("### Reply")
-                    st.write(response)
+                    reply_placeholder.write(response)
+                    render_workflow(workflow_placeholder)
                     
                     # Add to chat history
                     st.session_state.chat_history.append({
@@ -441,46 +472,6 @@ def main():
 
     # Part 3: Worklow Section (Right)
     with col3:
-        # Retrieve Box
-        st.markdown("""
-            <div class="process-box">
-                <div class="box-title">📚 Retrieve</div>
-                <div class="box-description">Extract relevant documents from the knowledge base</div>
-            </div>
-        """, unsafe_allow_html=True)
-
-        # Query Box
-        st.markdown("""
-            <div class="process-box">
-                <div class="box-title">❓ Query Processing</div>
-                <div class="box-description">Process and understand user query</div>
-            </div>
-        """, unsafe_allow_html=True)
-
-        # Relevance Box
-        st.markdown("""
-            <div class="process-box">
-                <div class="box-title">🎯 Relevance Check</div>
-                <div class="box-description">Grade document relevance to query</div>
-            </div>
-        """, unsafe_allow_html=True)
-
-        # Web Search Box (Different Color)
-        st.markdown("""
-            <div class="process-box process-box-websearch">
-                <div class="box-title">🌐 Web Search</div>
-                <div class="box-description">Search external sources if needed</div>
-            </div>
-        """, unsafe_allow_html=True)
-
-        # Generate Box
-        st.markdown("""
-            <div class="process-box">
-                <div class="box-title">✨ Generate</div>
-                <div class="box-description">Create final response</div>
-            </div>
-        """, unsafe_allow_html=True)
-
         # Collapsible Workflow Description
         # Links in expander
         with st.expander("📑 References", expanded=False):
@@ -0,0 +1,163 @@
+"""
+Answer a JSONL file of questions with the CRAG graph.
+
+Each input line is {"question": ...}, optionally with an "id" (the line
+number otherwise). Each output line holds the id, question, answer, the
+nodes the question went through with their seconds, the LLM calls, tokens
+and estimated cost, the branch taken and the total seconds; failed
+questions get an "error" instead of an answer. Records are appended
+as questions finish, so the output file is also the checkpoint: running the
+same command again skips every id already answered and retries the failures.
+
+    python batch.py questions.jsonl answers.jsonl --workers 16
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+from src.components import get_retriever
+from src.state.graph import astream_answer, build_async_graph, forget_thread, thread_config
+from src.utils.environment import setup_environment
+
+
+def read_questions(path: Path) -> List[Dict[str, Any]]:
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            if not isinstance(record, dict):
+                # Kept, so the line gets an error record like any failed question
+                record = {}
+            record.setdefault("id", number)
+            questions.append(record)
+    return questions
+
+
+def answered_ids(path: Path) -> Set[str]:
+    """IDs answered in an earlier run of the same output file."""
+    done = set()
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line of an interrupted run
+                    continue
+                if "answer" in record:
+                    done.add(str(record["id"]))
+    return done
+
+
+async def answer(graph, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one question, with the node timings and usage of its trace."""
+    started = time.perf_counter()
+    result = {"id": record["id"], "question": record.get("question")}
+    trace: Dict[str, Any] = {}
+    config = thread_config()
+    try:
+        if not isinstance(result["question"], str) or not result["question"].strip():
+            raise ValueError('record has no "question"')
+        async for kind, value in astream_answer(graph, result["question"], config):
+            if kind == "answer":
+                result["answer"] = value
+            elif kind == "trace":
+                trace = value
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        forget_thread(graph, config)
+    result["timings"] = trace.get("nodes", {})
+    for key in ("llm_calls", "prompt_tokens", "completion_tokens", "embedding_tokens", "cost_usd", "branch", "trace_id"):
+        result[key] = trace.get(key)
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+async def run(questions: List[Dict[str, Any]], output: Path, workers: int, report_every: int) -> List[Dict[str, Any]]:
+    graph, _, _ = build_async_graph()
+    queue: asyncio.Queue = asyncio.Queue()
+    for record in questions:
+        queue.put_nowait(record)
+    results: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+
+    with open(output, "a", encoding="utf-8") as out:
+
+        async def worker():
+            while True:
+                try:
+                    record = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await answer(graph, record)
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                results.append(result)
+                if len(results) % report_every == 0:
+                    elapsed = time.perf_counter() - started
+                    print(f"{len(results)}/{len(questions)} done, {len(results) / elapsed:.2f} questions/s")
+
+        await asyncio.gather(*(worker() for _ in range(min(workers, len(questions)) or 1)))
+    return results
+
+
+def report(results: List[Dict[str, Any]], elapsed: float):
+    failed = [r for r in results if "error" in r]
+    latencies = sorted(r["seconds"] for r in results if "error" not in r)
+    print(f"{len(results) - len(failed)} answered, {len(failed)} failed in {elapsed:.1f}s")
+    if results:
+        print(f"Throughput: {len(results) / elapsed:.2f} questions/s")
+    if latencies:
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        print(f"Latency: mean {statistics.mean(latencies):.2f}s, p50 {statistics.median(latencies):.2f}s, p95 {p95:.2f}s")
+    tokens = sum((r.get("prompt_tokens") or 0) + (r.get("completion_tokens") or 0) for r in results)
+    cost = sum(r.get("cost_usd") or 0.0 for r in results)
+    print(f"LLM usage: {sum(r.get('llm_calls') or 0 for r in results)} calls, {tokens} tokens, ${cost:.4f}")
+    branches = Counter(r.get("branch") for r in results if "error" not in r)
+    print("Branches: " + ", ".join(f"{branch} {count}" for branch, count in branches.items()))
+    per_node = defaultdict(list)
+    for r in results:
+        for node, seconds in r["timings"].items():
+            per_node[node].append(seconds)
+    for node, seconds in per_node.items():
+        print(f"  {node:<18} {statistics.mean(seconds):>7.2f}s mean over {len(seconds)} runs")
+    for r in failed[:5]:
+        print(f"Failed {r['id']}: {r['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", type=Path, help="JSONL file of questions")
+    parser.add_argument("output", type=Path, help="JSONL file of answers, appended to and resumed from")
+    parser.add_argument("--workers", type=int, default=8, help="Questions answered at once")
+    parser.add_argument("--report-every", type=int, default=50, help="Print progress every N questions")
+    args = parser.parse_args()
+
+    setup_environment()
+    questions = read_questions(args.input)
+    done = answered_ids(args.output)
+    todo = [q for q in questions if str(q["id"]) not in done]
+    print(f"{len(questions)} questions, {len(questions) - len(todo)} already answered, {len(todo)} to go")
+    if not todo:
+        return
+
+    # Build or load the index once, before the workers start
+    get_retriever()
+    started = time.perf_counter()
+    results = asyncio.run(run(todo, args.output, args.workers, args.report_every))
+    report(results, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
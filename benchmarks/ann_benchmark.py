@@ -0,0 +1,72 @@
+"""
+Latency/recall trade-off of the IVF-PQ index against exact search.
+
+Builds a NumpyVectorStore over synthetic clustered embeddings, trains the
+approximate index once and sweeps nprobe and the re-rank depth, printing
+recall@k, mean query latency and index memory for each setting.
+
+    python benchmarks/ann_benchmark.py --chunks 200000 --dim 256 --nprobe 4,8,16,32
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.components.ann import IVFPQConfig  # noqa: E402
+from src.components.numpy_store import NumpyVectorStore  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--nprobe", default="4,8,16,32")
+    parser.add_argument("--rerank", default="0,4,16")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, args.clusters, args.chunks)]
+    vectors += 0.3 * rng.standard_normal(vectors.shape, dtype=np.float32)
+    queries = vectors[rng.integers(0, args.chunks, args.queries)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape, dtype=np.float32)
+
+    class LookupEmbeddings(Embeddings):
+        def embed_documents(self, texts):
+            return vectors[[int(text) for text in texts]]
+
+        def embed_query(self, text):
+            return vectors[int(text)]
+
+    store = NumpyVectorStore(LookupEmbeddings())
+    for offset in range(0, args.chunks, 10_000):
+        ids = [str(i) for i in range(offset, min(offset + 10_000, args.chunks))]
+        store.add_texts(ids, ids=ids)
+
+    config = IVFPQConfig(nlist=args.nlist, m=args.m, min_rows=0)
+    start = time.perf_counter()
+    index = store.build_ann_index(config)
+    print(f"{args.chunks} vectors x {args.dim} dims: built IVF-PQ "
+          f"(nlist={len(index.centroids)}, m={args.m}) in {time.perf_counter() - start:.1f}s, "
+          f"{index.memory_bytes() / 2**20:.1f} MB vs {args.chunks * args.dim * 4 / 2**20:.1f} MB of float32")
+
+    print(f"{'nprobe':>7} {'rerank':>7} {'recall@' + str(args.k):>10} {'ann ms':>8} {'exact ms':>9}")
+    for nprobe in map(int, args.nprobe.split(",")):
+        for rerank in map(int, args.rerank.split(",")):
+            config.nprobe, config.rerank = nprobe, rerank
+            r = store.evaluate_ann(queries, k=args.k)
+            print(f"{nprobe:>7} {rerank:>7} {r[f'recall@{args.k}']:>10.3f} {r['ann_ms']:>8.2f} {r['exact_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
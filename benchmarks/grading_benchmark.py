@@ -0,0 +1,96 @@
+"""
+Latency of document grading: one request after another, concurrent, and
+batch mode (several documents per request).
+
+Uses a fake grader LLM that sleeps ``--latency`` seconds per request (with
+some jitter, so requests finish out of order), and checks that concurrent and
+batch grading return the same scores in the same order as the sequential
+loop. The fake batch grader also pays ``--per-doc`` seconds per document.
+
+    python benchmarks/grading_benchmark.py --docs 4 --latency 0.8 --concurrency 1,2,4,8
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+from langchain.schema import Document
+from langchain_core.runnables import RunnableLambda
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.components.grader import GradeDocuments, GradeDocumentsBatch, grade_all  # noqa: E402
+
+
+def fake_grader(latency: float, seed: int = 0):
+    """Grader chain whose LLM call is a sleep; relevance is a hash of the document."""
+
+    def grade(inputs):
+        document = inputs["document"]
+        time.sleep(latency * random.Random(document).uniform(0.5, 1.5))
+        return GradeDocuments(binary_score=score_of(document, seed))
+
+    return RunnableLambda(grade)
+
+
+def fake_batch_grader(latency: float, per_doc: float, seed: int = 0):
+    """Batch grader chain answering for every numbered document in one sleep."""
+
+    def grade(inputs):
+        documents = [part.split("\n", 1)[1] for part in inputs["documents"].split("\n\n")]
+        time.sleep(latency + per_doc * len(documents))
+        return GradeDocumentsBatch(scores=[GradeDocuments(binary_score=score_of(d, seed)) for d in documents])
+
+    return RunnableLambda(grade)
+
+
+def score_of(document: str, seed: int) -> str:
+    return "yes" if random.Random(seed + hash(document)).random() < 0.7 else "no"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.8, help="Seconds per grader request")
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    parser.add_argument("--per-doc", type=float, default=0.05, help="Extra seconds per document in a batch request")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    documents = [Document(page_content=f"Document {i} about topic {i % 3}") for i in range(args.docs)]
+    question = "What is topic 1 about?"
+    grader = fake_grader(args.latency)
+
+    start = time.perf_counter()
+    expected = [
+        grader.invoke({"question": question, "document": d.page_content}).binary_score
+        for d in documents
+    ]
+    sequential = time.perf_counter() - start
+
+    print(f"{args.docs} documents, {args.latency:.2f}s per request")
+    print(f"{'mode':<16}{'seconds':>10}{'speedup':>10}")
+    print(f"{'sequential loop':<16}{sequential:>10.2f}{1.0:>9.1f}x")
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            scores = grade_all(grader, question, documents, max_concurrency=concurrency)
+            timings.append(time.perf_counter() - start)
+            if scores != expected:
+                print(f"WARNING: concurrency {concurrency} returned {scores}, expected {expected}")
+        best = min(timings)
+        print(f"{f'concurrent ({concurrency})':<16}{best:>10.2f}{sequential / best:>9.1f}x")
+
+    batch_grader = fake_batch_grader(args.latency, args.per_doc)
+    start = time.perf_counter()
+    scores = grade_all(grader, question, documents, batch_grader=batch_grader)
+    elapsed = time.perf_counter() - start
+    if scores != expected:
+        print(f"WARNING: batch mode returned {scores}, expected {expected}")
+    print(f"{'batch':<16}{elapsed:>10.2f}{sequential / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
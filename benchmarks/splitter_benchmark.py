@@ -0,0 +1,101 @@
+"""
+Throughput of the cached token splitter against the stock tiktoken splitter.
+
+Splits a fixed synthetic corpus (or the PDFs of a directory) with
+``RecursiveCharacterTextSplitter.from_tiktoken_encoder`` and with
+``create_text_splitter``, checks both produce the same chunks and prints
+chunks per second. The cached splitter is timed cold (empty token cache) and
+warm (re-splitting the same text, as when an index is rebuilt).
+
+    python benchmarks/splitter_benchmark.py --pages 2000 --chunk-size 250
+    python benchmarks/splitter_benchmark.py --data-dir data
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.components.splitter import (  # noqa: E402
+    SPLITTER_ENCODING,
+    CachedTokenTextSplitter,
+    TokenCounter,
+    get_encoding,
+)
+
+
+def synthetic_pages(n_pages: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 10)))
+        for _ in range(5000)
+    ]
+    pages = []
+    for page in range(n_pages):
+        paragraphs = []
+        for _ in range(rng.randint(3, 8)):
+            sentences = [
+                " ".join(rng.choice(vocabulary) for _ in range(rng.randint(5, 25))).capitalize() + "."
+                for _ in range(rng.randint(2, 10))
+            ]
+            paragraphs.append(" ".join(sentences))
+        pages.append(Document(page_content="\n\n".join(paragraphs), metadata={"page": page}))
+    return pages
+
+
+def pdf_pages(data_dir: Path):
+    from src.components.loader import load_pdfs
+
+    result = load_pdfs(sorted(Path(data_dir).glob("*.pdf")))
+    return [page for pages in result.pages.values() for page in pages]
+
+
+def timed(splitter, pages):
+    start = time.perf_counter()
+    chunks = splitter.split_documents(pages)
+    return chunks, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--data-dir", type=Path, default=None)
+    parser.add_argument("--chunk-size", type=int, default=250)
+    parser.add_argument("--chunk-overlap", type=int, default=0)
+    args = parser.parse_args()
+
+    pages = pdf_pages(args.data_dir) if args.data_dir else synthetic_pages(args.pages)
+    characters = sum(len(page.page_content) for page in pages)
+    print(f"{len(pages)} pages, {characters / 1e6:.1f}M characters, encoding {SPLITTER_ENCODING}")
+
+    stock = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=SPLITTER_ENCODING,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+    )
+    cached = CachedTokenTextSplitter(
+        TokenCounter(get_encoding(SPLITTER_ENCODING)),
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+    )
+
+    expected, stock_time = timed(stock, pages)
+    cold, cold_time = timed(cached, pages)
+    warm, warm_time = timed(cached, pages)
+
+    for name, chunks in (("cold", cold), ("warm", warm)):
+        if [c.page_content for c in chunks] != [c.page_content for c in expected]:
+            print(f"WARNING: cached splitter ({name}) produced different chunks")
+
+    print(f"{'splitter':<16}{'seconds':>10}{'chunks/s':>12}{'speedup':>10}")
+    for name, seconds in (("from_tiktoken", stock_time), ("cached (cold)", cold_time), ("cached (warm)", warm_time)):
+        print(f"{name:<16}{seconds:>10.2f}{len(expected) / seconds:>12.0f}{stock_time / seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Concurrent URL loading against a local aiohttp server.
+
+Serves ``--pages`` pages from 127.0.0.1, reached under two host names
+(``127.0.0.1`` and ``localhost``) so the per-host limit can be observed. Each
+answer takes ``--latency`` seconds. Pages carry an ETag, except every
+``--no-validator``-th one. The benchmark fetches everything twice: cold, then
+again revalidating from the cache. It prints the wall time, the 200 and 304
+answers and the most requests the server saw in flight for one host. It
+checks that the second run was answered with 304s and that no host went
+over ``--per-host``.
+
+    python benchmarks/url_loader_benchmark.py --pages 200 --latency 0.05 --per-host 4
+"""
+import argparse
+import asyncio
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.components.url_loader import FetchStats, iter_urls  # noqa: E402
+from src.utils.disk_cache import DiskCache  # noqa: E402
+
+
+class PageServer:
+    """Counts requests in flight per Host header and answers conditional GETs."""
+
+    def __init__(self, latency: float, no_validator: int):
+        self.latency = latency
+        self.no_validator = no_validator
+        self.in_flight = defaultdict(int)
+        self.max_in_flight = defaultdict(int)
+        self.status = defaultdict(int)
+
+    async def page(self, request: web.Request) -> web.Response:
+        host = request.host.split(":")[0]
+        number = int(request.match_info["number"])
+        self.in_flight[host] += 1
+        self.max_in_flight[host] = max(self.max_in_flight[host], self.in_flight[host])
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight[host] -= 1
+        etag = None if self.no_validator and number % self.no_validator == 0 else f'"v{number}"'
+        if etag is not None and request.headers.get("If-None-Match") == etag:
+            self.status[304] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        self.status[200] += 1
+        body = f"<html><head><title>Page {number}</title></head><body><p>Text of page {number}.</p></body></html>"
+        headers = {"ETag": etag} if etag is not None else {}
+        return web.Response(text=body, content_type="text/html", headers=headers)
+
+
+@contextmanager
+def serve(server: PageServer):
+    """Run ``server`` on a free port of 127.0.0.1 in a background thread; yields the port."""
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_get("/page/{number}", server.page)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield port
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+
+
+def fetch(urls, concurrency: int, per_host: int, cache: DiskCache):
+    stats = FetchStats()
+    start = time.perf_counter()
+    pages = list(iter_urls(urls, max_workers=concurrency, per_host=per_host, cache=cache, stats=stats))
+    return pages, stats, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--per-host", type=int, default=4)
+    parser.add_argument("--no-validator", type=int, default=10)
+    args = parser.parse_args()
+
+    server = PageServer(args.latency, args.no_validator)
+    cache_dir = Path(tempfile.mkdtemp())
+    try:
+        cache = DiskCache(cache_dir / "http.sqlite")
+        with serve(server) as port:
+            hosts = ("127.0.0.1", "localhost")
+            urls = [f"http://{hosts[number % 2]}:{port}/page/{number}" for number in range(args.pages)]
+            print(f"{len(urls)} pages, {args.latency * 1000:.0f} ms each, "
+                  f"concurrency {args.concurrency}, {args.per_host} per host")
+            print(f"{'run':<12}{'seconds':>10}{'200':>8}{'304':>8}{'failed':>8}{'max/host':>10}")
+            for run in ("cold", "revalidate"):
+                server.status.clear()
+                server.max_in_flight.clear()
+                pages, stats, seconds = fetch(urls, args.concurrency, args.per_host, cache)
+                most = max(server.max_in_flight.values())
+                print(f"{run:<12}{seconds:>10.2f}{server.status[200]:>8}{server.status[304]:>8}"
+                      f"{stats.failed:>8}{most:>10}")
+                if most > args.per_host:
+                    print(f"WARNING: {most} requests in flight for one host, limit {args.per_host}")
+                if len(pages) != len(urls):
+                    print(f"WARNING: {len(pages)} of {len(urls)} pages returned")
+            unvalidated = len(range(0, args.pages, args.no_validator)) if args.no_validator else 0
+            expected = len(urls) - unvalidated
+            if server.status[304] != expected:
+                print(f"WARNING: {server.status[304]} pages revalidated with 304, expected {expected}")
+        cache.close()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
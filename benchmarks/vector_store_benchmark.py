@@ -0,0 +1,113 @@
+"""
+Compare the vector-store backends on build time, query latency and memory.
+
+Each backend runs in its own subprocess so resident memory is measured in
+isolation. Embeddings are synthetic (random unit vectors looked up by chunk
+number), so the numbers reflect the stores themselves and no API calls are
+made.
+
+    python benchmarks/vector_store_benchmark.py --chunks 20000 --dim 1536
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (Linux), falling back to peak RSS."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_backend(backend: str, chunks: int, dim: int, queries: int, k: int, batch_size: int) -> dict:
+    import numpy as np
+    from langchain_core.embeddings import Embeddings
+
+    from src.components.vector_store import create_vectorstore
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((chunks, dim), dtype=np.float32)
+    query_vectors = rng.standard_normal((queries, dim), dtype=np.float32)
+
+    class LookupEmbeddings(Embeddings):
+        def embed_documents(self, texts):
+            return vectors[[int(text.split()[1]) for text in texts]].tolist()
+
+        def embed_query(self, text):
+            return query_vectors[int(text.split()[1])].tolist()
+
+    baseline = rss_mb()
+    store = create_vectorstore(LookupEmbeddings(), backend=backend)
+
+    start = time.perf_counter()
+    for offset in range(0, chunks, batch_size):
+        ids = [str(i) for i in range(offset, min(offset + batch_size, chunks))]
+        store.add_texts([f"chunk {i}" for i in ids], ids=ids)
+    build_s = time.perf_counter() - start
+    built = rss_mb()
+
+    latencies = []
+    for i in range(queries):
+        start = time.perf_counter()
+        store.similarity_search_by_vector(query_vectors[i].tolist(), k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    return {
+        "backend": backend,
+        "build_s": round(build_s, 3),
+        "query_p50_ms": round(statistics.median(latencies), 3),
+        "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "rss_index_mb": round(built - baseline, 1),
+        "rss_total_mb": round(built, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="numpy,chroma")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--run-backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_backend:
+        result = run_backend(args.run_backend, args.chunks, args.dim, args.queries, args.k, args.batch_size)
+        print(json.dumps(result))
+        return
+
+    print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries, k={args.k}")
+    print(f"{'backend':<8} {'build s':>9} {'p50 ms':>9} {'p95 ms':>9} {'index MB':>9} {'RSS MB':>9}")
+    for backend in args.backends.split(","):
+        cmd = [
+            sys.executable, __file__, "--run-backend", backend,
+            "--chunks", str(args.chunks), "--dim", str(args.dim),
+            "--queries", str(args.queries), "--k", str(args.k),
+            "--batch-size", str(args.batch_size),
+        ]
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{r['backend']:<8} {r['build_s']:>9} {r['query_p50_ms']:>9} "
+            f"{r['query_p95_ms']:>9} {r['rss_index_mb']:>9} {r['rss_total_mb']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,98 @@
+from .embeddings import CachedEmbeddings, create_embeddings
 from .retriever import create_index, create_index_URL
-from .grader import GradeDocuments, create_grader
+from .splitter import CachedTokenTextSplitter, TokenCounter, create_text_splitter
+from .ann import IVFPQConfig, IVFPQIndex, recall_at_k
+from .numpy_store import NumpyVectorStore
+from .bm25 import BM25Index, reciprocal_rank_fusion
+from .hybrid import HybridRetriever
+from .query_cache import CachedRetriever, SemanticQueryCache
+from .vector_store import create_vectorstore, register_backend
+from .loader import LoadFailure, LoadResult, load_pdfs
+from .ingest import IngestProgress, IngestReport, ingest
+from .url_loader import FetchStats, iter_urls
+from .incremental_index import IncrementalIndex, create_incremental_index
+from .index_registry import (
+    IndexRegistry,
+    corpus_fingerprint,
+    get_retriever,
+    index_registry,
+    invalidate_index
+)
+from .grader import (
+    CachedGrader,
+    GradeDocuments,
+    GradeDocumentsBatch,
+    agrade_all,
+    create_grader,
+    grade_all,
+    grading_stats
+)
+from .context import PackedContext, pack_context
 from .generator import create_chain
 from .rewriter import create_rewriter
-from .search import create_search_tool
+from .search import asearch_web, create_search_tool, search_web
+from .speculation import Speculation, speculation_stats
+from .answer_cache import AnswerCache, CachedAnswer, get_answer_cache
+from .prompts import PromptRegistry, PromptSpec, get_prompt, prompt_registry
+from .pool import ComponentPool, component_pool
 
 __all__ = [
+    'CachedEmbeddings',
+    'create_embeddings',
     'create_index',
     'create_index_URL',
+    'CachedTokenTextSplitter',
+    'TokenCounter',
+    'create_text_splitter',
+    'IVFPQConfig',
+    'IVFPQIndex',
+    'recall_at_k',
+    'NumpyVectorStore',
+    'BM25Index',
+    'reciprocal_rank_fusion',
+    'HybridRetriever',
+    'CachedRetriever',
+    'SemanticQueryCache',
+    'create_vectorstore',
+    'register_backend',
+    'LoadFailure',
+    'LoadResult',
+    'load_pdfs',
+    'IngestProgress',
+    'IngestReport',
+    'ingest',
+    'FetchStats',
+    'iter_urls',
+    'IncrementalIndex',
+    'create_incremental_index',
+    'IndexRegistry',
+    'index_registry',
+    'corpus_fingerprint',
+    'get_retriever',
+    'invalidate_index',
+    'CachedGrader',
     'GradeDocuments',
+    'GradeDocumentsBatch',
+    'agrade_all',
     'create_grader',
+    'grade_all',
+    'grading_stats',
+    'PackedContext',
+    'pack_context',
     'create_chain',
     'create_rewriter',
-    'create_search_tool'
+    'create_search_tool',
+    'search_web',
+    'asearch_web',
+    'Speculation',
+    'speculation_stats',
+    'AnswerCache',
+    'CachedAnswer',
+    'get_answer_cache',
+    'PromptRegistry',
+    'PromptSpec',
+    'get_prompt',
+    'prompt_registry',
+    'ComponentPool',
+    'component_pool'
 ]
\ No newline at end of file
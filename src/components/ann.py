@@ -0,0 +1,222 @@
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.utils.settings import get_int
+
+
+@dataclass
+class IVFPQConfig:
+    """
+    Settings of the IVF-PQ approximate index.
+
+    Attributes:
+        nlist: Number of coarse clusters (inverted lists); 0 picks sqrt(n)
+        m: Number of PQ sub-quantizers; each vector is stored in ``m`` bytes
+        nprobe: Lists scanned per query; higher is slower and more accurate
+        rerank: Candidates per requested result re-scored with the exact
+            vectors (0 disables re-ranking and keeps only PQ scores)
+        train_size: Vectors sampled to train the quantizers
+        iterations: k-means iterations
+        min_rows: Build the index automatically once the store holds this many
+            vectors; below it exact search is fast enough
+    """
+
+    nlist: int = get_int("CRAG_ANN_NLIST", 0)
+    m: int = get_int("CRAG_ANN_M", 16)
+    nprobe: int = get_int("CRAG_ANN_NPROBE", 16)
+    rerank: int = get_int("CRAG_ANN_RERANK", 16)
+    train_size: int = get_int("CRAG_ANN_TRAIN_SIZE", 32768)
+    iterations: int = get_int("CRAG_ANN_ITERATIONS", 10)
+    min_rows: int = get_int("CRAG_ANN_MIN_ROWS", 100_000)
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Plain Lloyd k-means with squared L2 distance; returns the centroids."""
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = nearest(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty clusters from random points
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def nearest(x: np.ndarray, centroids: np.ndarray, batch: int = 16384) -> np.ndarray:
+    """Index of the nearest centroid (squared L2) for each row of ``x``."""
+    norms = (centroids ** 2).sum(1)
+    out = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), batch):
+        block = x[start:start + batch]
+        out[start:start + batch] = np.argmin(norms[None, :] - 2 * block @ centroids.T, axis=1)
+    return out
+
+
+class IVFPQIndex:
+    """
+    Inverted-file index with product-quantized residuals (IVF-PQ).
+
+    Vectors are assigned to the nearest of ``nlist`` coarse centroids and the
+    residual to that centroid is compressed to ``m`` one-byte codes. A query
+    scans only the ``nprobe`` closest lists and scores candidates with
+    per-query lookup tables, so memory per vector drops from ``4 * dim``
+    bytes to ``m`` bytes and query cost scales with ``nprobe / nlist``.
+
+    Scores approximate inner products, which equal cosine similarity for the
+    normalised vectors kept by NumpyVectorStore.
+    """
+
+    def __init__(self, config: IVFPQConfig):
+        self.config = config
+        self.centroids: Optional[np.ndarray] = None  # (nlist, dim)
+        self.codebooks: Optional[np.ndarray] = None  # (m, 256, dim / m)
+        # Entries sorted by list: list_offsets[i]:list_offsets[i + 1] is list i
+        self.list_offsets = np.zeros(1, dtype=np.int64)
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.codes = np.zeros((0, config.m), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the index itself (excludes the full vectors)."""
+        arrays = [self.centroids, self.codebooks, self.list_offsets, self.rows, self.codes]
+        return int(sum(a.nbytes for a in arrays if a is not None))
+
+    def _sub_dim(self, dim: int) -> int:
+        if dim % self.config.m:
+            raise ValueError(f"Embedding size {dim} is not divisible by m={self.config.m}")
+        return dim // self.config.m
+
+    def train(self, vectors: np.ndarray, seed: int = 0):
+        """Train the coarse quantizer and the PQ codebooks on a sample."""
+        rng = np.random.default_rng(seed)
+        if len(vectors) > self.config.train_size:
+            vectors = vectors[np.sort(rng.choice(len(vectors), self.config.train_size, replace=False))]
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        sub = self._sub_dim(vectors.shape[1])
+
+        nlist = self.config.nlist or int(np.clip(np.sqrt(len(vectors)), 1, 4096))
+        self.centroids = kmeans(vectors, nlist, self.config.iterations, rng)
+
+        residuals = vectors - self.centroids[nearest(vectors, self.centroids)]
+        self.codebooks = np.stack([
+            kmeans(residuals[:, j * sub:(j + 1) * sub], 256, self.config.iterations, rng)
+            for j in range(self.config.m)
+        ])
+        if self.codebooks.shape[1] < 256:
+            # Tiny training sets: pad so every code indexes a valid entry
+            pad = np.zeros((self.config.m, 256 - self.codebooks.shape[1], sub), dtype=np.float32)
+            self.codebooks = np.concatenate([self.codebooks, pad], axis=1)
+
+    def _encode(self, vectors: np.ndarray, assign: np.ndarray) -> np.ndarray:
+        sub = self.codebooks.shape[2]
+        residuals = vectors - self.centroids[assign]
+        codes = np.empty((len(vectors), self.config.m), dtype=np.uint8)
+        for j in range(self.config.m):
+            codes[:, j] = nearest(residuals[:, j * sub:(j + 1) * sub], self.codebooks[j])
+        return codes
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray, batch: int = 65536):
+        """Encode ``vectors`` and file them under their store row numbers."""
+        lists, codes = [], []
+        for start in range(0, len(vectors), batch):
+            block = np.ascontiguousarray(vectors[start:start + batch], dtype=np.float32)
+            assign = nearest(block, self.centroids)
+            lists.append(assign)
+            codes.append(self._encode(block, assign))
+
+        old_lists = np.repeat(np.arange(len(self.centroids)), np.diff(self.list_offsets)) \
+            if len(self.rows) else np.zeros(0, dtype=np.int64)
+        all_lists = np.concatenate([old_lists] + lists)
+        all_rows = np.concatenate([self.rows, np.asarray(rows, dtype=np.int64)])
+        all_codes = np.concatenate([self.codes] + codes)
+
+        order = np.argsort(all_lists, kind="stable")
+        self.rows = all_rows[order]
+        self.codes = all_codes[order]
+        counts = np.bincount(all_lists, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def search(self, query: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k by inner product.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Store row numbers and approximate
+                scores, best first
+        """
+        nprobe = min(nprobe or self.config.nprobe, len(self.centroids))
+        coarse = self.centroids @ query
+        probe = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+
+        sub = self.codebooks.shape[2]
+        # lut[j, c]: contribution of code c in sub-space j to the inner product
+        lut = np.einsum("jcd,jd->jc", self.codebooks, query.reshape(self.config.m, sub))
+
+        spans = [(self.list_offsets[i], self.list_offsets[i + 1]) for i in probe]
+        index = np.concatenate([np.arange(a, b) for a, b in spans]) if spans else np.zeros(0, dtype=np.int64)
+        if len(index) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        base = np.concatenate([np.full(b - a, coarse[i], dtype=np.float32) for i, (a, b) in zip(probe, spans)])
+        scores = base + lut[np.arange(self.config.m), self.codes[index]].sum(axis=1)
+
+        k = min(k, len(index))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return self.rows[index[top]], scores[top]
+
+    def remap(self, mapping: np.ndarray):
+        """
+        Renumber store rows (``mapping[old] = new``, -1 for dropped rows), as
+        done when the store compacts deleted rows on save.
+        """
+        new_rows = mapping[self.rows]
+        keep = new_rows >= 0
+        lists = np.repeat(np.arange(len(self.centroids)), np.diff(self.list_offsets))[keep]
+        self.rows = new_rows[keep]
+        self.codes = self.codes[keep]
+        counts = np.bincount(lists, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def save(self, path: Path):
+        np.savez(
+            path,
+            centroids=self.centroids,
+            codebooks=self.codebooks,
+            list_offsets=self.list_offsets,
+            rows=self.rows,
+            codes=self.codes,
+            config=np.array([list(asdict(self.config).values())], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFPQIndex":
+        data = np.load(path)
+        config = IVFPQConfig(*data["config"][0].tolist())
+        index = cls(config)
+        index.centroids = data["centroids"]
+        index.codebooks = data["codebooks"]
+        index.list_offsets = data["list_offsets"]
+        index.rows = data["rows"]
+        index.codes = data["codes"]
+        return index
+
+
+def recall_at_k(approx: np.ndarray, exact: np.ndarray) -> float:
+    """Fraction of the exact top-k results that the approximate search found."""
+    if len(exact) == 0:
+        return 1.0
+    return len(np.intersect1d(approx, exact)) / len(exact)
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.utils.disk_cache import CacheStats, DiskCache
+from src.utils.instrumentation import record_cache
+from src.utils.settings import get_bool, get_cache_dir, get_float, get_int
+
+from .context import CONTEXT_TOKENS
+from .embeddings import EMBEDDING_MODEL
+from .generator import GENERATOR_MODEL
+from .grader import GRADER_MODEL, normalize_question
+from .hybrid import RETRIEVAL_K, RETRIEVAL_MODE
+from .index_registry import index_registry
+from .prompts import prompt_registry
+from .query_cache import SemanticQueryCache
+
+ANSWER_CACHE = get_bool("CRAG_ANSWER_CACHE", True)
+ANSWER_CACHE_SIZE = get_int("CRAG_ANSWER_CACHE_SIZE", 10_000)
+# Entry lifetime in seconds (0 = no expiry); web results go stale, so keep it bounded
+ANSWER_CACHE_TTL = get_float("CRAG_ANSWER_CACHE_TTL", 24 * 3600.0)
+# Also serve questions whose embedding is this close to a cached question's
+ANSWER_CACHE_SEMANTIC = get_bool("CRAG_ANSWER_CACHE_SEMANTIC", False)
+ANSWER_CACHE_THRESHOLD = get_float("CRAG_ANSWER_CACHE_THRESHOLD", 0.97)
+
+_caches: Dict[str, "AnswerCache"] = {}
+
+
+@dataclass
+class CachedAnswer:
+    """An answer served from the cache and the chunks it was generated from."""
+
+    question: str
+    answer: str
+    documents: List[str] = field(default_factory=list)
+    created: float = 0.0
+    similarity: float = 1.0
+
+
+def settings_key() -> str:
+    """Everything besides the corpus that changes the answer to a question."""
+    return json.dumps(
+        {
+            "generator": GENERATOR_MODEL,
+            "grader": GRADER_MODEL,
+            "embedding": EMBEDDING_MODEL,
+            "prompts": prompt_registry.versions(),
+            "context_tokens": CONTEXT_TOKENS,
+            "retrieval": [RETRIEVAL_MODE, RETRIEVAL_K],
+        },
+        sort_keys=True,
+    )
+
+
+def corpus_version(data_dir: Optional[Path] = None) -> Optional[str]:
+    """Fingerprint of the indexed corpus, syncing the index first."""
+    index_registry.get_index(data_dir)
+    return index_registry.fingerprint(data_dir)
+
+
+class AnswerCache:
+    """
+    Cache of final answers in front of the compiled graph.
+
+    Answers are stored in a SQLite DiskCache under the sha256 of the corpus
+    fingerprint, the model and pipeline settings (``settings_key``) and the
+    normalised question, so adding a PDF, switching models or editing a
+    prompt never serves an old answer. Each entry holds the answer and the
+    IDs of the chunks it was generated from.
+
+    With ``semantic`` on, question embeddings are also kept in an in-memory
+    SemanticQueryCache, and a question within ``threshold`` cosine similarity
+    of a cached one gets its answer. The exact-match entries survive a
+    restart; the semantic index is rebuilt as questions are answered again.
+
+    Args:
+        cache (DiskCache): Where answers are stored
+        semantic (bool): Also match questions by embedding
+        threshold (float): Minimum cosine similarity for a semantic hit
+    """
+
+    def __init__(self, cache: DiskCache, semantic: bool = ANSWER_CACHE_SEMANTIC, threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.cache = cache
+        self.semantic = semantic
+        self.stats = CacheStats()
+        self._questions = SemanticQueryCache(threshold=threshold, ttl=None) if semantic else None
+
+    @staticmethod
+    def _key(question: str, version: str) -> str:
+        raw = f"{version}\0{normalize_question(question)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def version(data_dir: Optional[Path] = None) -> str:
+        return f"{corpus_version(data_dir)}\0{settings_key()}"
+
+    @staticmethod
+    def _embed(question: str, data_dir: Optional[Path]):
+        return index_registry.get_index(data_dir).vectorstore.embeddings.embed_query(question)
+
+    def _load(self, key: str) -> Optional[CachedAnswer]:
+        blob = self.cache.get(key)
+        if blob is None:
+            return None
+        return CachedAnswer(**json.loads(blob))
+
+    def lookup(
+        self, question: str, data_dir: Optional[Path] = None, version: Optional[str] = None
+    ) -> Optional[CachedAnswer]:
+        """
+        Return the cached answer for ``question``, or None.
+
+        Pass the ``version`` taken before running the graph to ``store`` as
+        well, so the answer is filed under the corpus it was generated from.
+        """
+        version = version or self.version(data_dir)
+        hit = self._load(self._key(question, version))
+        if hit is None and self._questions is not None:
+            match = self._questions.lookup(self._embed(question, data_dir), version)
+            if match is not None:
+                keys, _, similarity = match
+                hit = self._load(keys[0])
+                if hit is not None:
+                    hit.similarity = similarity
+        self.stats.record(hits=int(hit is not None), misses=int(hit is None))
+        record_cache("answer", hits=int(hit is not None), misses=int(hit is None))
+        return hit
+
+    def store(
+        self,
+        question: str,
+        answer: str,
+        documents: List[str],
+        data_dir: Optional[Path] = None,
+        version: Optional[str] = None,
+    ):
+        """Cache the answer to ``question`` and the IDs of the chunks behind it."""
+        version = version or self.version(data_dir)
+        key = self._key(question, version)
+        entry = CachedAnswer(question=question, answer=answer, documents=list(documents), created=time.time())
+        self.cache.set(key, json.dumps(entry.__dict__).encode("utf-8"))
+        if self._questions is not None:
+            self._questions.store(self._embed(question, data_dir), [key], version)
+
+    def clear(self):
+        self.cache.clear()
+        if self._questions is not None:
+            self._questions.clear()
+        self.stats.reset()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Return the process-wide answer cache."""
+    path = get_cache_dir() / "answers.sqlite"
+    cache = _caches.get(str(path))
+    if cache is None:
+        cache = AnswerCache(DiskCache(path, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL or None))
+        _caches[str(path)] = cache
+    return cache
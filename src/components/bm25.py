@@ -0,0 +1,230 @@
+import json
+import math
+import re
+import struct
+import zlib
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from src.utils.file_lock import temp_path
+from src.utils.rw_lock import ReadWriteLock
+
+# Keeps part numbers, versions and acronyms such as "AB-1234", "v2.1" or "U.S"
+# together as one token
+_TOKEN = re.compile(r"\w+(?:[-./]\w+)*")
+
+_MAGIC = b"CRB1"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens; compound tokens also emit their parts."""
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-./]", token) if part)
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over chunk texts.
+
+    Postings are kept per term as parallel ``array('I')`` document numbers and
+    ``array('H')`` term frequencies, so adding chunks only appends. Removed
+    chunks are tombstoned and dropped the next time the index is saved.
+
+    The on-disk format is a small header followed by the raw arrays (see
+    ``save``), which ``load`` reads back with ``frombytes`` without parsing
+    individual postings.
+
+    Searches take the read side of a read/write lock and updates the write
+    side, so postings are never appended to while a search has them mapped
+    into NumPy.
+
+    Args:
+        k1 (float): Term-frequency saturation
+        b (float): Document-length normalisation
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._ids: List[str] = []
+        self._doc_of: Dict[str, int] = {}
+        self._lengths = array("I")
+        self._alive = bytearray()
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._total_length = 0
+        self._rw = ReadWriteLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_of)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_of
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]):
+        """Index chunks; an existing ID is replaced."""
+        tokenized = [tokenize(text) for text in texts]
+        with self._rw.write():
+            self._remove(doc_id for doc_id in ids if doc_id in self._doc_of)
+            for doc_id, tokens in zip(ids, tokenized):
+                self._add(doc_id, tokens)
+
+    def _add(self, doc_id: str, tokens: List[str]):
+        doc = len(self._ids)
+        self._ids.append(doc_id)
+        self._doc_of[doc_id] = doc
+        self._lengths.append(len(tokens))
+        self._alive.append(1)
+        self._total_length += len(tokens)
+
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = (array("I"), array("H"))
+            postings[0].append(doc)
+            postings[1].append(min(tf, 0xFFFF))
+
+    def remove(self, ids: Iterable[str]):
+        with self._rw.write():
+            self._remove(ids)
+
+    def _remove(self, ids: Iterable[str]):
+        for doc_id in list(ids):
+            doc = self._doc_of.pop(doc_id, None)
+            if doc is not None:
+                self._alive[doc] = 0
+                self._total_length -= self._lengths[doc]
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[str, float]]:
+        """Return up to ``k`` (chunk id, BM25 score) pairs, best first."""
+        with self._rw.read():
+            return self._search(query, k)
+
+    def _search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        n_docs = len(self._doc_of)
+        if not n_docs:
+            return []
+        alive = np.frombuffer(bytes(self._alive), dtype=np.uint8).astype(bool)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+        avg_length = max(self._total_length / n_docs, 1.0)
+        norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            docs = np.frombuffer(postings[0], dtype=np.uint32)
+            tfs = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+            live = alive[docs]
+            docs, tfs = docs[live], tfs[live]
+            if len(docs) == 0:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) == 0:
+            return []
+        k = min(k, len(hits))
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[doc], float(scores[doc])) for doc in top]
+
+    # Persistence ----------------------------------------------------------------------------------------
+    #
+    # Layout (little-endian):
+    #   b"CRB1" | u32 header length | zlib(JSON header: k1, b, ids, terms, counts)
+    #   | u32[n_docs] lengths | u32[n_postings] docs | u16[n_postings] tfs
+    # Postings of term i are the next counts[i] entries of docs/tfs.
+
+    def save(self, path: Path):
+        """Write the index to ``path``, compacting removed chunks."""
+        with self._rw.read():
+            self._save(Path(path))
+
+    def _save(self, path: Path):
+        live_docs = sorted(self._doc_of.values())
+        renumber = {old: new for new, old in enumerate(live_docs)}
+
+        terms, counts = [], []
+        docs, tfs = array("I"), array("H")
+        for term, (term_docs, term_tfs) in self._postings.items():
+            kept = [(renumber[d], tf) for d, tf in zip(term_docs, term_tfs) if d in renumber]
+            if not kept:
+                continue
+            terms.append(term)
+            counts.append(len(kept))
+            docs.extend(d for d, _ in kept)
+            tfs.extend(tf for _, tf in kept)
+
+        header = zlib.compress(json.dumps({
+            "k1": self.k1,
+            "b": self.b,
+            "ids": [self._ids[doc] for doc in live_docs],
+            "terms": terms,
+            "counts": counts,
+        }).encode("utf-8"))
+        lengths = array("I", (self._lengths[doc] for doc in live_docs))
+
+        tmp = temp_path(path)
+        with open(tmp, "wb") as f:
+            f.write(_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for part in (lengths, docs, tfs):
+                f.write(part.tobytes())
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != _MAGIC:
+            raise ValueError(f"{path} is not a BM25 index")
+        (header_len,) = struct.unpack_from("<I", data, 4)
+        offset = 8 + header_len
+        header = json.loads(zlib.decompress(data[8:offset]))
+
+        index = cls(k1=header["k1"], b=header["b"])
+        n_docs = len(header["ids"])
+        n_postings = sum(header["counts"])
+        index._ids = header["ids"]
+        index._doc_of = {doc_id: doc for doc, doc_id in enumerate(index._ids)}
+        index._lengths.frombytes(data[offset:offset + 4 * n_docs])
+        offset += 4 * n_docs
+        docs, tfs = array("I"), array("H")
+        docs.frombytes(data[offset:offset + 4 * n_postings])
+        offset += 4 * n_postings
+        tfs.frombytes(data[offset:offset + 2 * n_postings])
+
+        start = 0
+        for term, count in zip(header["terms"], header["counts"]):
+            index._postings[term] = (docs[start:start + count], tfs[start:start + count])
+            start += count
+        index._alive = bytearray(b"\x01" * n_docs)
+        index._total_length = sum(index._lengths)
+        return index
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several rankings of IDs with reciprocal rank fusion.
+
+    Each ID scores ``sum(1 / (k + rank))`` over the rankings it appears in.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,134 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+from langchain.schema import Document
+
+from src.utils.settings import get_bool, get_float, get_int, get_str
+
+from .splitter import TokenCounter, get_token_counter
+
+# Token budget of the context passed to the generator
+CONTEXT_TOKENS = get_int("CRAG_CONTEXT_TOKENS", 3000)
+# Tokenizer of the generation model (gpt-3.5-turbo)
+CONTEXT_ENCODING = get_str("CRAG_CONTEXT_ENCODING", "cl100k_base")
+# Word-shingle Jaccard similarity from which two chunks count as duplicates
+CONTEXT_DEDUP_THRESHOLD = get_float("CRAG_CONTEXT_DEDUP_THRESHOLD", 0.9)
+# A document is only truncated into the budget if this many tokens are left
+CONTEXT_MIN_TOKENS = get_int("CRAG_CONTEXT_MIN_TOKENS", 50)
+# Place unscored documents (web results) before the ranked chunks. Web results
+# are only fetched when grading found the chunks wanting, so they go first and
+# are the last to be cut by the budget
+CONTEXT_UNSCORED_FIRST = get_bool("CRAG_CONTEXT_UNSCORED_FIRST", True)
+# Retrieval scores, in order of preference, that rank documents
+_SCORE_KEYS = ("rrf_score", "similarity")
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class PackedContext:
+    """Context assembled for one generation and what was left out of it."""
+
+    text: str = ""
+    documents: List[Document] = field(default_factory=list)
+    tokens: int = 0
+    total_tokens: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+    truncated: int = 0
+
+    @property
+    def saved(self) -> int:
+        """Tokens of the input documents kept out of the prompt."""
+        return self.total_tokens - self.tokens
+
+
+def relevance(doc: Document) -> Optional[float]:
+    """Retrieval score of a chunk, None for unscored documents such as web results."""
+    for key in _SCORE_KEYS:
+        if key in doc.metadata:
+            return doc.metadata[key]
+    return None
+
+
+def shingles(text: str, size: int = 3) -> Set[tuple]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def deduplicate(documents: List[Document], threshold: float = CONTEXT_DEDUP_THRESHOLD) -> List[Document]:
+    """Drop documents whose shingle set nearly matches an earlier document's."""
+    kept, kept_shingles = [], []
+    for doc in documents:
+        current = shingles(doc.page_content)
+        if any(len(current & other) / len(current | other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(current)
+    return kept
+
+
+def pack_context(
+    documents: List[Document],
+    max_tokens: int = CONTEXT_TOKENS,
+    counter: Optional[TokenCounter] = None,
+    dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+    min_tokens: int = CONTEXT_MIN_TOKENS,
+    unscored_first: bool = CONTEXT_UNSCORED_FIRST,
+) -> PackedContext:
+    """
+    Assemble the generation context from graded documents.
+
+    Unscored documents, such as web results, come first in their own order,
+    followed by the scored chunks from best to worst retrieval score (with
+    ``unscored_first`` off, the unscored documents come last instead).
+    Near-duplicates of an earlier document are dropped, and the rest are
+    added whole until ``max_tokens`` is reached. The document that does not
+    fit is cut to the tokens left, unless fewer than ``min_tokens`` remain;
+    later documents are left out.
+
+    Args:
+        documents (List[Document]): Graded documents, web results included
+        max_tokens (int): Token budget of the context
+        counter (TokenCounter, optional): Counter for the generator's tokenizer
+        dedup_threshold (float): Shingle similarity from which chunks are duplicates
+        min_tokens (int): Smallest useful truncated document
+        unscored_first (bool): Put unscored documents before the scored ones
+
+    Returns:
+        PackedContext: Context text, the documents in it and token counts
+    """
+    counter = counter or get_token_counter(CONTEXT_ENCODING)
+    documents = [doc for doc in documents if doc.page_content.strip()]
+    lengths = counter.count_many([doc.page_content for doc in documents])
+    packed = PackedContext(total_tokens=sum(lengths))
+
+    def rank(doc: Document):
+        score = relevance(doc)
+        return ((score is None) != unscored_first, -(score or 0.0))
+
+    ranked = sorted(documents, key=rank)
+    unique = deduplicate(ranked, dedup_threshold)
+    packed.duplicates = len(ranked) - len(unique)
+
+    parts = []
+    for doc in unique:
+        length = counter.count(doc.page_content)
+        remaining = max_tokens - packed.tokens
+        if length <= remaining:
+            parts.append(doc.page_content)
+            packed.documents.append(doc)
+            packed.tokens += length
+            continue
+        if remaining >= min_tokens:
+            tokens = counter.encoding.encode_ordinary(doc.page_content)[:remaining]
+            parts.append(counter.encoding.decode(tokens))
+            packed.documents.append(doc)
+            packed.tokens += len(tokens)
+            packed.truncated += 1
+        break
+    packed.dropped = len(unique) - len(packed.documents)
+    packed.text = "\n\n".join(parts)
+    return packed
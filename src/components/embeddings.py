@@ -0,0 +1,107 @@
+import hashlib
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from src.utils.disk_cache import DiskCache
+from src.utils.instrumentation import record_cache, record_llm_call, span
+from src.utils.settings import get_bool, get_cache_dir, get_int, get_str
+
+from .splitter import get_encoding
+
+EMBEDDING_MODEL = get_str("CRAG_EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_CACHE_SIZE = get_int("CRAG_EMBEDDING_CACHE_SIZE", 200_000)
+# Tokenizer of the OpenAI embedding models, to count the tokens billed per call
+EMBEDDING_ENCODING = get_str("CRAG_EMBEDDING_ENCODING", "cl100k_base")
+
+_caches: Dict[str, DiskCache] = {}
+
+
+def get_embedding_cache() -> DiskCache:
+    """Return the process-wide on-disk embedding cache."""
+    path = get_cache_dir() / "embeddings.sqlite"
+    cache = _caches.get(str(path))
+    if cache is None:
+        cache = DiskCache(path, max_entries=EMBEDDING_CACHE_SIZE)
+        _caches[str(path)] = cache
+    return cache
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed embedding cache in front of another Embeddings model.
+
+    Vectors are stored as float32 blobs keyed by the sha256 of the model name
+    and the text, so re-indexing unchanged chunks makes no embedding calls.
+    Only the texts missing from the cache are sent to the underlying model, in
+    a single request per ``embed_documents`` call.
+    """
+
+    def __init__(self, underlying: Embeddings, model: str, cache: DiskCache):
+        self.underlying = underlying
+        self.model = model
+        self.cache = cache
+
+    @property
+    def stats(self):
+        return self.cache.stats
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        # Embed each missing text once, even if it appears several times
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        vectors = {key: _decode(blob) for key, blob in found.items()}
+        record_cache("embedding", hits=len(texts) - len(missing), misses=len(missing))
+        if missing:
+            texts_to_embed = list(missing.values())
+            started = time.perf_counter()
+            with span("embed", texts=len(missing)):
+                embedded = self.underlying.embed_documents(texts_to_embed)
+            # Raw encoding, not the memoized counter: chunks are embedded once,
+            # so remembering them would only grow with the corpus
+            tokens = sum(map(len, get_encoding(EMBEDDING_ENCODING).encode_ordinary_batch(texts_to_embed)))
+            record_llm_call(self.model, tokens, 0, time.perf_counter() - started, kind="embedding")
+            new_vectors = dict(zip(missing.keys(), embedded))
+            self.cache.set_many((key, _encode(vector)) for key, vector in new_vectors.items())
+            vectors.update(new_vectors)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def _encode(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+def create_embeddings(model: Optional[str] = None) -> Embeddings:
+    """
+    Create the embedding model used for indexing and retrieval.
+
+    Embeddings go through the on-disk cache unless CRAG_EMBEDDING_CACHE is
+    turned off.
+    """
+    model = model or EMBEDDING_MODEL
+    embeddings = OpenAIEmbeddings(model=model)
+    if not get_bool("CRAG_EMBEDDING_CACHE", True):
+        return embeddings
+    return CachedEmbeddings(embeddings, model=model, cache=get_embedding_cache())
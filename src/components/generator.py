@@ -1,23 +1,28 @@
 
 
 # RAG CHAIN  -----------------------------------------------------------------------------------------------------
-def create_chain():
+GENERATOR_MODEL = "gpt-3.5-turbo"
+
+
+def create_chain(http_client=None, http_async_client=None):
     ### Generate
 
-    from langchain import hub
     from langchain_core.output_parsers import StrOutputParser
     from langchain_openai import ChatOpenAI
 
-    # Prompt
-    prompt = hub.pull("rlm/rag-prompt")
+    from .prompts import get_prompt
 
-    # LLM
-    llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0)
+    # Prompt, from the local registry (no hub round trip per chain)
+    prompt = get_prompt("rag")
 
-
-    # Post-processing
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+    # LLM
+    llm = ChatOpenAI(
+        model_name=GENERATOR_MODEL,
+        temperature=0,
+        stream_usage=True,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
 
 
     # Chain
@@ -1,7 +1,53 @@
-from langchain_core.prompts import ChatPromptTemplate
+import asyncio
+import contextvars
+import hashlib
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
 from langchain_core.pydantic_v1 import BaseModel, Field
+from langchain_core.runnables import Runnable, RunnableConfig
 from langchain_openai import ChatOpenAI
 
+from src.utils.disk_cache import DiskCache
+from src.utils.instrumentation import get_logger, record_cache
+from src.utils.settings import get_bool, get_cache_dir, get_float, get_int, get_str
+
+from .embeddings import EMBEDDING_MODEL
+from .prompts import prompt_registry
+
+logger = get_logger(__name__)
+
+GRADER_MODEL = "gpt-3.5-turbo-0125"
+
+# Grader requests in flight at once
+GRADER_CONCURRENCY = get_int("CRAG_GRADER_CONCURRENCY", 8)
+# "document" sends one grader request per document, "batch" grades many per request
+GRADER_MODE = get_str("CRAG_GRADER_MODE", "document")
+# Batch mode: upper bounds on the documents and document tokens per request
+GRADER_BATCH_SIZE = get_int("CRAG_GRADER_BATCH_SIZE", 10)
+GRADER_BATCH_TOKENS = get_int("CRAG_GRADER_BATCH_TOKENS", 6000)
+# Pre-filter on the retrieval cosine similarity: documents at or above ACCEPT
+# are relevant and below REJECT irrelevant without asking the grader.
+# Similarity ranges differ per embedding model (ada-002 mostly 0.7-0.9,
+# text-embedding-3-* mostly 0.3-0.6), so thresholds are tuned per model and
+# the pre-filter is only on by default for models listed here.
+PREFILTER_THRESHOLDS: Dict[str, Tuple[float, float]] = {
+    "text-embedding-ada-002": (0.92, 0.70),
+}
+_tuned = PREFILTER_THRESHOLDS.get(EMBEDDING_MODEL)
+GRADER_PREFILTER = get_bool("CRAG_GRADER_PREFILTER", _tuned is not None)
+# Untuned models default to thresholds that settle nothing
+GRADER_ACCEPT_SIMILARITY = get_float("CRAG_GRADER_ACCEPT_SIMILARITY", _tuned[0] if _tuned else 1.0)
+GRADER_REJECT_SIMILARITY = get_float("CRAG_GRADER_REJECT_SIMILARITY", _tuned[1] if _tuned else -1.0)
+# On-disk grade cache shared by all sessions and runs
+GRADE_CACHE = get_bool("CRAG_GRADE_CACHE", True)
+GRADE_CACHE_SIZE = get_int("CRAG_GRADE_CACHE_SIZE", 100_000)
+GRADE_CACHE_TTL = get_float("CRAG_GRADE_CACHE_TTL", 7 * 24 * 3600.0)
+
+_caches: Dict[str, DiskCache] = {}
+
 # Data model
 class GradeDocuments(BaseModel):
     """Binary score for relevance check on retrieved documents."""
@@ -10,22 +56,535 @@ class GradeDocuments(BaseModel):
         description="Documents are relevant to the question, 'yes' or 'no'"
     )
 
-def create_grader():
+
+class GradeDocumentsBatch(BaseModel):
+    """Binary scores for relevance check on a numbered list of retrieved documents."""
+
+    scores: List[GradeDocuments] = Field(
+        description="One score per document, in the order the documents are numbered"
+    )
+
+
+class GradingStats:
+    """Process-wide counts of documents graded by the pre-filter and by the LLM."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.graded = 0
+        self.cancelled = 0
+
+    def record(self, accepted: int = 0, rejected: int = 0, graded: int = 0, cancelled: int = 0):
+        with self._lock:
+            self.accepted += accepted
+            self.rejected += rejected
+            self.graded += graded
+            self.cancelled += cancelled
+
+    @property
+    def skipped(self) -> int:
+        """Grader calls saved by the pre-filter and by stopping early."""
+        return self.accepted + self.rejected + self.cancelled
+
+    def __repr__(self):
+        return (
+            f"GradingStats(accepted={self.accepted}, rejected={self.rejected}, "
+            f"graded={self.graded}, cancelled={self.cancelled}, skipped={self.skipped})"
+        )
+
+
+grading_stats = GradingStats()
+
+
+def get_grade_cache() -> DiskCache:
+    """Return the process-wide on-disk grade cache."""
+    path = get_cache_dir() / "grades.sqlite"
+    cache = _caches.get(str(path))
+    if cache is None:
+        cache = DiskCache(path, max_entries=GRADE_CACHE_SIZE, ttl=GRADE_CACHE_TTL or None)
+        _caches[str(path)] = cache
+    return cache
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+class CachedGrader(Runnable):
+    """
+    Grade memoization in front of the per-document grader chain.
+
+    Grades are keyed by the sha256 of the normalised question, the chunk
+    text, the grader model and the prompt version, and stored in a SQLite
+    DiskCache shared by every Streamlit session and CLI run. ``invoke`` and
+    ``batch`` only send cache misses to the wrapped chain; ``lookup`` and
+    ``remember`` let ``grade_all`` use the cache around other grading paths.
+
+    Args:
+        grader: Chain returning GradeDocuments
+        cache (DiskCache): Where grades are stored
+        model (str): Grader model name, part of the key
+        prompt_version (str, optional): Grader prompt version, part of the
+            key; defaults to the registered "grader" prompt's version and hash
+    """
+
+    def __init__(self, grader, cache: DiskCache, model: str = GRADER_MODEL, prompt_version: Optional[str] = None):
+        self.grader = grader
+        self.cache = cache
+        self.model = model
+        self.prompt_version = prompt_version or prompt_registry.get("grader").key
+
+    @property
+    def stats(self):
+        return self.cache.stats
+
+    def _key(self, question: str, document: str) -> str:
+        raw = f"{self.model}\0{self.prompt_version}\0{normalize_question(question)}\0{document}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def lookup(self, question: str, documents: List[Document]) -> List[Optional[str]]:
+        """Cached grade of each document, None when not cached."""
+        keys = [self._key(question, d.page_content) for d in documents]
+        found = self.cache.get_many(keys)
+        return [found[key].decode() if key in found else None for key in keys]
+
+    def remember(self, question: str, documents: List[Document], grades: List[Optional[str]]):
+        self.cache.set_many(
+            (self._key(question, d.page_content), grade.encode())
+            for d, grade in zip(documents, grades)
+            if grade in ("yes", "no")
+        )
+
+    def invoke(self, input: Dict[str, Any], config: Optional[RunnableConfig] = None, **kwargs) -> GradeDocuments:
+        return self.batch([input], config=config, **kwargs)[0]
+
+    def batch(self, inputs: List[Dict[str, Any]], config=None, *, return_exceptions: bool = False, **kwargs) -> List[Any]:
+        keys = [self._key(i["question"], i["document"]) for i in inputs]
+        found = self.cache.get_many(keys)
+        results: List[Any] = [
+            GradeDocuments(binary_score=found[key].decode()) if key in found else None for key in keys
+        ]
+
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        if missing:
+            fresh = self.grader.batch(
+                [inputs[i] for i in missing], config=config, return_exceptions=return_exceptions, **kwargs
+            )
+            self._remember_results(keys, missing, fresh, results)
+        return results
+
+    async def ainvoke(self, input: Dict[str, Any], config: Optional[RunnableConfig] = None, **kwargs) -> GradeDocuments:
+        return (await self.abatch([input], config=config, **kwargs))[0]
+
+    async def abatch(self, inputs: List[Dict[str, Any]], config=None, *, return_exceptions: bool = False, **kwargs) -> List[Any]:
+        keys = [self._key(i["question"], i["document"]) for i in inputs]
+        # SQLite lookups are blocking; keep them off the event loop
+        found = await asyncio.to_thread(self.cache.get_many, keys)
+        results: List[Any] = [
+            GradeDocuments(binary_score=found[key].decode()) if key in found else None for key in keys
+        ]
+
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        if missing:
+            fresh = await self.grader.abatch(
+                [inputs[i] for i in missing], config=config, return_exceptions=return_exceptions, **kwargs
+            )
+            await asyncio.to_thread(self._remember_results, keys, missing, fresh, results)
+        return results
+
+    def _remember_results(self, keys: List[str], missing: List[int], fresh: List[Any], results: List[Any]):
+        for i, result in zip(missing, fresh):
+            results[i] = result
+        self.cache.set_many(
+            (keys[i], result.binary_score.encode())
+            for i, result in zip(missing, fresh)
+            if getattr(result, "binary_score", None) in ("yes", "no")
+        )
+
+
+def create_grader(batch: bool = False, http_client=None, http_async_client=None):
+    """
+    Create the document grader.
+
+    Args:
+        batch (bool): Return a grader that scores a numbered list of documents
+            (``documents``, ``count`` and ``question`` inputs) in one call and
+            answers with a GradeDocumentsBatch
+        http_client (httpx.Client, optional): Pooled client for OpenAI requests
+        http_async_client (httpx.AsyncClient, optional): Pooled client for
+            async OpenAI requests
+
+    Returns:
+        Runnable: prompt | structured-output LLM; the per-document grader is
+            wrapped in a CachedGrader unless CRAG_GRADE_CACHE is off
+    """
     # LLM with function call
-    llm = ChatOpenAI(model="gpt-3.5-turbo-0125", temperature=0)
+    llm = ChatOpenAI(
+        model=GRADER_MODEL,
+        temperature=0,
+        stream_usage=True,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+
+    if batch:
+        structured_llm_grader = llm.with_structured_output(GradeDocumentsBatch)
+        return prompt_registry.prompt("grader_batch") | structured_llm_grader
+
     structured_llm_grader = llm.with_structured_output(GradeDocuments)
 
-    # Prompt
-    system = """You are a grader assessing relevance of a retrieved document to a user question. \n
-        If the document contains keyword(s) or semantic meaning related to the question, grade it as relevant. \n
-        Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question."""
-    grade_prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system),
-            ("human", "Retrieved document: \n\n {document} \n\n User question: {question}"),
-        ]
+    # Prompt, from the local registry
+    grade_spec = prompt_registry.get("grader")
+    retrieval_grader = grade_spec.template() | structured_llm_grader
+
+    if GRADE_CACHE:
+        return CachedGrader(retrieval_grader, get_grade_cache(), prompt_version=grade_spec.key)
+    return retrieval_grader
+
+
+def sub_batches(
+    documents: List[Document],
+    max_documents: int = GRADER_BATCH_SIZE,
+    max_tokens: int = GRADER_BATCH_TOKENS,
+) -> List[List[int]]:
+    """
+    Split documents into consecutive groups for batch grading.
+
+    Returns:
+        List[List[int]]: Document positions of each group; a group holds at
+            most ``max_documents`` documents and ``max_tokens`` document
+            tokens, except that a single oversized document forms its own group
+    """
+    from .splitter import get_token_counter
+
+    lengths = get_token_counter().count_many([d.page_content for d in documents])
+    groups, group, tokens = [], [], 0
+    for position, length in enumerate(lengths):
+        if group and (len(group) >= max_documents or tokens + length > max_tokens):
+            groups.append(group)
+            group, tokens = [], 0
+        group.append(position)
+        tokens += length
+    if group:
+        groups.append(group)
+    return groups
+
+
+def _format_batch(documents: List[Document]) -> str:
+    return "\n\n".join(f"Document {i}:\n{d.page_content}" for i, d in enumerate(documents, start=1))
+
+
+def prefilter(
+    documents: List[Document],
+    accept: float = GRADER_ACCEPT_SIMILARITY,
+    reject: float = GRADER_REJECT_SIMILARITY,
+) -> List[Optional[str]]:
+    """
+    Grade documents from their retrieval similarity alone.
+
+    Similarities restored from the query cache (``cached_scores``) were
+    measured against an earlier, similar question rather than this one, so
+    they never settle a grade.
+
+    Returns:
+        List[Optional[str]]: 'yes' for documents with a ``similarity`` at or
+            above ``accept``, 'no' below ``reject``, None for the uncertain
+            band and for documents without a similarity of their own
+            (keyword-only hits, query cache hits)
+    """
+    grades = []
+    for d in documents:
+        similarity = None if d.metadata.get("cached_scores") else d.metadata.get("similarity")
+        if similarity is None:
+            grades.append(None)
+        elif similarity >= accept:
+            grades.append("yes")
+        elif similarity < reject:
+            grades.append("no")
+        else:
+            grades.append(None)
+    return grades
+
+
+def grade_all(
+    grader,
+    question: str,
+    documents: List[Document],
+    max_concurrency: Optional[int] = None,
+    batch_grader=None,
+    use_prefilter: Optional[bool] = None,
+    stop_on_irrelevant: bool = False,
+) -> List[Optional[str]]:
+    """
+    Grade every document against the question concurrently.
+
+    Documents whose retrieval similarity settles their grade are graded by
+    ``prefilter`` without an LLM call (unless CRAG_GRADER_PREFILTER is off);
+    the rest go to the grader. Grades cached by a CachedGrader are reused
+    whichever path grades the rest. With a ``batch_grader``, documents are graded
+    a sub-batch per request (see ``sub_batches``). A sub-batch whose answer
+    fails to parse or holds the wrong number of scores is re-graded one
+    document at a time with ``grader``.
+
+    With ``stop_on_irrelevant``, grading stops at the first irrelevant
+    document, since the answer then needs a web search whatever the other
+    grades are: grader calls still queued are cancelled and their documents
+    get no grade. Documents are graded one per request in this mode.
+
+    Args:
+        grader: Chain from ``create_grader``
+        question (str): User question
+        documents (List[Document]): Documents to grade
+        max_concurrency (int, optional): Grader requests in flight, defaults
+            to CRAG_GRADER_CONCURRENCY
+        batch_grader (optional): Chain from ``create_grader(batch=True)``
+        use_prefilter (bool, optional): Defaults to CRAG_GRADER_PREFILTER
+        stop_on_irrelevant (bool): Stop grading once a document is irrelevant
+
+    Returns:
+        List[Optional[str]]: The binary score ('yes' or 'no') of each
+            document, in the order of ``documents``; None for documents left
+            ungraded by ``stop_on_irrelevant``
+    """
+    grades, pending, grader, cache = _pregrade(grader, question, documents, use_prefilter, stop_on_irrelevant)
+
+    pending_docs = [documents[i] for i in pending]
+    if stop_on_irrelevant:
+        graded = _grade_until_irrelevant(grader, question, pending_docs, max_concurrency)
+    else:
+        graded = _grade_with_llm(grader, question, pending_docs, max_concurrency, batch_grader)
+        grading_stats.record(graded=len(pending))
+    for position, grade in zip(pending, graded):
+        grades[position] = grade
+    if cache is not None:
+        cache.remember(question, pending_docs, graded)
+    return grades
+
+
+async def agrade_all(
+    grader,
+    question: str,
+    documents: List[Document],
+    max_concurrency: Optional[int] = None,
+    batch_grader=None,
+    use_prefilter: Optional[bool] = None,
+    stop_on_irrelevant: bool = False,
+) -> List[Optional[str]]:
+    """
+    Async counterpart of ``grade_all``, with the same arguments and result.
+
+    Grader requests run as tasks on the event loop, and the grade cache is
+    read and written in a worker thread. With ``stop_on_irrelevant``,
+    requests still in flight are cancelled as soon as one document is
+    irrelevant.
+    """
+    grades, pending, grader, cache = await asyncio.to_thread(
+        _pregrade, grader, question, documents, use_prefilter, stop_on_irrelevant
     )
 
-    retrieval_grader = grade_prompt | structured_llm_grader
-    
-    return retrieval_grader
\ No newline at end of file
+    pending_docs = [documents[i] for i in pending]
+    if stop_on_irrelevant:
+        graded = await _agrade_until_irrelevant(grader, question, pending_docs, max_concurrency)
+    else:
+        graded = await _agrade_with_llm(grader, question, pending_docs, max_concurrency, batch_grader)
+        grading_stats.record(graded=len(pending))
+    for position, grade in zip(pending, graded):
+        grades[position] = grade
+    if cache is not None:
+        await asyncio.to_thread(cache.remember, question, pending_docs, graded)
+    return grades
+
+
+def _pregrade(grader, question: str, documents: List[Document], use_prefilter: Optional[bool], stop_on_irrelevant: bool):
+    # Grades settled without a grader call: the pre-filter, then the grade
+    # cache. Returns the grades so far, the positions still to grade, the
+    # chain to grade them with and the CachedGrader to remember them in.
+    if use_prefilter is None:
+        use_prefilter = GRADER_PREFILTER
+    grades = prefilter(documents) if use_prefilter else [None] * len(documents)
+    pending = [i for i, grade in enumerate(grades) if grade is None]
+    accepted = grades.count("yes")
+    rejected = grades.count("no")
+    grading_stats.record(accepted=accepted, rejected=rejected)
+    if stop_on_irrelevant and rejected:
+        # The pre-filter already settled the decision
+        grading_stats.record(cancelled=len(pending))
+        pending = []
+    if accepted or rejected:
+        logger.info(
+            f"---GRADE: {accepted} AUTO-ACCEPTED, {rejected} AUTO-REJECTED, "
+            f"{len(pending)} SENT TO GRADER---"
+        )
+
+    cache = grader if isinstance(grader, CachedGrader) else None
+    if cache is not None and pending:
+        # Grades of earlier runs, whatever grading path is used below
+        cached = cache.lookup(question, [documents[i] for i in pending])
+        for position, grade in zip(pending, cached):
+            grades[position] = grade
+        hits = len(pending) - cached.count(None)
+        record_cache("grade", hits=hits, misses=len(pending) - hits)
+        pending = [i for i in pending if grades[i] is None]
+        grader = cache.grader
+        if hits:
+            logger.info(f"---GRADE: {hits} FROM CACHE---")
+        if stop_on_irrelevant and "no" in cached:
+            grading_stats.record(cancelled=len(pending))
+            pending = []
+    return grades, pending, grader, cache
+
+
+def _grade_until_irrelevant(
+    grader,
+    question: str,
+    documents: List[Document],
+    max_concurrency: Optional[int] = None,
+) -> List[Optional[str]]:
+    grades: List[Optional[str]] = [None] * len(documents)
+    if not documents:
+        return grades
+    executor = ThreadPoolExecutor(
+        max_workers=min(max_concurrency or GRADER_CONCURRENCY, len(documents)),
+        thread_name_prefix="crag-grade",
+    )
+    # Each grade runs in a copy of the caller's context, so its LLM call is traced
+    futures = {
+        executor.submit(contextvars.copy_context().run, grader.invoke, {"question": question, "document": d.page_content}): i
+        for i, d in enumerate(documents)
+    }
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                grades[futures[future]] = future.result().binary_score
+            if "no" in grades:
+                break
+    finally:
+        # Requests already sent finish in the background; their grades are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+    graded = sum(grade is not None for grade in grades)
+    grading_stats.record(graded=graded, cancelled=len(documents) - graded)
+    return grades
+
+
+async def _agrade_until_irrelevant(
+    grader,
+    question: str,
+    documents: List[Document],
+    max_concurrency: Optional[int] = None,
+) -> List[Optional[str]]:
+    grades: List[Optional[str]] = [None] * len(documents)
+    if not documents:
+        return grades
+    semaphore = asyncio.Semaphore(max_concurrency or GRADER_CONCURRENCY)
+
+    async def grade(document: Document) -> str:
+        async with semaphore:
+            result = await grader.ainvoke({"question": question, "document": document.page_content})
+            return result.binary_score
+
+    tasks = {asyncio.ensure_future(grade(d)): i for i, d in enumerate(documents)}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                grades[tasks[task]] = task.result()
+            if "no" in grades:
+                break
+    finally:
+        # Unlike threads, requests in flight are cancelled too
+        for task in pending:
+            task.cancel()
+    graded = sum(grade is not None for grade in grades)
+    grading_stats.record(graded=graded, cancelled=len(documents) - graded)
+    return grades
+
+
+def _batch_inputs(question: str, documents: List[Document]):
+    groups = sub_batches(documents)
+    inputs = [
+        {
+            "question": question,
+            "count": len(group),
+            "documents": _format_batch([documents[i] for i in group]),
+        }
+        for group in groups
+    ]
+    return groups, inputs
+
+
+def _batch_grades(groups: List[List[int]], results: List[Any], size: int):
+    # Grades from the batch answers, and the positions to re-grade one by one
+    grades: List[Optional[str]] = [None] * size
+    retry: List[int] = []
+    for group, result in zip(groups, results):
+        scores = getattr(result, "scores", None)
+        if scores is None or len(scores) != len(group):
+            got = f"{len(scores)} scores" if scores is not None else repr(result)
+            logger.info(f"---GRADE: BATCH OF {len(group)} RETURNED {got}, GRADING ONE BY ONE---")
+            retry.extend(group)
+            continue
+        for position, score in zip(group, scores):
+            grades[position] = score.binary_score
+    return grades, retry
+
+
+def _grade_with_llm(
+    grader,
+    question: str,
+    documents: List[Document],
+    max_concurrency: Optional[int] = None,
+    batch_grader=None,
+) -> List[str]:
+    if not documents:
+        return []
+    config = {"max_concurrency": max_concurrency or GRADER_CONCURRENCY}
+
+    if batch_grader is None:
+        inputs = [{"question": question, "document": d.page_content} for d in documents]
+        # batch() keeps the input order whatever order the requests finish in
+        scores = grader.batch(inputs, config=config)
+        return [score.binary_score for score in scores]
+
+    groups, inputs = _batch_inputs(question, documents)
+    results = batch_grader.batch(inputs, config=config, return_exceptions=True)
+    grades, retry = _batch_grades(groups, results, len(documents))
+
+    if retry:
+        retried = _grade_with_llm(grader, question, [documents[i] for i in retry], max_concurrency)
+        for position, grade in zip(retry, retried):
+            grades[position] = grade
+    return grades
+
+
+async def _agrade_with_llm(
+    grader,
+    question: str,
+    documents: List[Document],
+    max_concurrency: Optional[int] = None,
+    batch_grader=None,
+) -> List[str]:
+    if not documents:
+        return []
+    config = {"max_concurrency": max_concurrency or GRADER_CONCURRENCY}
+
+    if batch_grader is None:
+        inputs = [{"question": question, "document": d.page_content} for d in documents]
+        scores = await grader.abatch(inputs, config=config)
+        return [score.binary_score for score in scores]
+
+    groups, inputs = _batch_inputs(question, documents)
+    results = await batch_grader.abatch(inputs, config=config, return_exceptions=True)
+    grades, retry = _batch_grades(groups, results, len(documents))
+
+    if retry:
+        retried = await _agrade_with_llm(grader, question, [documents[i] for i in retry], max_concurrency)
+        for position, grade in zip(retry, retried):
+            grades[position] = grade
+    return grades
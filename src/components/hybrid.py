@@ -0,0 +1,87 @@
+from typing import Any, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.utils.settings import get_int, get_str
+
+from .bm25 import BM25Index, reciprocal_rank_fusion
+from .vector_store import get_documents
+
+# "hybrid" fuses BM25 and vector results, "vector" uses the vector store only
+RETRIEVAL_MODE = get_str("CRAG_RETRIEVAL_MODE", "hybrid")
+# Documents returned per question
+RETRIEVAL_K = get_int("CRAG_RETRIEVAL_K", 4)
+# Candidates taken from each ranking before fusion
+HYBRID_FETCH_K = get_int("CRAG_HYBRID_FETCH_K", 20)
+RRF_K = get_int("CRAG_RRF_K", 60)
+
+
+def doc_id(doc: Document) -> str:
+    """ID of a stored chunk; langchain_community's Chroma leaves ``doc.id`` unset."""
+    return doc.id or doc.metadata.get("chunk_id")
+
+
+def similarity_search(vectorstore, query: str, k: int) -> List[Document]:
+    """
+    Vector search that records each document's cosine similarity to the
+    query in its ``similarity`` metadata.
+    """
+    documents = []
+    # The public wrapper warns on scores outside [0, 1], but cosine similarity
+    # can be negative; the scores come from the same relevance function.
+    for doc, score in vectorstore._similarity_search_with_relevance_scores(query, k=k):
+        doc.metadata["similarity"] = score
+        documents.append(doc)
+    return documents
+
+
+class VectorRetriever(BaseRetriever):
+    """Plain vector search retriever keeping the similarity scores."""
+
+    vectorstore: Any
+    k: int = RETRIEVAL_K
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return similarity_search(self.vectorstore, query, self.k)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing BM25 keyword search with vector similarity search.
+
+    Both rankings are cut to ``fetch_k`` candidates and combined with
+    reciprocal rank fusion, so exact keyword matches (part numbers, acronyms)
+    that the embedding misses still reach the top ``k``. The fused score is
+    stored in each document's ``rrf_score`` metadata, and documents found by
+    the vector search also keep their ``similarity``.
+    """
+
+    vectorstore: Any
+    bm25: BM25Index
+    k: int = RETRIEVAL_K
+    fetch_k: int = HYBRID_FETCH_K
+    rrf_k: int = RRF_K
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector_docs = similarity_search(self.vectorstore, query, self.fetch_k)
+        by_id = {doc_id(doc): doc for doc in vector_docs if doc_id(doc)}
+        keyword_ids = [chunk_id for chunk_id, _ in self.bm25.search(query, k=self.fetch_k)]
+
+        fused = reciprocal_rank_fusion([list(by_id), keyword_ids], k=self.rrf_k)[:self.k]
+
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in by_id]
+        by_id.update((doc_id(doc), doc) for doc in get_documents(self.vectorstore, missing))
+
+        documents = []
+        for chunk_id, score in fused:
+            doc = by_id.get(chunk_id)
+            if doc is not None:
+                doc.metadata["rrf_score"] = score
+                documents.append(doc)
+        return documents
@@ -0,0 +1,400 @@
+import contextlib
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from src.utils.file_lock import file_lock, temp_path
+from src.utils.settings import get_cache_dir
+
+from .bm25 import BM25Index
+from .embeddings import EMBEDDING_MODEL, create_embeddings
+from .hybrid import RETRIEVAL_MODE, HybridRetriever, VectorRetriever
+from .ingest import IngestProgress, ingest, print_progress
+from .loader import MAX_FILES, LoadFailure
+from .query_cache import QUERY_CACHE, CachedRetriever, SemanticQueryCache
+from .retriever import CHUNK_OVERLAP, CHUNK_SIZE
+from .splitter import create_text_splitter
+from .vector_store import create_vectorstore
+
+_MANIFEST_FILE = "manifest.json"
+_BM25_FILE = "bm25.idx"
+_LOCK_FILE = "index.lock"
+
+# (path, size, mtime_ns) -> sha256, so unchanged files are never re-read
+_file_hash_cache: Dict[Tuple[str, int, int], str] = {}
+_file_hash_lock = threading.Lock()
+
+
+def file_hash(path: Path) -> str:
+    """Return the sha256 of a file, memoized on its size and mtime."""
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    with _file_hash_lock:
+        cached = _file_hash_cache.get(key)
+    if cached is not None:
+        return cached
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    value = digest.hexdigest()
+    with _file_hash_lock:
+        _file_hash_cache[key] = value
+    return value
+
+
+def chunk_id(file_digest: str, page: int, index: int, key: str = "") -> str:
+    """
+    Stable ID of the ``index``-th chunk on ``page`` of a file.
+
+    ``key`` is the file's manifest key (its resolved path), so two copies of
+    the same PDF under different names never share chunk IDs and removing
+    one leaves the other's chunks in place.
+    """
+    location = hashlib.sha256(key.encode("utf-8")).hexdigest()[:8]
+    return f"{file_digest[:16]}:{location}:{page}:{index}"
+
+
+@dataclass
+class IndexedFile:
+    """A file currently held in the index and the IDs of its chunks."""
+
+    file_hash: str
+    chunk_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class SyncResult:
+    """Files touched by IncrementalIndex.sync."""
+
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    replaced: List[str] = field(default_factory=list)
+    failures: List[LoadFailure] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed or self.replaced)
+
+
+class IncrementalIndex:
+    """
+    Vector index that can be updated one file at a time.
+
+    Every chunk gets a stable ID derived from its file hash and path, page
+    number and position on the page, so adding a file upserts only that
+    file's chunks and removing a file deletes only its IDs. The loading and
+    embedding cost of an update scales with the size of the changed file, not
+    with the corpus. Saving a persisted index rewrites it, so that happens
+    once per ``sync`` however many files changed.
+
+    A BM25 keyword index over the same chunks is kept in step with the vector
+    store for hybrid retrieval.
+
+    Updates of a persisted index hold a lock file in ``persist_dir``, so
+    processes sharing the cache directory (e.g. API workers) never write it
+    at the same time.
+
+    Args:
+        vectorstore: LangChain vector store supporting ``add_documents(ids=...)``
+            and ``delete(ids=...)``
+        text_splitter: Splitter used to chunk each page
+        persist_dir (Path, optional): Directory the index is saved to after
+            every change (once per ``sync`` or ``deferred_persist`` block),
+            for vector stores that support ``save``
+    """
+
+    def __init__(self, vectorstore, text_splitter, persist_dir: Optional[Path] = None):
+        self.vectorstore = vectorstore
+        self.text_splitter = text_splitter
+        self.persist_dir = Path(persist_dir) if persist_dir is not None else None
+        self.version = 0
+        self.bm25 = BM25Index()
+        self._files: Dict[str, IndexedFile] = {}
+        self._lock = threading.RLock()
+        # Serializes writers across processes; taken after ``_lock``
+        self._persist_lock = (
+            file_lock(self.persist_dir / _LOCK_FILE) if self.persist_dir is not None else contextlib.nullcontext()
+        )
+        self._retriever = None
+        # While > 0, changes are saved once when the outermost block ends
+        self._defer_depth = 0
+        self._dirty = False
+        self._load_manifest()
+
+    def _load_manifest(self):
+        if self.persist_dir is None or not (self.persist_dir / _MANIFEST_FILE).exists():
+            return
+        with open(self.persist_dir / _MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+        self._files = {
+            key: IndexedFile(file_hash=entry["file_hash"], chunk_ids=entry["chunk_ids"])
+            for key, entry in manifest.items()
+        }
+        if (self.persist_dir / _BM25_FILE).exists():
+            self.bm25 = BM25Index.load(self.persist_dir / _BM25_FILE)
+
+    @contextlib.contextmanager
+    def deferred_persist(self):
+        """
+        Save the index once at the end of the block instead of after every
+        file added or removed inside it; saving rewrites the whole index.
+        """
+        with self._lock, self._persist_lock:
+            self._defer_depth += 1
+            try:
+                yield self
+            finally:
+                self._defer_depth -= 1
+                if self._defer_depth == 0 and self._dirty:
+                    self._persist()
+
+    def _persist(self):
+        # Caller holds the lock
+        if self.persist_dir is None or not hasattr(self.vectorstore, "save"):
+            return
+        if self._defer_depth:
+            self._dirty = True
+            return
+        self._dirty = False
+        self.vectorstore.save(self.persist_dir)
+        self.bm25.save(self.persist_dir / _BM25_FILE)
+        manifest = {
+            key: {"file_hash": entry.file_hash, "chunk_ids": entry.chunk_ids}
+            for key, entry in self._files.items()
+        }
+        tmp = temp_path(self.persist_dir / _MANIFEST_FILE)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        tmp.replace(self.persist_dir / _MANIFEST_FILE)
+
+    @property
+    def files(self) -> Dict[str, IndexedFile]:
+        with self._lock:
+            return dict(self._files)
+
+    def as_retriever(self, **kwargs):
+        """
+        Return a retriever over the index; it sees every later update.
+
+        With CRAG_RETRIEVAL_MODE=hybrid (the default) this fuses BM25 and
+        vector search, otherwise it is plain vector search. Both record each
+        document's cosine similarity to the question in its metadata.
+        Unless CRAG_QUERY_CACHE is off, near-identical questions are answered
+        from a semantic query cache that is emptied whenever the index changes.
+        """
+        if kwargs:
+            return self.vectorstore.as_retriever(**kwargs)
+        if self._retriever is None:
+            if RETRIEVAL_MODE == "hybrid":
+                retriever = HybridRetriever(vectorstore=self.vectorstore, bm25=self.bm25)
+            else:
+                retriever = VectorRetriever(vectorstore=self.vectorstore)
+            if QUERY_CACHE:
+                retriever = CachedRetriever(retriever=retriever, index=self, cache=SemanticQueryCache())
+            self._retriever = retriever
+        return self._retriever
+
+    def _delete_chunks(self, ids: List[str]):
+        self.vectorstore.delete(ids=ids)
+        self.bm25.remove(ids)
+
+    def _split_pages(self, key: str, digest: str, pages: List[Document]) -> Iterator[Document]:
+        for page_no, page in enumerate(pages):
+            page_no = page.metadata.get("page", page_no)
+            for index, chunk in enumerate(self.text_splitter.split_documents([page])):
+                chunk.metadata["chunk_id"] = chunk_id(digest, page_no, index, key)
+                chunk.metadata["file_hash"] = digest
+                yield chunk
+
+    def add_files(
+        self,
+        paths: List[Path],
+        max_workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        on_progress: Optional[Callable[[IngestProgress], None]] = print_progress,
+    ) -> List[LoadFailure]:
+        """
+        Add (or update) several files through the streaming ingest pipeline.
+
+        Pages are extracted in parallel and chunks are embedded and upserted
+        in batches, so memory use does not grow with the number of files. If
+        ingestion fails (e.g. an embedding request errors), the chunks it
+        already wrote are deleted again and the index is left as it was.
+
+        Returns:
+            List[LoadFailure]: Files that could not be loaded
+        """
+        pending = {}
+        with self._lock, self._persist_lock:
+            for path in map(Path, paths):
+                key = str(path.resolve())
+                digest = file_hash(path)
+                existing = self._files.get(key)
+                if existing is None or existing.file_hash != digest:
+                    pending[str(path)] = (key, digest)
+            if not pending:
+                return []
+
+            written: List[str] = []
+
+            def on_batch(docs: List[Document], ids: List[str]):
+                self.bm25.add(ids, [doc.page_content for doc in docs])
+                written.extend(ids)
+
+            try:
+                report = ingest(
+                    list(pending),
+                    self.vectorstore,
+                    # Same IDs for the same content, so every write is an upsert
+                    split=lambda path, pages: self._split_pages(*pending[path], pages),
+                    batch_size=batch_size,
+                    max_workers=max_workers,
+                    on_progress=on_progress,
+                    on_batch=on_batch,
+                )
+            except BaseException:
+                # No file of this call was recorded: take back the chunks already
+                # written so none are left behind unowned. Chunks of files indexed
+                # before keep their IDs (these depend on the content).
+                owned = {chunk for entry in self._files.values() for chunk in entry.chunk_ids}
+                orphans = [chunk for chunk in dict.fromkeys(written) if chunk not in owned]
+                if orphans:
+                    self._delete_chunks(orphans)
+                raise
+
+            for path, ids in report.chunk_ids.items():
+                key, digest = pending[path]
+                existing = self._files.get(key)
+                if existing is not None:
+                    stale = sorted(set(existing.chunk_ids) - set(ids))
+                    if stale:
+                        self._delete_chunks(stale)
+                self._files[key] = IndexedFile(file_hash=digest, chunk_ids=ids)
+                self.version += 1
+            if report.chunk_ids:
+                self._persist()
+            return report.failures
+
+    def add_file(self, path: Path) -> int:
+        """
+        Add (or update) a file in the index.
+
+        Returns:
+            int: Number of chunks written, 0 if the file was already indexed
+        """
+        path = Path(path)
+        key = str(path.resolve())
+        with self._lock:
+            version = self.version
+            failures = self.add_files([path], max_workers=1, on_progress=None)
+            if failures:
+                raise ValueError(f"Error loading {path}: {failures[0].error}")
+            if self.version == version:
+                return 0
+            return len(self._files[key].chunk_ids)
+
+    def replace_file(self, path: Path) -> int:
+        """Re-index a file whose content changed on disk."""
+        return self.add_file(path)
+
+    def remove_file(self, path: Path) -> int:
+        """
+        Remove a file's chunks from the index. The file need not exist anymore.
+
+        Returns:
+            int: Number of chunks deleted
+        """
+        key = str(Path(path).resolve())
+        with self._lock, self._persist_lock:
+            existing = self._files.pop(key, None)
+            if existing is None:
+                return 0
+            if existing.chunk_ids:
+                self._delete_chunks(existing.chunk_ids)
+            self.version += 1
+            self._persist()
+            return len(existing.chunk_ids)
+
+    def sync(
+        self,
+        data_dir: Path,
+        max_workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ) -> SyncResult:
+        """Bring the index in line with the PDFs currently in ``data_dir``."""
+        pdf_files = sorted(Path(data_dir).glob("*.pdf"))[:MAX_FILES]
+        wanted = {str(pdf_file.resolve()): pdf_file for pdf_file in pdf_files}
+        result = SyncResult()
+
+        # Removals and additions are saved together, once
+        with self.deferred_persist():
+            for key in list(self._files):
+                if key not in wanted:
+                    self.remove_file(Path(key))
+                    result.removed.append(key)
+
+            to_load = []
+            for key, pdf_file in wanted.items():
+                existing = self._files.get(key)
+                if existing is None:
+                    result.added.append(key)
+                    to_load.append(pdf_file)
+                elif existing.file_hash != file_hash(pdf_file):
+                    result.replaced.append(key)
+                    to_load.append(pdf_file)
+
+            result.failures = self.add_files(to_load, max_workers=max_workers, batch_size=batch_size)
+            failed = {str(Path(failure.path).resolve()) for failure in result.failures}
+            result.added = [key for key in result.added if key not in failed]
+            result.replaced = [key for key in result.replaced if key not in failed]
+        return result
+
+    def close(self):
+        """Release the underlying collection."""
+        if hasattr(self.vectorstore, "delete_collection"):
+            self.vectorstore.delete_collection()
+
+
+def index_dir(data_dir: Path, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> Path:
+    """Directory a persisted index of ``data_dir`` with these settings lives in."""
+    settings = f"{Path(data_dir).resolve()}:{chunk_size}:{chunk_overlap}:{EMBEDDING_MODEL}"
+    return get_cache_dir() / "index" / hashlib.sha256(settings.encode()).hexdigest()[:16]
+
+
+def index_lock(data_dir: Path, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP):
+    """
+    Cross-process lock of the persisted index of ``data_dir``. Hold it while
+    loading and syncing so a second process waits for the first one's index
+    instead of building the same one next to it.
+    """
+    return file_lock(index_dir(data_dir, chunk_size, chunk_overlap) / _LOCK_FILE)
+
+
+def create_incremental_index(
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    data_dir: Optional[Path] = None,
+    backend: Optional[str] = None,
+) -> IncrementalIndex:
+    """
+    Create an incremental index with the configured vector-store backend.
+
+    Backends that can persist (``numpy``) keep one index directory per data
+    directory and settings, and pick it back up on the next start so only the
+    files that changed since then are re-indexed.
+    """
+    text_splitter = create_text_splitter(chunk_size, chunk_overlap)
+    embeddings = create_embeddings()
+
+    persist_dir = index_dir(data_dir, chunk_size, chunk_overlap) if data_dir is not None else None
+    vectorstore = create_vectorstore(embeddings, backend=backend, persist_dir=persist_dir)
+    if not hasattr(vectorstore, "save"):
+        persist_dir = None
+    return IncrementalIndex(vectorstore, text_splitter, persist_dir=persist_dir)
@@ -0,0 +1,145 @@
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.utils.instrumentation import get_logger
+from src.utils.settings import get_data_dir
+
+from .embeddings import EMBEDDING_MODEL
+from .incremental_index import IncrementalIndex, file_hash
+from .loader import MAX_FILES
+from .retriever import CHUNK_OVERLAP, CHUNK_SIZE, build_index
+
+
+logger = get_logger(__name__)
+
+def corpus_fingerprint(
+    data_dir: Path,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    embedding_model: str = EMBEDDING_MODEL,
+) -> str:
+    """
+    Fingerprint a corpus: the hashes of its PDF files plus the settings used to
+    chunk and embed them. Two corpora with the same fingerprint produce the
+    same index.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{chunk_size}:{chunk_overlap}:{embedding_model}".encode())
+    for pdf_file in sorted(Path(data_dir).glob("*.pdf"))[:MAX_FILES]:
+        digest.update(pdf_file.name.encode())
+        digest.update(file_hash(pdf_file).encode())
+    return digest.hexdigest()
+
+
+class IndexRegistry:
+    """
+    Long-lived registry of built indexes, one per data directory.
+
+    An index is built the first time it is requested and reused for as long
+    as the corpus fingerprint of its data directory stays the same. When files
+    are added, removed or edited, only those files are re-indexed; callers
+    that know what changed can apply it directly with ``add_file``,
+    ``remove_file`` and ``replace_file``. Changing the chunking or embedding
+    settings drops the index and rebuilds it.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # data_dir -> (fingerprint, index)
+        self._entries: Dict[str, Tuple[str, IncrementalIndex]] = {}
+
+    @staticmethod
+    def _key(data_dir: Optional[Path]) -> Tuple[Path, str]:
+        data_dir = Path(data_dir) if data_dir is not None else get_data_dir()
+        return data_dir, str(data_dir.resolve())
+
+    def get_index(self, data_dir: Optional[Path] = None) -> IncrementalIndex:
+        """Return the index for ``data_dir``, building or syncing it if needed."""
+        data_dir, key = self._key(data_dir)
+
+        with self._lock:
+            fingerprint = corpus_fingerprint(data_dir)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                return entry[1]
+
+            if entry is None:
+                index = build_index(data_dir)
+            else:
+                index = entry[1]
+                result = index.sync(data_dir)
+                logger.info(
+                    f"Corpus in {data_dir} changed: {len(result.added)} added, "
+                    f"{len(result.replaced)} replaced, {len(result.removed)} removed, "
+                    f"{len(result.failures)} failed"
+                )
+            self._entries[key] = (fingerprint, index)
+            return index
+
+    def get_retriever(self, data_dir: Optional[Path] = None):
+        """Return the retriever for ``data_dir``, building it if needed."""
+        return self.get_index(data_dir).as_retriever()
+
+    def fingerprint(self, data_dir: Optional[Path] = None) -> Optional[str]:
+        """Fingerprint of the index currently held for ``data_dir``, if any."""
+        _, key = self._key(data_dir)
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def _apply(self, path: Path, change) -> int:
+        # Apply an incremental change to an already built index. When no
+        # index exists yet there is nothing to update: the file is picked up
+        # by the next build.
+        path = Path(path)
+        data_dir, key = self._key(path.parent)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return 0
+            count = change(entry[1], path)
+            self._entries[key] = (corpus_fingerprint(data_dir), entry[1])
+            return count
+
+    def add_file(self, path: Path) -> int:
+        """Index a new file of an existing corpus."""
+        return self._apply(path, IncrementalIndex.add_file)
+
+    def replace_file(self, path: Path) -> int:
+        """Re-index a file whose content changed."""
+        return self._apply(path, IncrementalIndex.replace_file)
+
+    def remove_file(self, path: Path) -> int:
+        """Drop a deleted file from an existing corpus."""
+        return self._apply(path, IncrementalIndex.remove_file)
+
+    def invalidate(self, data_dir: Optional[Path] = None):
+        """
+        Drop the index for ``data_dir`` (or every index when None) so the next
+        request rebuilds it from scratch.
+        """
+        with self._lock:
+            if data_dir is None:
+                keys = list(self._entries)
+            else:
+                keys = [self._key(data_dir)[1]]
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    entry[1].close()
+
+
+# Process-wide registry used by the graph nodes
+index_registry = IndexRegistry()
+
+
+def get_retriever(data_dir: Optional[Path] = None):
+    """Return the shared retriever for ``data_dir``."""
+    return index_registry.get_retriever(data_dir)
+
+
+def invalidate_index(data_dir: Optional[Path] = None):
+    """Invalidate the shared index for ``data_dir`` (all indexes when None)."""
+    index_registry.invalidate(data_dir)
@@ -0,0 +1,182 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from langchain.schema import Document
+
+from src.utils.instrumentation import get_logger
+from src.utils.settings import get_int
+
+from .loader import LoadFailure, iter_pdfs
+
+logger = get_logger(__name__)
+
+# Chunks embedded and written to the store per request
+INGEST_BATCH_SIZE = get_int("CRAG_INGEST_BATCH_SIZE", 256)
+# Batches split ahead of the embedder before loading pauses
+INGEST_QUEUE_SIZE = get_int("CRAG_INGEST_QUEUE_SIZE", 4)
+
+T = TypeVar("T")
+
+# Marks the end of the batch stream
+_DONE = object()
+
+
+@dataclass
+class IngestProgress:
+    """Running totals reported while ingesting."""
+
+    files: int = 0
+    pages: int = 0
+    chunks: int = 0
+    batches: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def __str__(self):
+        rate = self.chunks / self.elapsed if self.elapsed else 0.0
+        return (
+            f"{self.files} files, {self.pages} pages, {self.chunks} chunks "
+            f"in {self.batches} batches ({self.elapsed:.1f}s, {rate:.0f} chunks/s)"
+        )
+
+
+@dataclass
+class IngestReport:
+    """Outcome of an ingestion run."""
+
+    chunk_ids: Dict[str, List[str]] = field(default_factory=dict)
+    failures: List[LoadFailure] = field(default_factory=list)
+    progress: IngestProgress = field(default_factory=IngestProgress)
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yield lists of up to ``size`` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def print_progress(progress: IngestProgress):
+    logger.info(f"Ingested {progress}")
+
+
+def ingest(
+    paths: Iterable[Path],
+    vectorstore,
+    split: Callable[[str, List[Document]], Iterable[Document]],
+    batch_size: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    on_progress: Optional[Callable[[IngestProgress], None]] = print_progress,
+    on_batch: Optional[Callable[[List[Document], List[str]], None]] = None,
+    load: Callable[..., Iterator[Tuple[str, object]]] = iter_pdfs,
+) -> IngestReport:
+    """
+    Stream PDFs into a vector store: load pages, split, then embed and write in
+    fixed-size batches.
+
+    Loading and splitting run in a background thread that hands batches to the
+    caller's thread through a bounded queue. When embedding falls behind, the
+    queue fills up and loading pauses, so memory stays flat regardless of the
+    corpus size: at most ``queue_size`` batches plus the files being loaded
+    are held at any time.
+
+    Args:
+        paths (Iterable[Path]): PDF files (or other sources ``load`` accepts)
+            to ingest
+        vectorstore: Store supporting ``add_documents(documents, ids=...)``
+        split (Callable): Turns a file's pages into chunks; each chunk must
+            carry a ``chunk_id`` in its metadata
+        batch_size (int, optional): Chunks per embedding request, defaults to
+            CRAG_INGEST_BATCH_SIZE
+        queue_size (int, optional): Batches buffered ahead of the embedder,
+            defaults to CRAG_INGEST_QUEUE_SIZE
+        max_workers (int, optional): Processes used to load PDFs
+        on_progress (Callable, optional): Called after every written batch
+        on_batch (Callable, optional): Receives every written batch and its
+            IDs, to keep secondary indexes in step with the store
+        load (Callable, optional): Yields ``(source, pages | LoadFailure)``
+            for the given sources as they are loaded, defaults to
+            ``iter_pdfs``; ``iter_urls`` streams web pages instead
+
+    Returns:
+        IngestReport: Chunk IDs written per file, files that failed to load and
+            the final progress counters
+    """
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    batches: "queue.Queue" = queue.Queue(maxsize=queue_size or INGEST_QUEUE_SIZE)
+    report = IngestReport()
+    progress = report.progress
+    stop = threading.Event()
+
+    def chunks() -> Iterator[Tuple[str, Document]]:
+        for path, pages in load(paths, max_workers=max_workers):
+            if stop.is_set():
+                return
+            if isinstance(pages, LoadFailure):
+                report.failures.append(pages)
+                continue
+            report.chunk_ids[path] = []
+            progress.files += 1
+            progress.pages += len(pages)
+            for chunk in split(path, pages):
+                yield path, chunk
+
+    def put(item):
+        # Blocks while the queue is full: this is the backpressure. Gives up
+        # once the consumer has stopped so the thread can always exit.
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def produce():
+        try:
+            for batch in batched(chunks(), batch_size):
+                put(batch)
+        except BaseException as e:
+            put(e)
+        else:
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, name="crag-ingest", daemon=True)
+    producer.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                break
+            if isinstance(batch, BaseException):
+                raise batch
+
+            documents = [chunk for _, chunk in batch]
+            ids = [chunk.metadata["chunk_id"] for chunk in documents]
+            vectorstore.add_documents(documents, ids=ids)
+            if on_batch is not None:
+                on_batch(documents, ids)
+            for (path, _), chunk_id in zip(batch, ids):
+                report.chunk_ids[path].append(chunk_id)
+
+            progress.chunks += len(batch)
+            progress.batches += 1
+            if on_progress is not None:
+                on_progress(progress)
+    finally:
+        stop.set()
+        producer.join()
+
+    return report
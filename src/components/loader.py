@@ -0,0 +1,131 @@
+import itertools
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from langchain.schema import Document
+
+from src.utils.settings import get_int
+
+# Maximum number of PDFs indexed from a data directory / uploaded in the app
+MAX_FILES = get_int("CRAG_MAX_FILES", 500)
+# Worker processes used to extract pages (0 = one per CPU)
+LOADER_WORKERS = get_int("CRAG_LOADER_WORKERS", 0)
+
+
+@dataclass
+class LoadFailure:
+    """A file that could not be loaded and why."""
+
+    path: str
+    error: str
+
+
+@dataclass
+class LoadResult:
+    """Pages extracted per file, plus the files that failed to load."""
+
+    pages: Dict[str, List[Document]] = field(default_factory=dict)
+    failures: List[LoadFailure] = field(default_factory=list)
+
+    @property
+    def page_count(self) -> int:
+        return sum(len(pages) for pages in self.pages.values())
+
+
+def _load_pdf(path: str) -> List[Document]:
+    # Runs in a worker process, so it must stay a top-level function
+    from langchain_community.document_loaders import PyPDFLoader
+
+    return PyPDFLoader(path).load()
+
+
+def _worker_count(max_workers: Optional[int], n_files: int) -> int:
+    workers = max_workers or LOADER_WORKERS or os.cpu_count() or 1
+    return max(1, min(workers, n_files))
+
+
+def iter_pdfs(
+    paths: Iterable[Path],
+    max_workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+) -> Iterator[Tuple[str, Union[List[Document], LoadFailure]]]:
+    """
+    Extract the pages of many PDFs in parallel, yielding each file as soon as
+    it is loaded.
+
+    At most ``max_pending`` files are submitted to the pool ahead of the
+    consumer, so a slow consumer holds back loading instead of letting
+    extracted pages pile up in memory.
+
+    Args:
+        paths (Iterable[Path]): PDF files to load
+        max_workers (int, optional): Number of worker processes, defaults to
+            CRAG_LOADER_WORKERS or the CPU count
+        max_pending (int, optional): Files loaded ahead of the consumer,
+            defaults to twice the worker count
+
+    Yields:
+        Tuple[str, Union[List[Document], LoadFailure]]: The file path and either
+            its pages or the reason it failed to load
+    """
+    paths = [str(path) for path in paths]
+    if not paths:
+        return
+
+    workers = _worker_count(max_workers, len(paths))
+    if workers == 1:
+        # Not worth paying for a process pool
+        for path in paths:
+            try:
+                yield path, _load_pdf(path)
+            except Exception as e:
+                yield path, LoadFailure(path=path, error=str(e))
+        return
+
+    max_pending = max_pending or workers * 2
+    remaining = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_load_pdf, path): path
+            for path in itertools.islice(remaining, max_pending)
+        }
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = futures.pop(future)
+                try:
+                    yield path, future.result()
+                except Exception as e:
+                    yield path, LoadFailure(path=path, error=str(e))
+                # Refill the pool one file at a time, after the consumer is done
+                for next_path in itertools.islice(remaining, 1):
+                    futures[pool.submit(_load_pdf, next_path)] = next_path
+
+
+def load_pdfs(paths: Iterable[Path], max_workers: Optional[int] = None) -> LoadResult:
+    """
+    Extract the pages of many PDFs in parallel with a process pool.
+
+    Args:
+        paths (Iterable[Path]): PDF files to load
+        max_workers (int, optional): Number of worker processes, defaults to
+            CRAG_LOADER_WORKERS or the CPU count
+
+    Returns:
+        LoadResult: Pages keyed by the file path, and one LoadFailure per file
+            that raised while loading
+    """
+    paths = [str(path) for path in paths]
+    result = LoadResult()
+    for path, loaded in iter_pdfs(paths, max_workers=max_workers):
+        if isinstance(loaded, LoadFailure):
+            result.failures.append(loaded)
+        else:
+            result.pages[path] = loaded
+
+    # Keep the input order regardless of completion order
+    result.pages = {path: result.pages[path] for path in paths if path in result.pages}
+    return result
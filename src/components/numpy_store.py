@@ -0,0 +1,423 @@
+import copy
+import json
+import time
+import uuid
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.utils.file_lock import temp_path
+from src.utils.rw_lock import ReadWriteLock
+
+from .ann import IVFPQConfig, IVFPQIndex, recall_at_k
+
+_VECTORS_FILE = "vectors.npy"
+_DOCS_FILE = "docs.jsonl"
+_ANN_FILE = "ann.npz"
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Local vector store keeping every embedding in one contiguous float32 matrix.
+
+    Vectors are L2-normalised on insert so a query is a single matrix-vector
+    product followed by a partial sort for the top k. Rows freed by ``delete``
+    are reused by later inserts. ``save`` writes the matrix as a ``.npy`` file
+    that ``load`` memory-maps, so opening a large index is cheap and pages are
+    only read when searched.
+
+    With an ``ann_config`` the store builds an IVF-PQ index once it holds
+    ``min_rows`` vectors and answers queries approximately from it. Vectors
+    written after the index was built are searched exactly until the index is
+    rebuilt, which happens automatically once they make up a quarter of it.
+
+    Searches and reads share a read/write lock that updates take exclusively,
+    so a search never sees the matrix half-grown or a row half-written while
+    an index is being synced.
+
+    Args:
+        embedding (Embeddings): Model used to embed texts and queries
+        ann_config (IVFPQConfig, optional): Enables approximate search
+    """
+
+    def __init__(self, embedding: Embeddings, ann_config: Optional[IVFPQConfig] = None):
+        self.embedding = embedding
+        self.ann_config = ann_config
+        self._ann: Optional[IVFPQIndex] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(0, dtype=bool)
+        self._covered = np.zeros(0, dtype=bool)  # rows encoded in the ANN index
+        self._size = 0  # rows in use, including deleted ones
+        self._ids: List[Optional[str]] = []
+        self._texts: List[Optional[str]] = []
+        self._metadatas: List[Optional[dict]] = []
+        self._row_of: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._rw = ReadWriteLock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    # Storage --------------------------------------------------------------------------------------------
+
+    def _ensure_capacity(self, dim: int, extra: int):
+        if self._vectors is None:
+            self._vectors = np.zeros((max(extra, 1024), dim), dtype=np.float32)
+            self._valid = np.zeros(len(self._vectors), dtype=bool)
+            self._covered = np.zeros(len(self._vectors), dtype=bool)
+            return
+        if self._vectors.shape[1] != dim:
+            raise ValueError(f"Embedding size {dim} does not match index size {self._vectors.shape[1]}")
+        needed = self._size + extra
+        capacity = len(self._vectors)
+        if needed > capacity:
+            capacity = max(needed, capacity * 2)
+        elif self._vectors.flags.writeable:
+            return
+        # Grow geometrically; this also copies a read-only memory map into RAM
+        vectors = np.zeros((capacity, dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        valid = np.zeros(capacity, dtype=bool)
+        valid[:self._size] = self._valid[:self._size]
+        covered = np.zeros(capacity, dtype=bool)
+        covered[:self._size] = self._covered[:self._size]
+        self._vectors, self._valid, self._covered = vectors, valid, covered
+
+    def _allocate_row(self) -> int:
+        if self._free:
+            return self._free.pop()
+        row = self._size
+        self._size += 1
+        self._ids.append(None)
+        self._texts.append(None)
+        self._metadatas.append(None)
+        return row
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add_vectors(
+        self,
+        vectors: Sequence[Sequence[float]],
+        texts: Sequence[str],
+        metadatas: Optional[Sequence[dict]] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """Insert precomputed embeddings; existing IDs are overwritten."""
+        vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        if len(vectors) == 0:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids is not None else [None] * len(texts)
+
+        written = []
+        with self._rw.write():
+            self._ensure_capacity(vectors.shape[1], len(vectors))
+            for vector, text, metadata, doc_id in zip(vectors, texts, metadatas, ids):
+                if doc_id is None:
+                    doc_id = uuid.uuid4().hex
+                row = self._row_of.get(doc_id)
+                if row is None:
+                    row = self._allocate_row()
+                    self._row_of[doc_id] = row
+                self._vectors[row] = vector
+                self._valid[row] = True
+                self._covered[row] = False
+                self._ids[row] = doc_id
+                self._texts[row] = text
+                self._metadatas[row] = dict(metadata or {})
+                written.append(doc_id)
+        return written
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_vectors(vectors, texts, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            return False
+        with self._rw.write():
+            if self._vectors is not None and not self._vectors.flags.writeable:
+                self._ensure_capacity(self._vectors.shape[1], 0)
+            for doc_id in ids:
+                row = self._row_of.pop(doc_id, None)
+                if row is None:
+                    continue
+                self._valid[row] = False
+                self._covered[row] = False
+                self._ids[row] = self._texts[row] = self._metadatas[row] = None
+                self._free.append(row)
+        return True
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        with self._rw.read():
+            return [self._document(self._row_of[doc_id]) for doc_id in ids if doc_id in self._row_of]
+
+    def _document(self, row: int) -> Document:
+        return Document(id=self._ids[row], page_content=self._texts[row], metadata=dict(self._metadatas[row]))
+
+    # Search ---------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def _top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, len(rows))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def _exact(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self._vectors[:self._size] @ query
+        scores = np.where(self._valid[:self._size], scores, -np.inf)
+        return self._top_k(np.arange(self._size), scores, min(k, len(self._row_of)))
+
+    def search_vectors(self, query: np.ndarray, k: int, exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Cosine top-k over the live rows; returns (rows, scores)."""
+        if not exact:
+            self._refresh_ann()
+        with self._rw.read():
+            return self._search_vectors(query, k, exact)
+
+    def _search_vectors(self, query: np.ndarray, k: int, exact: bool) -> Tuple[np.ndarray, np.ndarray]:
+        # Caller holds the read lock
+        if self._vectors is None or not self._row_of:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = self._normalize(np.asarray(query, dtype=np.float32))
+        if exact or not self._ann_ready():
+            return self._exact(query, k)
+
+        # Over-fetch to make up for deleted or rewritten rows, then re-rank
+        fetch = k * max(self.ann_config.rerank, 1) + 8
+        rows, scores = self._ann.search(query, fetch)
+        keep = self._valid[rows] & self._covered[rows]
+        rows, scores = rows[keep], scores[keep]
+        if self.ann_config.rerank:
+            scores = self._vectors[rows] @ query
+
+        # Rows written since the index was built are searched exactly
+        tail = np.flatnonzero(self._valid[:self._size] & ~self._covered[:self._size])
+        if len(tail):
+            rows = np.concatenate([rows, tail])
+            scores = np.concatenate([scores, self._vectors[tail] @ query])
+        return self._top_k(rows, scores, k)
+
+    def _ann_ready(self) -> bool:
+        return (
+            self.ann_config is not None
+            and self._ann is not None
+            and len(self._row_of) >= self.ann_config.min_rows
+        )
+
+    def _ann_stale(self) -> bool:
+        if self.ann_config is None or len(self._row_of) < self.ann_config.min_rows:
+            return False
+        uncovered = len(self._row_of) - int(self._covered[:self._size].sum())
+        return self._ann is None or uncovered > len(self._ann) // 4
+
+    def _refresh_ann(self):
+        # Rebuilt under the write lock; searches meanwhile wait rather than
+        # scanning every row exactly
+        with self._rw.read():
+            stale = self._ann_stale()
+        if stale:
+            with self._rw.write():
+                if self._ann_stale():
+                    self._build_ann_index()
+
+    def build_ann_index(self, config: Optional[IVFPQConfig] = None) -> IVFPQIndex:
+        """(Re)build the approximate index over every live row."""
+        with self._rw.write():
+            return self._build_ann_index(config)
+
+    def _build_ann_index(self, config: Optional[IVFPQConfig] = None) -> IVFPQIndex:
+        self.ann_config = config or self.ann_config or IVFPQConfig()
+        rows = np.flatnonzero(self._valid[:self._size])
+        index = IVFPQIndex(self.ann_config)
+        index.train(self._vectors[rows])
+        index.add(rows, self._vectors[rows])
+        self._covered[:] = False
+        self._covered[rows] = True
+        self._ann = index
+        return index
+
+    def evaluate_ann(self, queries: Sequence[Sequence[float]], k: int = 10) -> Dict[str, float]:
+        """
+        Measure the approximate index against exact search.
+
+        Returns:
+            Dict[str, float]: Mean recall@k, mean latency of both searches in
+                milliseconds and the ANN index size in bytes
+        """
+        if self._ann is None:
+            self.build_ann_index()
+        recalls, ann_ms, exact_ms = [], [], []
+        for query in np.asarray(queries, dtype=np.float32):
+            start = time.perf_counter()
+            exact_rows, _ = self.search_vectors(query, k, exact=True)
+            exact_ms.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            approx_rows, _ = self.search_vectors(query, k)
+            ann_ms.append((time.perf_counter() - start) * 1000)
+            recalls.append(recall_at_k(approx_rows, exact_rows))
+        return {
+            f"recall@{k}": float(np.mean(recalls)),
+            "ann_ms": float(np.mean(ann_ms)),
+            "exact_ms": float(np.mean(exact_ms)),
+            "ann_bytes": self._ann.memory_bytes(),
+            "vector_bytes": int(len(self._row_of) * self._vectors.shape[1] * 4),
+        }
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4
+    ) -> List[Tuple[Document, float]]:
+        self._refresh_ann()
+        with self._rw.read():
+            # Rows are turned into documents before an update can reuse them
+            rows, scores = self._search_vectors(np.asarray(embedding), k, exact=False)
+            return [(self._document(int(row)), float(score)) for row, score in zip(rows, scores)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores are already cosine similarities
+        return lambda score: score
+
+    # Persistence ----------------------------------------------------------------------------------------
+
+    def save(self, path: Path):
+        """Write the live rows to ``path`` (a directory), compacting deleted rows."""
+        with self._rw.read():
+            self._save(Path(path))
+
+    def _save(self, path: Path):
+        path.mkdir(parents=True, exist_ok=True)
+        rows = sorted(self._row_of.values())
+
+        tmp_vectors = None
+        if self._vectors is not None:
+            tmp_vectors = temp_path(path / _VECTORS_FILE)
+            out = np.lib.format.open_memmap(
+                tmp_vectors, mode="w+", dtype=np.float32, shape=(len(rows), self._vectors.shape[1])
+            )
+            if rows:
+                out[:] = self._vectors[rows]
+            out.flush()
+            del out
+
+        tmp_docs = temp_path(path / _DOCS_FILE)
+        with open(tmp_docs, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps({
+                    "id": self._ids[row],
+                    "text": self._texts[row],
+                    "metadata": self._metadatas[row],
+                }) + "\n")
+
+        if tmp_vectors is not None:
+            tmp_vectors.replace(path / _VECTORS_FILE)
+        elif (path / _VECTORS_FILE).exists():
+            # Never allocated (nothing was ever added): no embedding size to record
+            (path / _VECTORS_FILE).unlink()
+        tmp_docs.replace(path / _DOCS_FILE)
+
+        ann_path = path / _ANN_FILE
+        if self._ann is not None:
+            # Saved rows are compacted, so renumber the index the same way
+            mapping = np.full(self._size, -1, dtype=np.int64)
+            saved = np.asarray(rows, dtype=np.int64)
+            covered = saved[self._covered[saved]] if len(saved) else saved
+            mapping[covered] = np.searchsorted(saved, covered)
+            ann = copy.copy(self._ann)
+            ann.remap(mapping)
+            ann.save(ann_path)
+        elif ann_path.exists():
+            ann_path.unlink()
+
+    @staticmethod
+    def exists(path: Path) -> bool:
+        # An empty store is saved without vectors.npy
+        return (Path(path) / _DOCS_FILE).exists()
+
+    @classmethod
+    def load(
+        cls, path: Path, embedding: Embeddings, ann_config: Optional[IVFPQConfig] = None
+    ) -> "NumpyVectorStore":
+        """Open an index written by ``save``; the matrix is memory-mapped read-only."""
+        path = Path(path)
+        store = cls(embedding, ann_config=ann_config)
+        with open(path / _DOCS_FILE, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        vectors = None
+        if (path / _VECTORS_FILE).exists():
+            vectors = np.load(path / _VECTORS_FILE, mmap_mode="r")
+            if vectors.shape[1] == 0:
+                # Written by older versions for a store that was never allocated;
+                # the embedding size is set again by the first add
+                vectors = None
+        if vectors is None and records:
+            raise ValueError(f"Vector store in {path} has {len(records)} documents but no vectors")
+
+        store._vectors = vectors
+        store._size = len(records)
+        store._valid = np.ones(len(records), dtype=bool)
+        store._ids = [record["id"] for record in records]
+        store._texts = [record["text"] for record in records]
+        store._metadatas = [record["metadata"] for record in records]
+        store._row_of = {doc_id: row for row, doc_id in enumerate(store._ids)}
+        store._covered = np.zeros(len(records), dtype=bool)
+        if ann_config is not None and (path / _ANN_FILE).exists():
+            ann = IVFPQIndex.load(path / _ANN_FILE)
+            saved = ann.config
+            if saved.m == ann_config.m and saved.nlist == ann_config.nlist:
+                # Only the search-time settings come from the caller; the codes
+                # and centroids keep the layout they were trained with
+                ann.config = replace(saved, nprobe=ann_config.nprobe, rerank=ann_config.rerank)
+                store._ann = ann
+                store._covered[ann.rows] = True
+            # Otherwise the index is dropped and rebuilt with the new layout by
+            # the next search once the store holds ``min_rows`` vectors
+        return store
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
@@ -0,0 +1,169 @@
+import asyncio
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from src.utils.settings import get_float, get_int
+
+from .generator import create_chain
+from .grader import create_grader
+from .prompts import prompt_registry
+from .rewriter import create_rewriter
+from .search import create_search_tool
+from .speculation import SPECULATION_WORKERS
+
+# Connection pool of the HTTP client shared by every OpenAI chain
+HTTP_MAX_CONNECTIONS = get_int("CRAG_HTTP_MAX_CONNECTIONS", 20)
+HTTP_MAX_KEEPALIVE = get_int("CRAG_HTTP_MAX_KEEPALIVE", 10)
+HTTP_TIMEOUT = get_float("CRAG_HTTP_TIMEOUT", 60.0)
+
+
+class ComponentPool:
+    """
+    Process-wide pool of the chains and tools used by the graph nodes.
+
+    Each component is built the first time it is requested and reused by
+    every later node call, session and thread. All OpenAI chains share one
+    pooled ``httpx.Client`` and, for the async graph, one pooled
+    ``httpx.AsyncClient``, so requests reuse open connections instead of each
+    chain opening its own. The async client belongs to the event loop it was
+    first used on (the API server's, or a batch run's). Components read their
+    API keys when they are built: call ``reload`` after the keys change to
+    drop them (and the HTTP clients) so the next request builds them again.
+    The old clients are closed once requests already in flight on them have
+    had CRAG_HTTP_TIMEOUT seconds to finish. Components are also dropped when
+    the prompt registry picks up new prompts.
+
+    The pool also owns the thread pool speculative searches run on, started
+    on first use with CRAG_SPECULATION_WORKERS threads. ``reload`` retires it
+    after the work already queued, and ``close`` (run at exit) shuts it down.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._components: Dict[str, Any] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._speculation_executor: Optional[ThreadPoolExecutor] = None
+        self._factories: Dict[str, Callable[[], Any]] = {
+            "grader": lambda: create_grader(**self._clients()),
+            "batch_grader": lambda: create_grader(batch=True, **self._clients()),
+            "chain": lambda: create_chain(**self._clients()),
+            "rewriter": lambda: create_rewriter(**self._clients()),
+            "search_tool": create_search_tool,
+        }
+        prompt_registry.on_change(lambda changed: self.invalidate())
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+
+    @property
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = httpx.Client(limits=self._limits(), timeout=HTTP_TIMEOUT)
+            return self._http_client
+
+    @property
+    def http_async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._http_async_client is None:
+                self._http_async_client = httpx.AsyncClient(limits=self._limits(), timeout=HTTP_TIMEOUT)
+                try:
+                    self._async_loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    # Built outside a loop; bound to the first loop using it
+                    self._async_loop = None
+            return self._http_async_client
+
+    @property
+    def speculation_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._speculation_executor is None:
+                self._speculation_executor = ThreadPoolExecutor(
+                    max_workers=SPECULATION_WORKERS, thread_name_prefix="crag-speculate"
+                )
+            return self._speculation_executor
+
+    def _clients(self) -> Dict[str, Any]:
+        return {"http_client": self.http_client, "http_async_client": self.http_async_client}
+
+    def get(self, name: str) -> Any:
+        """Return the component ``name``, building it on first use."""
+        component = self._components.get(name)
+        if component is None:
+            with self._lock:
+                component = self._components.get(name)
+                if component is None:
+                    component = self._factories[name]()
+                    self._components[name] = component
+        return component
+
+    def grader(self):
+        return self.get("grader")
+
+    def batch_grader(self):
+        return self.get("batch_grader")
+
+    def chain(self):
+        return self.get("chain")
+
+    def rewriter(self):
+        return self.get("rewriter")
+
+    def search_tool(self):
+        return self.get("search_tool")
+
+    def invalidate(self):
+        """Drop every component; the HTTP client stays open."""
+        with self._lock:
+            self._components.clear()
+
+    def reload(self):
+        """Drop every component, the HTTP clients and the speculation executor, e.g. after the API keys change."""
+        with self._lock:
+            self._components.clear()
+            retired = (self._http_client, self._http_async_client, self._async_loop)
+            self._http_client = self._http_async_client = self._async_loop = None
+            executor, self._speculation_executor = self._speculation_executor, None
+        if executor is not None:
+            # Speculations already submitted still finish; the threads exit after
+            executor.shutdown(wait=False)
+        if retired[0] is not None or retired[1] is not None:
+            # Other sessions may still have requests on the old clients:
+            # close them once those requests have had time to finish
+            timer = threading.Timer(HTTP_TIMEOUT, _close_clients, retired)
+            timer.daemon = True
+            timer.start()
+
+    def close(self):
+        """Shut down the speculation executor and close the HTTP client."""
+        with self._lock:
+            executor, self._speculation_executor = self._speculation_executor, None
+            client, self._http_client = self._http_client, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if client is not None:
+            client.close()
+
+
+def _close_clients(
+    client: Optional[httpx.Client],
+    async_client: Optional[httpx.AsyncClient],
+    loop: Optional[asyncio.AbstractEventLoop],
+):
+    if client is not None:
+        client.close()
+    # The async client's connections live on its event loop; once that loop
+    # is closed they went with it
+    if async_client is not None and loop is not None and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(async_client.aclose(), loop)
+
+
+component_pool = ComponentPool()
+atexit.register(component_pool.close)
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from src.utils.instrumentation import get_logger
+from src.utils.settings import get_bool, get_float, get_str
+
+logger = get_logger(__name__)
+
+# Prompts shipped with the code, one JSON file per prompt
+BUNDLED_PROMPT_DIR = Path(__file__).resolve().parent.parent / "prompts"
+# Directory whose prompt files override the bundled ones by name
+PROMPT_DIR = get_str("CRAG_PROMPT_DIR")
+# Seconds between background refreshes (0 = load once at startup)
+PROMPT_REFRESH = get_float("CRAG_PROMPT_REFRESH", 0.0)
+# Also refresh prompts that name a LangChain Hub source from the hub
+PROMPT_HUB = get_bool("CRAG_PROMPT_HUB", False)
+
+_ROLES = {
+    "HumanMessagePromptTemplate": "human",
+    "SystemMessagePromptTemplate": "system",
+    "AIMessagePromptTemplate": "ai",
+}
+
+
+@dataclass(frozen=True)
+class PromptSpec:
+    """A named, versioned chat prompt: (role, template) message pairs."""
+
+    name: str
+    version: str
+    messages: Tuple[Tuple[str, str], ...]
+    hub: Optional[str] = None
+    source: str = "bundled"
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(json.dumps(self.messages).encode("utf-8")).hexdigest()
+
+    @property
+    def key(self) -> str:
+        """Version plus content hash, for caches of the prompt's answers."""
+        return f"{self.version}-{self.digest[:12]}"
+
+    def template(self) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_messages(list(self.messages))
+
+
+def load_prompt_file(path: Path, source: str) -> PromptSpec:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return PromptSpec(
+        name=data.get("name", Path(path).stem),
+        version=str(data["version"]),
+        messages=tuple((role, text) for role, text in data["messages"]),
+        hub=data.get("hub"),
+        source=source,
+    )
+
+
+def pull_hub_prompt(spec: PromptSpec) -> PromptSpec:
+    """Fetch ``spec.hub`` from LangChain Hub as a new version of ``spec``."""
+    from langchain import hub
+
+    pulled = hub.pull(spec.hub)
+    messages = tuple(
+        (_ROLES[type(message).__name__], message.prompt.template) for message in pulled.messages
+    )
+    return PromptSpec(spec.name, f"{spec.version}+hub", messages, spec.hub, source="hub")
+
+
+class PromptRegistry:
+    """
+    Process-wide registry of the generator, grader and re-writer prompts.
+
+    Prompts are read from the JSON files bundled in ``src/prompts`` once, when
+    the registry is created, so answering a question never waits on the
+    network. Files in ``override_dir`` replace bundled prompts of the same
+    name. ``refresh`` re-reads the files (and, with ``use_hub``, pulls the
+    prompts that name a hub source); ``start_refresh`` does so periodically on
+    a daemon thread. Listeners added with ``on_change`` are called with the
+    names of the prompts whose content changed, so components built from the
+    old prompts can be dropped.
+
+    Args:
+        bundled_dir (Path): Directory of the shipped prompt files
+        override_dir (Path, optional): Directory of local prompt overrides
+        use_hub (bool): Refresh hub-backed prompts from LangChain Hub
+    """
+
+    def __init__(
+        self,
+        bundled_dir: Path = BUNDLED_PROMPT_DIR,
+        override_dir: Optional[Path] = None,
+        use_hub: bool = False,
+    ):
+        self.bundled_dir = Path(bundled_dir)
+        self.override_dir = Path(override_dir) if override_dir else None
+        self.use_hub = use_hub
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[List[str]], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._prompts: Dict[str, PromptSpec] = self._read_files()
+
+    def _read_files(self) -> Dict[str, PromptSpec]:
+        prompts = {}
+        for directory, source in ((self.bundled_dir, "bundled"), (self.override_dir, "local")):
+            if directory is None or not directory.is_dir():
+                continue
+            for path in sorted(directory.glob("*.json")):
+                spec = load_prompt_file(path, source)
+                prompts[spec.name] = spec
+        return prompts
+
+    def get(self, name: str) -> PromptSpec:
+        try:
+            return self._prompts[name]
+        except KeyError:
+            raise KeyError(f"Unknown prompt {name!r}; known: {sorted(self._prompts)}") from None
+
+    def prompt(self, name: str) -> ChatPromptTemplate:
+        return self.get(name).template()
+
+    def versions(self) -> Dict[str, str]:
+        return {name: spec.key for name, spec in self._prompts.items()}
+
+    def on_change(self, callback: Callable[[List[str]], None]):
+        self._listeners.append(callback)
+
+    def refresh(self) -> List[str]:
+        """Reload the prompts and return the names of those that changed."""
+        prompts = self._read_files()
+        if self.use_hub:
+            for name, spec in prompts.items():
+                if spec.hub and spec.source == "bundled":
+                    try:
+                        prompts[name] = pull_hub_prompt(spec)
+                    except Exception as e:
+                        logger.warning(f"---PROMPTS: HUB PULL OF {spec.hub} FAILED, KEEPING CURRENT ({e})---")
+                        current = self._prompts.get(name)
+                        if current is not None and current.source == "hub":
+                            prompts[name] = current
+
+        with self._lock:
+            changed = [
+                name for name, spec in prompts.items()
+                if name not in self._prompts or self._prompts[name].key != spec.key
+            ]
+            self._prompts = prompts
+        if changed:
+            logger.info(f"---PROMPTS: UPDATED {', '.join(changed)}---")
+            for callback in self._listeners:
+                callback(changed)
+        return changed
+
+    def start_refresh(self, interval: float):
+        """
+        Refresh on a daemon thread right away, then every ``interval``
+        seconds (only once when ``interval`` is 0).
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.warning(f"---PROMPTS: REFRESH FAILED ({e})---")
+                if interval <= 0 or self._stop.wait(interval):
+                    return
+
+        self._thread = threading.Thread(target=run, name="crag-prompt-refresh", daemon=True)
+        self._thread.start()
+
+    def stop_refresh(self):
+        self._stop.set()
+
+
+prompt_registry = PromptRegistry(override_dir=PROMPT_DIR, use_hub=PROMPT_HUB)
+if PROMPT_REFRESH > 0 or PROMPT_HUB:
+    prompt_registry.start_refresh(PROMPT_REFRESH)
+
+
+def get_prompt(name: str) -> ChatPromptTemplate:
+    """Return the current chat prompt registered as ``name``."""
+    return prompt_registry.prompt(name)
@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.utils.disk_cache import CacheStats
+from src.utils.instrumentation import get_logger, record_cache
+from src.utils.settings import get_bool, get_float, get_int
+
+from .hybrid import doc_id
+from .vector_store import get_documents
+
+logger = get_logger(__name__)
+
+QUERY_CACHE = get_bool("CRAG_QUERY_CACHE", True)
+# Minimum cosine similarity between two questions to share their results
+QUERY_CACHE_THRESHOLD = get_float("CRAG_QUERY_CACHE_THRESHOLD", 0.95)
+QUERY_CACHE_SIZE = get_int("CRAG_QUERY_CACHE_SIZE", 1024)
+# Entry lifetime in seconds (0 = no expiry)
+QUERY_CACHE_TTL = get_float("CRAG_QUERY_CACHE_TTL", 3600.0)
+# Retrieval scores kept with cached chunks and restored on a hit
+_SCORE_KEYS = ("similarity", "rrf_score")
+
+
+class SemanticQueryCache:
+    """
+    In-memory cache of retrieval results keyed by question embedding.
+
+    Question vectors are kept normalised in one matrix, so a lookup is a
+    single matrix-vector product. The closest cached question is served when
+    its cosine similarity reaches ``threshold``. Entries are evicted least
+    recently used first and expire after ``ttl`` seconds. The cache is tied to
+    an index version: a lookup or store with another version empties it.
+
+    Args:
+        threshold (float): Minimum cosine similarity for a hit
+        max_entries (int): Upper bound on cached questions
+        ttl (float, optional): Entry lifetime in seconds, None for no expiry
+    """
+
+    def __init__(
+        self,
+        threshold: float = QUERY_CACHE_THRESHOLD,
+        max_entries: int = QUERY_CACHE_SIZE,
+        ttl: Optional[float] = QUERY_CACHE_TTL or None,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.version = None
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        # row -> (chunk ids, retrieval scores, created), least recently used first
+        self._entries: "OrderedDict[int, Tuple[List[str], List[Dict[str, float]], float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalise(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, version):
+        # Caller holds the lock
+        if version != self.version:
+            self._entries.clear()
+            self._valid[:] = False
+            self.version = version
+
+    def _drop(self, row: int):
+        del self._entries[row]
+        self._valid[row] = False
+
+    def lookup(self, vector, version) -> Optional[Tuple[List[str], List[Dict[str, float]], float]]:
+        """
+        Return the chunk IDs and retrieval scores cached for the closest
+        question, and that question's similarity to this one.
+        """
+        query = self._normalise(vector)
+        with self._lock:
+            self._check_version(version)
+            if not self._entries or self._matrix is None or self._matrix.shape[1] != len(query):
+                self.stats.record(misses=1)
+                return None
+            similarities = self._matrix @ query
+            similarities[~self._valid] = -np.inf
+            row = int(np.argmax(similarities))
+            similarity = float(similarities[row])
+            if similarity < self.threshold:
+                self.stats.record(misses=1)
+                return None
+            ids, scores, created = self._entries[row]
+            if self.ttl is not None and time.time() - created > self.ttl:
+                self._drop(row)
+                self.stats.record(misses=1)
+                return None
+            self._entries.move_to_end(row)
+            self.stats.record(hits=1)
+            return list(ids), scores, similarity
+
+    def store(self, vector, ids: List[str], version, scores: Optional[List[Dict[str, float]]] = None):
+        """Cache the chunk IDs (and their retrieval scores) retrieved for a question."""
+        query = self._normalise(vector)
+        with self._lock:
+            self._check_version(version)
+            if self._matrix is None or self._matrix.shape[1] != len(query):
+                self._matrix = np.zeros((self.max_entries, len(query)), dtype=np.float32)
+                self._entries.clear()
+                self._valid[:] = False
+            if len(self._entries) >= self.max_entries:
+                self._drop(next(iter(self._entries)))
+            row = int(np.argmin(self._valid))
+            self._matrix[row] = query
+            self._valid[row] = True
+            self._entries[row] = (list(ids), scores or [{} for _ in ids], time.time())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._valid[:] = False
+        self.stats.reset()
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Retriever serving near-duplicate questions from a SemanticQueryCache.
+
+    The question is embedded (through the embedding cache, so the wrapped
+    retriever's own query embedding is a cache hit) and looked up by
+    similarity. On a hit, the cached chunk IDs are fetched from the vector
+    store with the scores they had for the cached question, and are marked
+    ``cached_scores`` since those scores were not measured against this
+    question (``prefilter`` leaves such chunks to the grader); on a miss the wrapped retriever runs and its result is cached
+    under the current ``index.version``, so any change to the index
+    invalidates earlier answers.
+    """
+
+    retriever: BaseRetriever
+    index: Any
+    cache: SemanticQueryCache
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vectorstore = self.index.vectorstore
+        version = self.index.version
+        vector = vectorstore.embeddings.embed_query(query)
+
+        hit = self.cache.lookup(vector, version)
+        if hit is not None:
+            ids, scores, similarity = hit
+            documents = get_documents(vectorstore, ids)
+            if len(documents) == len(ids):
+                logger.info(f"---RETRIEVE: QUERY CACHE HIT (similarity {similarity:.3f})---")
+                record_cache("query", hits=1)
+                for doc, doc_scores in zip(documents, scores):
+                    doc.metadata.update(doc_scores)
+                    doc.metadata["cached_scores"] = True
+                return documents
+
+        record_cache("query", misses=1)
+        documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        ids = [doc_id(doc) for doc in documents]
+        if all(ids):
+            scores = [{key: doc.metadata[key] for key in _SCORE_KEYS if key in doc.metadata} for doc in documents]
+            self.cache.store(vector, ids, version, scores)
+        return documents
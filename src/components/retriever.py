@@ -1,102 +1,120 @@
 from pathlib import Path
-from typing import List
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
-
-def get_project_root() -> Path:
-    """Get the project root directory in a platform-agnostic way."""
-    current_file = Path(__file__)  # Gets the path of the current file (retriever.py)
-    # Go up twice: components -> src -> project_root
-    project_root = current_file.parent.parent.parent
-    return project_root
-
-def create_index():
-    """Create document index from PDF files in the data directory."""
+from typing import List, Optional
+
+from src.utils.instrumentation import get_logger
+from src.utils.settings import get_data_dir, get_int, get_project_root
+
+from .embeddings import EMBEDDING_MODEL, create_embeddings
+
+logger = get_logger(__name__)
+
+# Chunking / embedding settings. These are part of the corpus fingerprint, so
+# changing any of them invalidates previously built indexes.
+CHUNK_SIZE = get_int("CRAG_CHUNK_SIZE", 250)
+CHUNK_OVERLAP = get_int("CRAG_CHUNK_OVERLAP", 0)
+
+
+def build_index(
+    data_dir: Optional[Path] = None,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+):
+    """Build an incremental document index from PDF files in the data directory."""
+    from .incremental_index import create_incremental_index, index_lock
+
     # Get paths
-    project_root = get_project_root()
-    data_dir = project_root / "data"
+    data_dir = Path(data_dir) if data_dir is not None else get_data_dir()
     
     # Verify data directory exists
     if not data_dir.exists():
         raise FileNotFoundError(f"Data directory not found at {data_dir}")
     
     # List all PDF files
-    pdf_files = list(data_dir.glob("*.pdf"))
-    if not pdf_files:
+    if not any(data_dir.glob("*.pdf")):
         raise FileNotFoundError(f"No PDF files found in {data_dir}")
     
-    # Take first two PDFs (as in original code)
-    if len(pdf_files) > 1:
-        pdf_files = pdf_files[:2]
-    
-    # Load documents
-    docs = []
-    for pdf_file in pdf_files:
-        try:
-            loader = PyPDFLoader(str(pdf_file))
-            docs.extend(loader.load())
-        except Exception as e:
-            print(f"Error loading {pdf_file}: {str(e)}")
-            continue
+    # Load (in parallel), split and embed every file. Other processes sharing
+    # the cache wait here and then load the index persisted by the first one.
+    with index_lock(data_dir, chunk_size, chunk_overlap):
+        index = create_incremental_index(chunk_size=chunk_size, chunk_overlap=chunk_overlap, data_dir=data_dir)
+        result = index.sync(data_dir)
+    for failure in result.failures:
+        logger.warning(f"Error loading {failure.path}: {failure.error}")
     
-    if not docs:
+    if not index.files:
+        index.close()
         raise ValueError("No documents were successfully loaded")
     
-    print(f"Number of documents loaded: {len(docs)}")
+    logger.info(f"Number of files indexed: {len(index.files)}")
+    embeddings = index.vectorstore.embeddings
+    logger.info(f"Embedding cache: {getattr(embeddings, 'stats', 'disabled')}")
 
-    # Process documents
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=250, 
-        chunk_overlap=0
-    )
-    doc_splits = text_splitter.split_documents(docs)
+    return index
 
-    # Create and return vectorstore
-    vectorstore = Chroma.from_documents(
-        documents=doc_splits,
-        collection_name="rag-chroma",
-        embedding=OpenAIEmbeddings(),
-    )
-    
-    return vectorstore.as_retriever()
+
+def create_index(
+    data_dir: Optional[Path] = None,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+):
+    """Create document index from PDF files in the data directory."""
+    return build_index(data_dir, chunk_size, chunk_overlap).as_retriever()
 
 
 # CREATE INDEX -----------------------------------------------------------------------------------------------
-def create_index_URL():
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-    from langchain_community.document_loaders import WebBaseLoader
-    from langchain_community.vectorstores import Chroma
-    from langchain_openai import OpenAIEmbeddings
-
-    urls = [
-        "https://lilianweng.github.io/posts/2023-06-23-agent/",
-        # "https://lilianweng.github.io/posts/2023-03-15-prompt-engineering/",
-        # "https://lilianweng.github.io/posts/2023-10-25-adv-attack-llm/",
-    ]
-
-    docs = [WebBaseLoader(url).load() for url in urls]
-    # print("DOCS")
-    # print(docs)
-    docs_list = [item for sublist in docs for item in sublist]
-    # print("List")
-    # print(docs)
-    print("Docs length")
-    print(f"Size of docs (number of sublists): {len(docs)}")
-    print(f"Size of docs (number of sublists): {len(docs_list)}")
-
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=250, chunk_overlap=0
-    )
-    doc_splits = text_splitter.split_documents(docs_list)
+DEFAULT_URLS = [
+    "https://lilianweng.github.io/posts/2023-06-23-agent/",
+    # "https://lilianweng.github.io/posts/2023-03-15-prompt-engineering/",
+    # "https://lilianweng.github.io/posts/2023-10-25-adv-attack-llm/",
+]
+
+
+def create_index_URL(
+    urls: Optional[List[str]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    max_workers: Optional[int] = None,
+):
+    """
+    Create a document index from web pages.
+
+    Pages are fetched concurrently over pooled connections (see ``iter_urls``)
+    and streamed through the same batched split/embed pipeline as PDFs.
+    """
+    import hashlib
+
+    from .bm25 import BM25Index
+    from .hybrid import RETRIEVAL_MODE, HybridRetriever, VectorRetriever
+    from .incremental_index import chunk_id
+    from .ingest import ingest
+    from .splitter import create_text_splitter
+    from .url_loader import iter_urls
+    from .vector_store import create_vectorstore
+
+    urls = urls or DEFAULT_URLS
+    text_splitter = create_text_splitter(chunk_size, chunk_overlap)
+    vectorstore = create_vectorstore(create_embeddings())
+    bm25 = BM25Index()
+
+    def split(url, pages):
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        for page_no, page in enumerate(pages):
+            for index, chunk in enumerate(text_splitter.split_documents([page])):
+                chunk.metadata["chunk_id"] = chunk_id(digest, page_no, index)
+                yield chunk
 
-    # Add to vectorDB
-    vectorstore = Chroma.from_documents(
-        documents=doc_splits,
-        collection_name="rag-chroma",
-        embedding=OpenAIEmbeddings(),
+    report = ingest(
+        urls,
+        vectorstore,
+        split,
+        max_workers=max_workers,
+        on_batch=lambda documents, ids: bm25.add(ids, [doc.page_content for doc in documents]),
+        load=iter_urls,
     )
-    retriever = vectorstore.as_retriever()
+    for failure in report.failures:
+        logger.warning(f"Error loading {failure.path}: {failure.error}")
+    logger.info(f"Number of pages indexed: {len(report.chunk_ids)}")
 
-    return retriever
+    if RETRIEVAL_MODE == "hybrid":
+        return HybridRetriever(vectorstore=vectorstore, bm25=bm25)
+    return VectorRetriever(vectorstore=vectorstore)
@@ -1,26 +1,22 @@
-
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 
+from .prompts import get_prompt
+
 
-def create_rewriter():
+def create_rewriter(http_client=None, http_async_client=None):
     from langchain_core.output_parsers import StrOutputParser
 
     # LLM
-    llm = ChatOpenAI(model="gpt-3.5-turbo-0125", temperature=0)
-
-    # Prompt
-    system = """You a question re-writer that converts an input question to a better version that is optimized \n
-        for web search. Look at the input and try to reason about the underlying semantic intent / meaning."""
-    re_write_prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system),
-            (
-                "human",
-                "Here is the initial question: \n\n {question} \n Formulate an improved question.",
-            ),
-        ]
+    llm = ChatOpenAI(
+        model="gpt-3.5-turbo-0125",
+        temperature=0,
+        stream_usage=True,
+        http_client=http_client,
+        http_async_client=http_async_client,
     )
 
+    # Prompt, from the local registry
+    re_write_prompt = get_prompt("rewriter")
+
     question_rewriter = re_write_prompt | llm | StrOutputParser()
-    return question_rewriter
\ No newline at end of file
+    return question_rewriter
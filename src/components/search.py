@@ -1,4 +1,4 @@
-
+from src.utils.instrumentation import span
 
 
 # Search Tool  ----------------------------------------------------------------------------------------------------
@@ -8,3 +8,23 @@ def create_search_tool():
 
     web_search_tool = TavilySearchResults(k=3)  
     return web_search_tool
+
+
+def search_web(web_search_tool, query: str):
+    """Run a web search and join the results into one Document."""
+    from langchain.schema import Document
+
+    with span("web_search", "search"):
+        docs = web_search_tool.invoke({"query": query})
+    web_results = "\n".join([d["content"] for d in docs])
+    return Document(page_content=web_results)
+
+
+async def asearch_web(web_search_tool, query: str):
+    """Async counterpart of ``search_web``."""
+    from langchain.schema import Document
+
+    with span("web_search", "search"):
+        docs = await web_search_tool.ainvoke({"query": query})
+    web_results = "\n".join([d["content"] for d in docs])
+    return Document(page_content=web_results)
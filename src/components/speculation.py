@@ -0,0 +1,115 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Optional, Tuple
+
+from langchain.schema import Document
+
+from src.utils.instrumentation import get_logger
+from src.utils.settings import get_bool, get_int
+
+from .search import search_web
+
+logger = get_logger(__name__)
+
+# Rewrite the question and search the web while documents are still graded
+SPECULATIVE_SEARCH = get_bool("CRAG_SPECULATIVE_SEARCH", False)
+# Speculations running at once; later ones queue
+SPECULATION_WORKERS = get_int("CRAG_SPECULATION_WORKERS", 4)
+
+
+class SpeculationStats:
+    """Process-wide outcome of speculative rewrite + web search runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.used = 0
+        self.discarded = 0
+        self.saved_seconds = 0.0
+        self.wasted_seconds = 0.0
+
+    def record_used(self, saved: float):
+        with self._lock:
+            self.used += 1
+            self.saved_seconds += saved
+
+    def record_discarded(self, wasted: float):
+        with self._lock:
+            self.discarded += 1
+            self.wasted_seconds += wasted
+
+    def __repr__(self):
+        return (
+            f"SpeculationStats(used={self.used}, discarded={self.discarded}, "
+            f"saved={self.saved_seconds:.2f}s, wasted={self.wasted_seconds:.2f}s)"
+        )
+
+
+speculation_stats = SpeculationStats()
+
+
+class Speculation:
+    """
+    Query rewrite and web search started ahead of the grading decision.
+
+    The work is submitted to ``executor`` as soon as the object is created.
+    ``use`` waits for it and books the time that overlapped grading as saved;
+    ``discard`` books the time it has run so far as wasted. Work that already
+    started cannot be interrupted, only ignored.
+
+    Args:
+        question (str): Original user question
+        rewriter: Chain from ``create_rewriter``
+        web_search_tool: Tool from ``create_search_tool``
+        executor (Executor): Where the work runs, normally
+            ``component_pool.speculation_executor``
+    """
+
+    def __init__(self, question: str, rewriter, web_search_tool, executor: Executor):
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        # Run in a copy of the caller's context so the work lands in its trace
+        self._future: Future = executor.submit(contextvars.copy_context().run, self._run, question, rewriter, web_search_tool)
+
+    def _run(self, question: str, rewriter, web_search_tool) -> Tuple[str, Document]:
+        try:
+            better_question = rewriter.invoke({"question": question})
+            return better_question, search_web(web_search_tool, better_question)
+        finally:
+            self.finished = time.perf_counter()
+
+    def use(self) -> Tuple[str, Document]:
+        """Wait for the rewritten question and its web results."""
+        waited_from = time.perf_counter()
+        result = self._future.result()
+        self._record_used(waited_from)
+        return result
+
+    async def ause(self) -> Tuple[str, Document]:
+        """Like ``use``, but waits without blocking the event loop."""
+        waited_from = time.perf_counter()
+        result = await asyncio.wrap_future(self._future)
+        self._record_used(waited_from)
+        return result
+
+    def _record_used(self, waited_from: float):
+        # Serially the whole run would have come after grading; the part that
+        # overlapped grading is off the critical path
+        saved = min(self.finished, waited_from) - self.started
+        speculation_stats.record_used(saved)
+        logger.info(f"---SPECULATION: USED, SAVED {saved:.2f}s---")
+
+    def discard(self):
+        """Drop the results; the decision did not need a web search."""
+        if self._future.cancel():
+            wasted = 0.0
+        else:
+            wasted = (self.finished or time.perf_counter()) - self.started
+        speculation_stats.record_discarded(wasted)
+        logger.info(f"---SPECULATION: DISCARDED, WASTED {wasted:.2f}s OF WORK---")
+
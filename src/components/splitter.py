@@ -0,0 +1,210 @@
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, List, Literal, Optional, Tuple, Union
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from src.utils.settings import get_int, get_str
+
+# Same default encoding as RecursiveCharacterTextSplitter.from_tiktoken_encoder,
+# so chunk boundaries match the previous splitter
+SPLITTER_ENCODING = get_str("CRAG_SPLITTER_ENCODING", "gpt2")
+# Distinct text pieces whose token counts are remembered
+TOKEN_CACHE_SIZE = get_int("CRAG_TOKEN_CACHE_SIZE", 200_000)
+# Uncached characters from which a batch is encoded on several threads
+TOKEN_BATCH_CHARS = get_int("CRAG_TOKEN_BATCH_CHARS", 32_768)
+
+_DIGEST_SIZE = 16
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = SPLITTER_ENCODING):
+    """Load a tiktoken encoding once per process."""
+    import tiktoken
+
+    return tiktoken.get_encoding(name)
+
+
+class TokenCounter:
+    """
+    Memoized token counter.
+
+    Counts are cached per distinct string, and ``count_many`` encodes all the
+    uncached strings in one batched call (tiktoken encodes batches of at
+    least CRAG_TOKEN_BATCH_CHARS characters on several threads). Strings
+    longer than a digest are keyed on their blake2b digest, so an entry costs
+    the same whatever the size of the text, and the least recently used
+    entries are evicted once ``max_entries`` are cached.
+
+    Args:
+        encoding: tiktoken encoding (anything with ``encode_ordinary`` and
+            ``encode_ordinary_batch``)
+        max_entries (int): Upper bound on cached strings
+    """
+
+    def __init__(self, encoding, max_entries: int = TOKEN_CACHE_SIZE):
+        self.encoding = encoding
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[Union[str, bytes], int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(text: str) -> Union[str, bytes]:
+        if len(text) <= _DIGEST_SIZE:
+            return text
+        return blake2b(text.encode("utf-8", "surrogatepass"), digest_size=_DIGEST_SIZE).digest()
+
+    def count(self, text: str) -> int:
+        key = text if len(text) <= _DIGEST_SIZE else self._key(text)
+        counts = self._counts
+        n = counts.get(key)
+        if n is None:
+            n = len(self.encoding.encode_ordinary(text))
+            self._remember({key: n})
+        else:
+            # Reads take no lock: get and move_to_end are atomic, and an entry
+            # evicted in between is simply counted again next time
+            try:
+                counts.move_to_end(key)
+            except KeyError:
+                pass
+        return n
+
+    def count_many(self, texts: Iterable[str]) -> List[int]:
+        texts = list(texts)
+        keys = [self._key(text) for text in texts]
+        cached = self._counts
+        counts = [cached.get(key) for key in keys]
+        missing = {}
+        for key, text, n in zip(keys, texts, counts):
+            if n is None:
+                missing[key] = text
+            else:
+                try:
+                    cached.move_to_end(key)
+                except KeyError:
+                    pass
+        if missing:
+            pending = list(missing.values())
+            # Starting tiktoken's encoder threads costs more than small batches take
+            if sum(map(len, pending)) >= TOKEN_BATCH_CHARS:
+                encoded = self.encoding.encode_ordinary_batch(pending)
+            else:
+                encoded = [self.encoding.encode_ordinary(text) for text in pending]
+            new_counts = {key: len(tokens) for key, tokens in zip(missing, encoded)}
+            self._remember(new_counts)
+            counts = [new_counts[key] if n is None else n for key, n in zip(keys, counts)]
+        return counts
+
+    def _remember(self, counts: Dict[Union[str, bytes], int]):
+        with self._lock:
+            self._counts.update(counts)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+
+    def __call__(self, text: str) -> int:
+        return self.count(text)
+
+
+class CachedTokenTextSplitter(RecursiveCharacterTextSplitter):
+    """
+    RecursiveCharacterTextSplitter measuring length in tokens through a shared
+    TokenCounter.
+
+    Before splitting, ``split_text`` cuts the text level by level the way the
+    recursion will and counts each level's pieces in one batch, so the length
+    checks of the recursion and of the merge step that follow only hit the
+    cache. Only the public ``length_function`` hook is used to plug the
+    counter in; should a piece be cut differently than the recursion cuts it,
+    it is simply counted on demand. The counter is shared between splitter
+    instances so re-indexing the same text costs no encoding at all.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        chunk_size: int = 4000,
+        separators: Optional[List[str]] = None,
+        keep_separator: Union[bool, Literal["start", "end"]] = True,
+        is_separator_regex: bool = False,
+        **kwargs: Any,
+    ):
+        super().__init__(
+            separators=separators,
+            keep_separator=keep_separator,
+            is_separator_regex=is_separator_regex,
+            chunk_size=chunk_size,
+            length_function=counter.count,
+            **kwargs,
+        )
+        self._counter = counter
+        self._limit = chunk_size
+        self._cut_separators = separators or ["\n\n", "\n", " ", ""]
+        self._cut_keep = keep_separator
+        self._cut_regex = is_separator_regex
+
+    def split_text(self, text: str) -> List[str]:
+        self._count_levels(text)
+        return super().split_text(text)
+
+    def _count_levels(self, text: str):
+        level = [(text, self._cut_separators)]
+        while level:
+            cuts = [self._cut(piece, separators) for piece, separators in level]
+            batch = [piece for pieces, _, _ in cuts for piece in pieces]
+            batch.extend("" if self._cut_keep else separator for _, separator, _ in cuts)
+            counts = iter(self._counter.count_many(batch))
+            # Pieces too long to keep are cut again with the next separators
+            level = [
+                (piece, remaining)
+                for pieces, _, remaining in cuts
+                for piece in pieces
+                if next(counts) >= self._limit and remaining
+            ]
+
+    def _cut(self, text: str, separators: List[str]) -> Tuple[List[str], str, List[str]]:
+        # Same separator choice and cut as RecursiveCharacterTextSplitter
+        separator, remaining = separators[-1], []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if re.search(candidate if self._cut_regex else re.escape(candidate), text):
+                separator, remaining = candidate, separators[i + 1:]
+                break
+        if not separator:
+            return list(text), separator, remaining
+        pattern = separator if self._cut_regex else re.escape(separator)
+        if not self._cut_keep:
+            pieces = re.split(pattern, text)
+        else:
+            parts = re.split(f"({pattern})", text)
+            if self._cut_keep == "end":
+                pieces = [parts[i] + parts[i + 1] for i in range(0, len(parts) - 1, 2)] + parts[-1:]
+            else:
+                pieces = parts[:1] + [parts[i] + parts[i + 1] for i in range(1, len(parts) - 1, 2)]
+                if len(parts) % 2 == 0:
+                    pieces += parts[-1:]
+        return [piece for piece in pieces if piece], separator, remaining
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(encoding_name: str = SPLITTER_ENCODING) -> TokenCounter:
+    """Process-wide token counter for an encoding."""
+    return TokenCounter(get_encoding(encoding_name))
+
+
+def create_text_splitter(
+    chunk_size: int,
+    chunk_overlap: int,
+    encoding_name: Optional[str] = None,
+) -> CachedTokenTextSplitter:
+    """Create the token-aware splitter used for ingestion."""
+    return CachedTokenTextSplitter(
+        get_token_counter(encoding_name or SPLITTER_ENCODING),
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
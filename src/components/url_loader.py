@@ -0,0 +1,233 @@
+import asyncio
+import json
+import queue
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from langchain.schema import Document
+
+from src.utils.disk_cache import DiskCache
+from src.utils.instrumentation import get_logger
+from src.utils.settings import get_bool, get_cache_dir, get_float, get_int
+
+from .loader import LoadFailure
+
+logger = get_logger(__name__)
+
+# Requests in flight across all hosts
+URL_CONCURRENCY = get_int("CRAG_URL_CONCURRENCY", 16)
+# Connections opened to any single host
+URL_PER_HOST = get_int("CRAG_URL_PER_HOST", 4)
+# Total seconds allowed per request
+URL_TIMEOUT = get_float("CRAG_URL_TIMEOUT", 30.0)
+# Cached page bodies, revalidated with ETag / Last-Modified
+URL_CACHE_SIZE = get_int("CRAG_URL_CACHE_SIZE", 10_000)
+
+_caches: Dict[str, DiskCache] = {}
+
+# Marks the end of the page stream
+_DONE = object()
+
+
+def get_http_cache() -> DiskCache:
+    """Return the process-wide on-disk cache of fetched pages."""
+    path = get_cache_dir() / "http.sqlite"
+    cache = _caches.get(str(path))
+    if cache is None:
+        cache = DiskCache(path, max_entries=URL_CACHE_SIZE)
+        _caches[str(path)] = cache
+    return cache
+
+
+@dataclass
+class FetchStats:
+    """Counters of a URL fetch run."""
+
+    fetched: int = 0
+    not_modified: int = 0
+    failed: int = 0
+
+    def __str__(self):
+        return f"{self.fetched} fetched, {self.not_modified} not modified, {self.failed} failed"
+
+
+def _pack(etag: Optional[str], last_modified: Optional[str], text: str) -> bytes:
+    entry = {"etag": etag, "last_modified": last_modified, "text": text}
+    return zlib.compress(json.dumps(entry).encode("utf-8"))
+
+
+def _unpack(value: bytes) -> dict:
+    return json.loads(zlib.decompress(value))
+
+
+def html_to_documents(url: str, html: str) -> List[Document]:
+    """Extract the text of a page the same way WebBaseLoader does."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {"source": url}
+    if soup.title is not None and soup.title.string:
+        metadata["title"] = soup.title.string
+    description = soup.find("meta", attrs={"name": "description"})
+    if description is not None and description.get("content"):
+        metadata["description"] = description["content"]
+    html_tag = soup.find("html")
+    if html_tag is not None and html_tag.get("lang"):
+        metadata["language"] = html_tag["lang"]
+    return [Document(page_content=soup.get_text(), metadata=metadata)]
+
+
+async def fetch_url(session, url: str, cache: Optional[DiskCache], stats: FetchStats) -> str:
+    """
+    GET ``url`` and return its body as text.
+
+    With a cache, the stored ETag / Last-Modified are sent as conditional
+    headers and a ``304 Not Modified`` answer is served from the cache. A
+    page that comes back without validators is dropped from the cache, so it
+    is never revalidated against an outdated copy. Cache reads and writes run
+    in a worker thread to keep SQLite off the event loop.
+    """
+    headers = {}
+    cached = await asyncio.to_thread(cache.get, url) if cache is not None else None
+    if cached is not None:
+        entry = _unpack(cached)
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    async with session.get(url, headers=headers) as response:
+        if response.status == 304 and cached is not None:
+            stats.not_modified += 1
+            return entry["text"]
+        response.raise_for_status()
+        text = await response.text(errors="replace")
+
+    stats.fetched += 1
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if cache is not None:
+        if etag or last_modified:
+            await asyncio.to_thread(cache.set, url, _pack(etag, last_modified, text))
+        elif cached is not None:
+            await asyncio.to_thread(cache.delete, url)
+    return text
+
+
+async def _fetch_all(
+    urls: List[str],
+    emit,
+    stopped,
+    concurrency: int,
+    per_host: int,
+    cache: Optional[DiskCache],
+    stats: FetchStats,
+):
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=URL_TIMEOUT)
+    # Bounds the fetched-but-not-consumed pages as well as the open requests
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(session, url):
+        async with slots:
+            if stopped():
+                return
+            try:
+                text = await fetch_url(session, url, cache, stats)
+                result = await asyncio.to_thread(html_to_documents, url, text)
+            except Exception as e:
+                stats.failed += 1
+                result = LoadFailure(url, f"{type(e).__name__}: {e}")
+            # Blocks while the consumer is behind, holding the slot
+            await asyncio.to_thread(emit, (url, result))
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*(one(session, url) for url in urls))
+
+
+def iter_urls(
+    urls: Iterable[str],
+    max_workers: Optional[int] = None,
+    per_host: Optional[int] = None,
+    use_cache: Optional[bool] = None,
+    stats: Optional[FetchStats] = None,
+    cache: Optional[DiskCache] = None,
+) -> Iterator[Tuple[str, Union[List[Document], LoadFailure]]]:
+    """
+    Fetch many web pages concurrently over pooled connections, yielding each
+    page as soon as it is downloaded and parsed.
+
+    Requests share one aiohttp session whose connector caps the total and
+    per-host connections and keeps them alive between requests. Fetching runs
+    on an event loop in a background thread; at most ``max_workers`` pages are
+    fetched or waiting for the consumer at any time, so a slow consumer holds
+    back downloading.
+
+    Args:
+        urls (Iterable[str]): Pages to fetch; duplicates are fetched once
+        max_workers (int, optional): Concurrent requests, defaults to
+            CRAG_URL_CONCURRENCY (named like ``iter_pdfs`` so ``ingest`` can
+            use either loader)
+        per_host (int, optional): Connections per host, defaults to
+            CRAG_URL_PER_HOST
+        use_cache (bool, optional): Revalidate cached pages with conditional
+            GETs, defaults to CRAG_URL_CACHE
+        stats (FetchStats, optional): Updated with fetch counters
+        cache (DiskCache, optional): Page cache to use instead of the shared
+            one in the cache directory
+
+    Yields:
+        Tuple[str, Union[List[Document], LoadFailure]]: The URL and either its
+            page or the reason it could not be fetched
+    """
+    urls = list(dict.fromkeys(str(url) for url in urls))
+    if not urls:
+        return
+    concurrency = max(1, max_workers or URL_CONCURRENCY)
+    per_host = max(1, per_host or URL_PER_HOST)
+    if use_cache is None:
+        use_cache = get_bool("CRAG_URL_CACHE", True)
+    if not use_cache:
+        cache = None
+    elif cache is None:
+        cache = get_http_cache()
+    stats = stats if stats is not None else FetchStats()
+
+    results: "queue.Queue" = queue.Queue(maxsize=concurrency)
+    stop = threading.Event()
+
+    def emit(item):
+        # Gives up once the consumer has stopped so the loop can always finish
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def run():
+        try:
+            asyncio.run(_fetch_all(urls, emit, stop.is_set, concurrency, per_host, cache, stats))
+        except BaseException as e:
+            emit(e)
+        else:
+            emit(_DONE)
+
+    fetcher = threading.Thread(target=run, name="crag-url-fetch", daemon=True)
+    fetcher.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        fetcher.join()
+        logger.info(f"URLs: {stats}")
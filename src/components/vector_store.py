@@ -0,0 +1,105 @@
+import sys
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.utils.settings import get_str
+
+# Vector store used for new indexes: "chroma" (in-memory Chroma) or "numpy"
+VECTOR_BACKEND = get_str("CRAG_VECTOR_BACKEND", "chroma")
+
+# name -> factory(embeddings, persist_dir) returning an empty or reloaded store
+_backends: Dict[str, Callable[[Embeddings, Optional[Path]], VectorStore]] = {}
+
+
+def register_backend(name: str, factory: Callable[[Embeddings, Optional[Path]], VectorStore]):
+    """
+    Register a vector-store backend.
+
+    The factory receives the embedding model and an optional directory the
+    store may persist to, and returns a LangChain ``VectorStore`` that
+    supports ``add_documents(ids=...)`` and ``delete(ids=...)``.
+    """
+    _backends[name] = factory
+
+
+def available_backends():
+    return sorted(_backends)
+
+
+def create_vectorstore(
+    embeddings: Embeddings,
+    backend: Optional[str] = None,
+    persist_dir: Optional[Path] = None,
+) -> VectorStore:
+    """Create a vector store with the configured (or given) backend."""
+    backend = backend or VECTOR_BACKEND
+    if backend not in _backends:
+        raise ValueError(f"Unknown vector backend {backend!r}, expected one of {available_backends()}")
+    return _backends[backend](embeddings, persist_dir)
+
+
+def get_documents(vectorstore: VectorStore, ids: Sequence[str]) -> List[Document]:
+    """Fetch stored chunks by ID, in the order of ``ids``."""
+    if not ids:
+        return []
+    try:
+        docs = vectorstore.get_by_ids(list(ids))
+    except NotImplementedError:
+        # Stores predating get_by_ids (langchain_community's Chroma)
+        result = vectorstore.get(ids=list(ids), include=["documents", "metadatas"])
+        docs = [
+            Document(id=doc_id, page_content=text, metadata=metadata or {})
+            for doc_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+        ]
+    by_id = {doc.id: doc for doc in docs}
+    return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
+
+_sqlite_patched = False
+
+
+def _patch_sqlite():
+    # Chroma needs SQLite >= 3.35; use the bundled pysqlite3 build when present
+    global _sqlite_patched
+    if _sqlite_patched:
+        return
+    try:
+        __import__("pysqlite3")
+    except ImportError:
+        return
+    sys.modules["sqlite3"] = sys.modules.pop("pysqlite3")
+    _sqlite_patched = True
+
+
+def _create_chroma(embeddings: Embeddings, persist_dir: Optional[Path]) -> VectorStore:
+    _patch_sqlite()
+    from langchain_community.vectorstores import Chroma
+
+    # In-memory collections are shared by name inside a process, so give each
+    # index its own collection. Cosine space makes relevance scores cosine
+    # similarities, as with the numpy backend.
+    return Chroma(
+        collection_name=f"rag-chroma-{uuid.uuid4().hex[:8]}",
+        embedding_function=embeddings,
+        collection_metadata={"hnsw:space": "cosine"},
+    )
+
+
+def _create_numpy(embeddings: Embeddings, persist_dir: Optional[Path]) -> VectorStore:
+    from .ann import IVFPQConfig
+    from .numpy_store import NumpyVectorStore
+
+    # CRAG_ANN=ivfpq switches large indexes to approximate search
+    ann_config = IVFPQConfig() if get_str("CRAG_ANN", "off") == "ivfpq" else None
+    if persist_dir is not None and NumpyVectorStore.exists(persist_dir):
+        return NumpyVectorStore.load(persist_dir, embeddings, ann_config=ann_config)
+    return NumpyVectorStore(embeddings, ann_config=ann_config)
+
+
+register_backend("chroma", _create_chroma)
+register_backend("numpy", _create_numpy)
@@ -7,6 +7,7 @@ from .graph_state import (
     web_search,
     decide_to_generate
 )
+from .graph import astream_answer, build_async_graph, build_graph, stream_answer, thread_config
 
 __all__ = [
     'GraphState',
@@ -15,5 +16,10 @@ __all__ = [
     'grade_documents',
     'transform_query',
     'web_search',
-    'decide_to_generate'
+    'decide_to_generate',
+    'build_graph',
+    'stream_answer',
+    'build_async_graph',
+    'astream_answer',
+    'thread_config'
 ]
\ No newline at end of file
@@ -0,0 +1,216 @@
+# Graph ---------------------------------------------------------------------------------------------------------
+
+import asyncio
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple
+
+from langgraph.graph import END, StateGraph, START
+from langgraph.checkpoint.memory import MemorySaver
+
+from src.components.answer_cache import ANSWER_CACHE, AnswerCache, get_answer_cache
+from src.components.hybrid import doc_id
+from src.utils.instrumentation import get_logger, instrument_node, record_branch, traced
+
+from .graph_state import (
+    GraphState,
+    retrieve,
+    generate,
+    grade_documents,
+    transform_query,
+    web_search,
+    decide_to_generate,
+    aretrieve,
+    agenerate,
+    agrade_documents,
+    atransform_query,
+    aweb_search,
+)
+
+logger = get_logger(__name__)
+
+# Node whose LLM tokens make up the answer
+ANSWER_NODE = "generate"
+# Stream modes giving node starts, LLM tokens and node results
+STREAM_MODES = ["debug", "messages", "updates"]
+
+
+def _compile(retrieve, grade_documents, generate, transform_query, web_search):
+    # Memory updates to langgraph: Need to convert to DSPy
+    memory = MemorySaver()
+    workflow = StateGraph(GraphState)
+
+    # Define the nodes; each run is timed as a span of the question's trace
+    nodes = {
+        "retrieve": retrieve,
+        "grade_documents": grade_documents,
+        "generate": generate,
+        "transform_query": transform_query,
+        "web_search_node": web_search,
+    }
+    for name, node in nodes.items():
+        workflow.add_node(name, instrument_node(name, node))
+
+    # Build graph
+    workflow.add_edge(START, "retrieve")
+    workflow.add_edge("retrieve", "grade_documents")
+    workflow.add_conditional_edges(
+        "grade_documents",
+        decide_to_generate,
+        {
+            "transform_query": "transform_query",
+            "generate": "generate",
+        },
+    )
+    workflow.add_edge("transform_query", "web_search_node")
+    workflow.add_edge("web_search_node", "generate")
+    workflow.add_edge("generate", END)
+
+    config = {"configurable": {"thread_id": 2}}
+    app = workflow.compile(checkpointer=memory)
+
+    return app, config, memory
+
+
+def build_graph():
+    """Build and compile the LangGraph."""
+    return _compile(retrieve, grade_documents, generate, transform_query, web_search)
+
+
+def build_async_graph():
+    """
+    Build and compile the LangGraph with the async nodes, to be driven with
+    ``astream``/``ainvoke`` (see ``astream_answer``). Questions running at the
+    same time need their own ``thread_config``.
+    """
+    return _compile(aretrieve, agrade_documents, agenerate, atransform_query, aweb_search)
+
+
+def thread_config(thread_id: Optional[str] = None) -> Dict[str, Any]:
+    """Graph config for one conversation thread (a new one when no ID is given)."""
+    return {"configurable": {"thread_id": thread_id or uuid.uuid4().hex}}
+
+
+def forget_thread(graph, config: Dict[str, Any]):
+    """
+    Drop a finished thread's checkpoints from the graph's in-memory saver.
+
+    One-off threads from ``thread_config()`` are never resumed, so long-running
+    callers (the API, the batch runner) forget them once the question is
+    answered instead of keeping every question's documents in memory.
+    """
+    if graph.checkpointer:
+        graph.checkpointer.delete_thread(config["configurable"]["thread_id"])
+
+
+def _events(mode: str, chunk: Any, result: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    # Turn one graph stream item into stream_answer events; the generated
+    # answer and its documents are collected in ``result``
+    if mode == "debug":
+        if chunk["type"] == "task":
+            yield "node", chunk["payload"]["name"]
+    elif mode == "messages":
+        message, metadata = chunk
+        # Grader and re-writer calls stream too; only the answer is shown
+        if metadata.get("langgraph_node") == ANSWER_NODE and message.content:
+            yield "token", message.content
+    else:
+        for value in chunk.values():
+            if value and "generation" in value:
+                result["answer"] = value["generation"]
+                # Only the chunks the answer was actually generated from
+                result["documents"] = value.get("context_documents", value.get("documents", []))
+
+
+def stream_answer(
+    graph,
+    question: str,
+    config: Dict[str, Any],
+    answer_cache: Optional[AnswerCache] = None,
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Run the graph for one question and stream what happens.
+
+    Unless CRAG_ANSWER_CACHE is off, a question answered before on the same
+    corpus and settings is answered from the answer cache without running
+    the graph, and new answers are added to it.
+
+    Args:
+        answer_cache (AnswerCache, optional): Defaults to the shared cache
+
+    Yields:
+        ("node", name) when a node starts running,
+        ("token", text) for each token of the answer as the LLM produces it,
+        ("answer", text) once, with the complete answer, when the graph ends,
+        ("trace", dict) last, with the question's trace (see ``Trace.to_dict``)
+    """
+    with traced(question) as trace:
+        yield from _answer(graph, question, config, answer_cache)
+    yield "trace", trace.to_dict()
+
+
+def _answer(graph, question, config, answer_cache) -> Iterator[Tuple[str, Any]]:
+    if answer_cache is None and ANSWER_CACHE:
+        answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        # Looked up and stored under the corpus the graph starts from, so an
+        # answer is never filed under a corpus that changed while it ran
+        version = answer_cache.version()
+        hit = answer_cache.lookup(question, version=version)
+        if hit is not None:
+            logger.info(f"---ANSWER CACHE HIT (similarity {hit.similarity:.3f}, {len(hit.documents)} chunks)---")
+            record_branch("answer_cache")
+            yield "answer", hit.answer
+            return
+
+    result: Dict[str, Any] = {}
+    for mode, chunk in graph.stream({"question": question}, config=config, stream_mode=STREAM_MODES):
+        yield from _events(mode, chunk, result)
+    if "answer" not in result:
+        yield "answer", "No response generated."
+        return
+    if answer_cache is not None:
+        documents = [i for i in map(doc_id, result["documents"]) if i]
+        answer_cache.store(question, result["answer"], documents, version=version)
+    yield "answer", result["answer"]
+
+
+async def astream_answer(
+    graph,
+    question: str,
+    config: Dict[str, Any],
+    answer_cache: Optional[AnswerCache] = None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Async counterpart of ``stream_answer`` for a graph from
+    ``build_async_graph``, yielding the same events. Answer cache reads and
+    writes run in a worker thread.
+    """
+    with traced(question) as trace:
+        async for event in _aanswer(graph, question, config, answer_cache):
+            yield event
+    yield "trace", trace.to_dict()
+
+
+async def _aanswer(graph, question, config, answer_cache) -> AsyncIterator[Tuple[str, Any]]:
+    if answer_cache is None and ANSWER_CACHE:
+        answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        version = await asyncio.to_thread(answer_cache.version)
+        hit = await asyncio.to_thread(answer_cache.lookup, question, version=version)
+        if hit is not None:
+            logger.info(f"---ANSWER CACHE HIT (similarity {hit.similarity:.3f}, {len(hit.documents)} chunks)---")
+            record_branch("answer_cache")
+            yield "answer", hit.answer
+            return
+
+    result: Dict[str, Any] = {}
+    async for mode, chunk in graph.astream({"question": question}, config=config, stream_mode=STREAM_MODES):
+        for event in _events(mode, chunk, result):
+            yield event
+    if "answer" not in result:
+        yield "answer", "No response generated."
+        return
+    if answer_cache is not None:
+        documents = [i for i in map(doc_id, result["documents"]) if i]
+        await asyncio.to_thread(answer_cache.store, question, result["answer"], documents, version=version)
+    yield "answer", result["answer"]
@@ -1,18 +1,25 @@
 # Graph State ---------------------------------------------------------------------------------------------------
 
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
 from typing_extensions import TypedDict
 from langchain.schema import Document
 
 # Import components using correct import syntax
 from src.components import (
-    create_chain,
-    create_grader,
-    create_search_tool,
-    create_index,
-    create_index_URL,
-    create_rewriter
+    agrade_all,
+    asearch_web,
+    component_pool,
+    grade_all,
+    get_retriever,
+    pack_context,
+    search_web
 )
+from src.components.grader import GRADER_MODE
+from src.components.speculation import SPECULATIVE_SEARCH, Speculation
+from src.utils.instrumentation import get_logger, record_branch
+
+logger = get_logger(__name__)
 
 class GraphState(TypedDict):
     """
@@ -23,12 +30,18 @@ class GraphState(TypedDict):
         generation: LLM generation
         web_search: whether to add search
         documents: list of documents
+        context_documents: documents packed into the generation prompt
+        speculative_question: re-written question prepared while grading
+        speculative_results: web results for speculative_question
     """
 
     question: str
     generation: str
     web_search: str
     documents: List[str]
+    context_documents: List[Document]
+    speculative_question: Optional[str]
+    speculative_results: Optional[Document]
 
 
 def retrieve(state):
@@ -41,9 +54,10 @@ def retrieve(state):
     Returns:
         state (dict): New key added to state, documents, that contains retrieved documents
     """
-    print("---RETRIEVE---")
+    logger.info("---RETRIEVE---")
     question = state["question"]
-    retriever = create_index()
+    # Built once per corpus and reused until the data directory changes
+    retriever = get_retriever()
 
     # Retrieval
     documents = retriever.get_relevant_documents(question)
@@ -60,14 +74,27 @@ def generate(state):
     Returns:
         state (dict): New key added to state, generation, that contains LLM generation
     """
-    print("---GENERATE---")
+    logger.info("---GENERATE---")
     question = state["question"]
     documents = state["documents"]
-    rag_chain = create_chain()
+    # Built once per process, see ComponentPool
+    rag_chain = component_pool.chain()
+
+    # Deduplicated, ranked and cut to the CRAG_CONTEXT_TOKENS budget
+    context = pack_context(documents)
+    logger.info(
+        f"---CONTEXT: {context.tokens} OF {context.total_tokens} TOKENS, SAVED {context.saved} "
+        f"({context.duplicates} DUPLICATE, {context.dropped} DROPPED, {context.truncated} TRUNCATED)---"
+    )
 
     # RAG generation
-    generation = rag_chain.invoke({"context": documents, "question": question})
-    return {"documents": documents, "question": question, "generation": generation}
+    generation = rag_chain.invoke({"context": context.text, "question": question})
+    return {
+        "documents": documents,
+        "context_documents": context.documents,
+        "question": question,
+        "generation": generation,
+    }
 
 
 def grade_documents(state):
@@ -81,27 +108,66 @@ def grade_documents(state):
         state (dict): Updates documents key with only filtered relevant documents
     """
 
-    print("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
+    logger.info("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
     question = state["question"]
     documents = state["documents"]
-    retrieval_grader = create_grader()
+    retrieval_grader = component_pool.grader()
+    # CRAG_GRADER_MODE=batch grades several docs per request
+    batch_grader = component_pool.batch_grader() if GRADER_MODE == "batch" else None
+
+    # CRAG_SPECULATIVE_SEARCH: rewrite and search the web while grading, and
+    # stop grading as soon as one document is irrelevant
+    speculation = None
+    if SPECULATIVE_SEARCH and documents:
+        speculation = Speculation(
+            question, component_pool.rewriter(), component_pool.search_tool(), component_pool.speculation_executor
+        )
+
+    # Score all docs concurrently, then keep them in retrieval order
+    scores = grade_all(
+        retrieval_grader,
+        question,
+        documents,
+        batch_grader=batch_grader,
+        stop_on_irrelevant=speculation is not None,
+    )
+    filtered_docs, web_search = _filter_documents(documents, scores)
+
+    # Always set, so results of an earlier question on the same thread are not reused
+    speculative_question, speculative_results = None, None
+    if speculation is not None:
+        if web_search == "Yes":
+            try:
+                speculative_question, speculative_results = speculation.use()
+            except Exception as e:
+                logger.warning(f"---SPECULATION FAILED: {e}---")
+        else:
+            speculation.discard()
+
+    return {
+        "documents": filtered_docs,
+        "question": question,
+        "web_search": web_search,
+        "speculative_question": speculative_question,
+        "speculative_results": speculative_results,
+    }
 
-    # Score each doc
+
+def _filter_documents(documents, scores) -> Tuple[List[Document], str]:
+    # Keep the relevant documents; any irrelevant one calls for a web search
     filtered_docs = []
     web_search = "No"
-    for d in documents:
-        score = retrieval_grader.invoke(
-            {"question": question, "document": d.page_content}
-        )
-        grade = score.binary_score
+    for d, grade in zip(documents, scores):
         if grade == "yes":
-            print("---GRADE: DOCUMENT RELEVANT---")
+            logger.info("---GRADE: DOCUMENT RELEVANT---")
             filtered_docs.append(d)
+        elif grade is None:
+            logger.info("---GRADE: DOCUMENT NOT GRADED, DECISION ALREADY MADE---")
         else:
-            print("---GRADE: DOCUMENT NOT RELEVANT---")
+            logger.info("---GRADE: DOCUMENT NOT RELEVANT---")
             web_search = "Yes"
             continue
-    return {"documents": filtered_docs, "question": question, "web_search": web_search}
+    return filtered_docs, web_search
 
 
 def transform_query(state):
@@ -115,10 +181,13 @@ def transform_query(state):
         state (dict): Updates question key with a re-phrased question
     """
 
-    print("---TRANSFORM QUERY---")
+    logger.info("---TRANSFORM QUERY---")
     question = state["question"]
     documents = state["documents"]
-    question_rewriter = create_rewriter()
+    if state.get("speculative_question"):
+        # Already re-written while grading
+        return {"documents": documents, "question": state["speculative_question"]}
+    question_rewriter = component_pool.rewriter()
 
     # Re-write question
     better_question = question_rewriter.invoke({"question": question})
@@ -136,15 +205,14 @@ def web_search(state):
         state (dict): Updates documents key with appended web results
     """
 
-    print("---WEB SEARCH---")
+    logger.info("---WEB SEARCH---")
     question = state["question"]
     documents = state["documents"]
-    web_search_tool = create_search_tool()
 
-    # Web search
-    docs = web_search_tool.invoke({"query": question})
-    web_results = "\n".join([d["content"] for d in docs])
-    web_results = Document(page_content=web_results)
+    # Web search, unless it already ran while grading
+    web_results = state.get("speculative_results")
+    if web_results is None or question != state.get("speculative_question"):
+        web_results = search_web(component_pool.search_tool(), question)
     documents.append(web_results)
 
     return {"documents": documents, "question": question}
@@ -162,7 +230,7 @@ def decide_to_generate(state):
         str: Binary decision for next node to call
     """
 
-    print("---ASSESS GRADED DOCUMENTS---")
+    logger.info("---ASSESS GRADED DOCUMENTS---")
     state["question"]
     web_search = state["web_search"]
     state["documents"]
@@ -170,17 +238,129 @@ def decide_to_generate(state):
     if web_search == "Yes":
         # All documents have been filtered check_relevance
         # We will re-generate a new query
-        print(
+        logger.info(
             "---DECISION: ALL DOCUMENTS ARE NOT RELEVANT TO QUESTION, TRANSFORM QUERY---"
         )
+        record_branch("transform_query")
         return "transform_query"
     else:
         # We have relevant documents, so generate answer
-        print("---DECISION: GENERATE---")
+        logger.info("---DECISION: GENERATE---")
+        record_branch("generate")
         return "generate"
 
 
 
+### Async nodes
+# Same steps as the nodes above, awaiting network I/O instead of blocking on
+# it, so one event loop can run many questions at once (see build_async_graph)
+async def aretrieve(state):
+    """Async counterpart of ``retrieve``."""
+    logger.info("---RETRIEVE---")
+    question = state["question"]
+    # Building or syncing the index is blocking work; keep it off the loop
+    retriever = await asyncio.to_thread(get_retriever)
+
+    # Retrieval. The retrievers are synchronous (BM25 and vector search, the
+    # query cache); ainvoke runs them in the default executor, off the loop
+    documents = await retriever.ainvoke(question)
+    return {"documents": documents, "question": question}
+
+
+async def agenerate(state):
+    """Async counterpart of ``generate``."""
+    logger.info("---GENERATE---")
+    question = state["question"]
+    documents = state["documents"]
+    rag_chain = component_pool.chain()
+
+    # Tokenizing the documents is CPU work; keep it off the loop
+    context = await asyncio.to_thread(pack_context, documents)
+    logger.info(
+        f"---CONTEXT: {context.tokens} OF {context.total_tokens} TOKENS, SAVED {context.saved} "
+        f"({context.duplicates} DUPLICATE, {context.dropped} DROPPED, {context.truncated} TRUNCATED)---"
+    )
+
+    # RAG generation
+    generation = await rag_chain.ainvoke({"context": context.text, "question": question})
+    return {
+        "documents": documents,
+        "context_documents": context.documents,
+        "question": question,
+        "generation": generation,
+    }
+
+
+async def agrade_documents(state):
+    """Async counterpart of ``grade_documents``; grader requests run as tasks."""
+    logger.info("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
+    question = state["question"]
+    documents = state["documents"]
+    retrieval_grader = component_pool.grader()
+    batch_grader = component_pool.batch_grader() if GRADER_MODE == "batch" else None
+
+    speculation = None
+    if SPECULATIVE_SEARCH and documents:
+        speculation = Speculation(
+            question, component_pool.rewriter(), component_pool.search_tool(), component_pool.speculation_executor
+        )
+
+    scores = await agrade_all(
+        retrieval_grader,
+        question,
+        documents,
+        batch_grader=batch_grader,
+        stop_on_irrelevant=speculation is not None,
+    )
+    filtered_docs, web_search = _filter_documents(documents, scores)
+
+    speculative_question, speculative_results = None, None
+    if speculation is not None:
+        if web_search == "Yes":
+            try:
+                speculative_question, speculative_results = await speculation.ause()
+            except Exception as e:
+                logger.warning(f"---SPECULATION FAILED: {e}---")
+        else:
+            speculation.discard()
+
+    return {
+        "documents": filtered_docs,
+        "question": question,
+        "web_search": web_search,
+        "speculative_question": speculative_question,
+        "speculative_results": speculative_results,
+    }
+
+
+async def atransform_query(state):
+    """Async counterpart of ``transform_query``."""
+    logger.info("---TRANSFORM QUERY---")
+    question = state["question"]
+    documents = state["documents"]
+    if state.get("speculative_question"):
+        return {"documents": documents, "question": state["speculative_question"]}
+    question_rewriter = component_pool.rewriter()
+
+    # Re-write question
+    better_question = await question_rewriter.ainvoke({"question": question})
+    return {"documents": documents, "question": better_question}
+
+
+async def aweb_search(state):
+    """Async counterpart of ``web_search``."""
+    logger.info("---WEB SEARCH---")
+    question = state["question"]
+    documents = state["documents"]
+
+    web_results = state.get("speculative_results")
+    if web_results is None or question != state.get("speculative_question"):
+        web_results = await asearch_web(component_pool.search_tool(), question)
+    documents.append(web_results)
+
+    return {"documents": documents, "question": question}
+
+
 # ---------- SECTION 5: BUILD GRAPH ----------
 # from langgraph.graph import END, StateGraph, START
 # from langgraph.graph import END, StateGraph, START
@@ -0,0 +1,176 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# SQLite caps the number of bound parameters per statement
+_MAX_VARS = 500
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters for a cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hits: int = 0, misses: int = 0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 4)}
+
+    def __repr__(self):
+        return f"CacheStats(hits={self.hits}, misses={self.misses}, hit_rate={self.hit_rate:.2%})"
+
+
+class DiskCache:
+    """
+    Small persistent key/value store backed by a SQLite file.
+
+    Entries are evicted least-recently-used first once the cache holds more
+    than ``max_entries``, and are treated as missing once they are older than
+    ``ttl`` seconds (when a ttl is given). The database runs in WAL mode so
+    several processes (Streamlit sessions, CLI runs) can share one file.
+
+    The entry count is counted once when the cache is opened and then kept
+    in memory (as an upper bound: a replaced key counts as a new one), so
+    the table is only counted again, and expired entries purged, when that
+    bound passes ``max_entries``. Reads only write an entry's access time
+    back once it is ``touch_interval`` seconds old, so most lookups never
+    take SQLite's write lock.
+
+    Args:
+        path (Path): SQLite file to use, created if missing
+        max_entries (int): Upper bound on the number of stored entries
+        ttl (float, optional): Entry lifetime in seconds, None for no expiry
+        touch_interval (float): Granularity of the access times used for
+            eviction, in seconds
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_entries: int = 100_000,
+        ttl: Optional[float] = None,
+        touch_interval: float = 60.0,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed)")
+            self._count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the value stored under ``key``, or None."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """Return the stored values for every key that is present and fresh."""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, bytes] = {}
+        now = time.time()
+        oldest = now - self.ttl if self.ttl is not None else None
+        untouched = now - self.touch_interval
+
+        with self._lock, self._conn:
+            for start in range(0, len(keys), _MAX_VARS):
+                batch = keys[start:start + _MAX_VARS]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created, accessed FROM cache WHERE key IN ({marks})", batch
+                ).fetchall()
+                touched = []
+                for k, v, created, accessed in rows:
+                    if oldest is None or created >= oldest:
+                        found[k] = v
+                        if accessed < untouched:
+                            touched.append((now, k))
+                # No write (and no write lock) unless an access time is stale
+                if touched:
+                    self._conn.executemany("UPDATE cache SET accessed = ? WHERE key = ?", touched)
+
+        self.stats.record(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def set(self, key: str, value: bytes):
+        """Store ``value`` under ``key``."""
+        self.set_many([(key, value)])
+
+    def set_many(self, items: Iterable[Tuple[str, bytes]]):
+        """Store several entries at once, evicting old entries if needed."""
+        now = time.time()
+        rows: List[Tuple[str, bytes, float, float]] = [
+            (key, sqlite3.Binary(value), now, now) for key, value in items
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", rows)
+            self._count += len(rows)
+            if self._count > self.max_entries:
+                self._evict()
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._count -= self._conn.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+            self._count = 0
+        self.stats.reset()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def _evict(self):
+        # Caller holds the lock and an open transaction. Runs once the
+        # in-memory count passes max_entries; the real count may be lower
+        # (replaced keys) or higher (other processes' inserts).
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.max_entries:
+            # Trim to 90% so eviction doesn't run on every insert
+            excess = count - int(self.max_entries * 0.9)
+            count -= self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed ASC LIMIT ?)",
+                (excess,),
+            ).rowcount
+        self._count = count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
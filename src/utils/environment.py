@@ -1,6 +1,10 @@
 import os
 from dotenv import load_dotenv
 
+from .instrumentation import get_logger
+
+logger = get_logger(__name__)
+
 def setup_environment():
     load_dotenv()
 
@@ -17,4 +21,4 @@ def set_env_st(env_var: str, value: str):
     if env_var in os.environ:
         del os.environ[env_var]
     os.environ[env_var] = value
-    print(f"{env_var}: {value} {'•' * 10}")  # Hide actual key values
\ No newline at end of file
+    logger.info(f"{env_var}: {'•' * 10}")  # Hide actual key values
\ No newline at end of file
@@ -0,0 +1,68 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialized
+    fcntl = None
+
+_locks: Dict[str, "FileLock"] = {}
+_locks_guard = threading.Lock()
+
+
+class FileLock:
+    """
+    Exclusive lock shared by the threads of this process and by other
+    processes (``flock`` on ``path``), e.g. API workers sharing one cache.
+
+    Re-entrant within a thread, so a locked method may call another one.
+    Use ``file_lock(path)`` to get the process-wide lock for a path.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._lock.acquire()
+        self._depth += 1
+        if self._depth == 1 and fcntl is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def file_lock(path: Path) -> FileLock:
+    """Return the process-wide lock for ``path``."""
+    key = str(Path(path).resolve())
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = FileLock(Path(key))
+            _locks[key] = lock
+        return lock
+
+
+def temp_path(path: Path) -> Path:
+    """Temporary sibling of ``path`` private to this process, for atomic replaces."""
+    path = Path(path)
+    return path.with_name(f"{path.name}.{os.getpid()}.tmp")
@@ -0,0 +1,438 @@
+import contextvars
+import inspect
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+from .settings import get_bool, get_str
+
+LOG_LEVEL = get_str("CRAG_LOG_LEVEL", "INFO")
+# One JSON object per log line instead of plain text
+LOG_JSON = get_bool("CRAG_LOG_JSON", False)
+# Directory receiving one JSON trace per request (traces-YYYYMMDD.jsonl)
+TRACE_DIR = get_str("CRAG_TRACE_DIR")
+# USD per 1K tokens as [prompt, completion], by model name prefix; the
+# longest matching prefix wins. CRAG_MODEL_PRICES (JSON) adds or overrides.
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "text-embedding-ada-002": (0.0001, 0.0),
+    "text-embedding-3-small": (0.00002, 0.0),
+    "text-embedding-3-large": (0.00013, 0.0),
+}
+MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(get_str("CRAG_MODEL_PRICES", "{}")).items()})
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("crag_trace", default=None)
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        trace = _current_trace.get()
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if trace is not None:
+            entry["trace_id"] = trace.id
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger for a module (``get_logger(__name__)``), under the "crag" logger.
+
+    The "crag" logger writes to stdout at CRAG_LOG_LEVEL, as plain text or,
+    with CRAG_LOG_JSON, as one JSON object per line carrying the trace ID.
+    """
+    global _configured
+    with _configure_lock:
+        if not _configured:
+            handler = logging.StreamHandler(sys.stdout)
+            if LOG_JSON:
+                handler.setFormatter(_JsonFormatter())
+            else:
+                handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+            root = logging.getLogger("crag")
+            root.addHandler(handler)
+            root.setLevel(LOG_LEVEL.upper())
+            root.propagate = False
+            _configured = True
+    return logging.getLogger(f"crag.{name.rsplit('.', 1)[-1]}")
+
+
+logger = get_logger(__name__)
+
+
+def price(model: Optional[str], prompt_tokens: int, completion_tokens: int = 0) -> float:
+    """Estimated cost in USD of a model call; 0 for unknown models."""
+    if not model:
+        return 0.0
+    matches = [prefix for prefix in MODEL_PRICES if model.startswith(prefix)]
+    if not matches:
+        return 0.0
+    prompt_price, completion_price = MODEL_PRICES[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+class Trace:
+    """
+    Record of one question: node and call spans, LLM calls with their
+    tokens and cost, cache hits and misses, and the branch taken.
+
+    The trace of the running request is held in a context variable, so
+    everything called while answering (including grader threads started
+    with a copied context) adds to it.
+    """
+
+    def __init__(self, question: str):
+        self.id = uuid.uuid4().hex
+        self.question = question
+        self.started = time.time()
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.branch: Optional[str] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.llm_calls: List[Dict[str, Any]] = []
+        self.caches: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, kind: str, start: float, seconds: float, **attrs):
+        with self._lock:
+            self.spans.append(
+                {"name": name, "kind": kind, "start": round(start - self._t0, 4), "seconds": round(seconds, 4), **attrs}
+            )
+
+    def add_llm_call(self, call: Dict[str, Any]):
+        with self._lock:
+            self.llm_calls.append(call)
+
+    def add_cache(self, name: str, hits: int, misses: int):
+        with self._lock:
+            self.caches[name]["hits"] += hits
+            self.caches[name]["misses"] += misses
+
+    def totals(self) -> Dict[str, Any]:
+        # Chat model calls and embedding calls are counted apart; the cost covers both
+        chat = [c for c in self.llm_calls if c["kind"] == "llm"]
+        embedding = [c for c in self.llm_calls if c["kind"] == "embedding"]
+        return {
+            "llm_calls": len(chat),
+            "prompt_tokens": sum(c["prompt_tokens"] for c in chat),
+            "completion_tokens": sum(c["completion_tokens"] for c in chat),
+            "embedding_calls": len(embedding),
+            "embedding_tokens": sum(c["prompt_tokens"] for c in embedding),
+            "cost_usd": round(sum(c["cost_usd"] for c in self.llm_calls), 6),
+        }
+
+    def node_seconds(self) -> Dict[str, float]:
+        seconds: Dict[str, float] = defaultdict(float)
+        for span in self.spans:
+            if span["kind"] == "node":
+                seconds[span["name"]] += span["seconds"]
+        return {name: round(value, 4) for name, value in seconds.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "trace_id": self.id,
+                "question": self.question,
+                "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+                "seconds": self.seconds,
+                "error": self.error,
+                "branch": self.branch,
+                **self.totals(),
+                "nodes": self.node_seconds(),
+                "caches": dict(self.caches),
+                "spans": list(self.spans),
+                "llm": list(self.llm_calls),
+            }
+
+
+class Metrics:
+    """Process-wide aggregates of every trace and call, for the /metrics endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.request_seconds = 0.0
+            # name -> [count, total seconds, max seconds]
+            self.nodes: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+            self.calls: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+            # model -> calls, prompt/completion tokens, cost, seconds
+            self.llm: Dict[str, Dict[str, float]] = defaultdict(
+                lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "seconds": 0.0}
+            )
+            self.caches: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+            self.branches: Dict[str, int] = defaultdict(int)
+
+    def record_request(self, seconds: float, error: bool):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.request_seconds += seconds
+
+    def record_span(self, name: str, kind: str, seconds: float):
+        with self._lock:
+            stats = (self.nodes if kind == "node" else self.calls)[name]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def record_llm_call(self, call: Dict[str, Any]):
+        with self._lock:
+            stats = self.llm[call["model"] or "unknown"]
+            stats["calls"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "cost_usd", "seconds"):
+                stats[key] += call[key]
+
+    def record_cache(self, name: str, hits: int, misses: int):
+        with self._lock:
+            self.caches[name]["hits"] += hits
+            self.caches[name]["misses"] += misses
+
+    def record_branch(self, branch: str):
+        with self._lock:
+            self.branches[branch] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        def spans(table):
+            return {name: {"count": c, "seconds": round(s, 4), "max_seconds": round(m, 4)} for name, (c, s, m) in table.items()}
+
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "request_seconds": round(self.request_seconds, 4),
+                "nodes": spans(self.nodes),
+                "calls": spans(self.calls),
+                "llm": {model: dict(stats) for model, stats in self.llm.items()},
+                "caches": {name: dict(stats) for name, stats in self.caches.items()},
+                "branches": dict(self.branches),
+            }
+
+    def prometheus(self) -> str:
+        """The snapshot in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = [
+            "# TYPE crag_requests_total counter",
+            f"crag_requests_total {snap['requests']}",
+            "# TYPE crag_request_errors_total counter",
+            f"crag_request_errors_total {snap['errors']}",
+            "# TYPE crag_request_seconds_total counter",
+            f"crag_request_seconds_total {snap['request_seconds']}",
+        ]
+        for metric, table, label in (("crag_node", snap["nodes"], "node"), ("crag_call", snap["calls"], "call")):
+            lines.append(f"# TYPE {metric}_seconds summary")
+            for name, stats in table.items():
+                lines.append(f'{metric}_seconds_count{{{label}="{name}"}} {stats["count"]}')
+                lines.append(f'{metric}_seconds_sum{{{label}="{name}"}} {stats["seconds"]}')
+            lines.append(f"# TYPE {metric}_seconds_max gauge")
+            for name, stats in table.items():
+                lines.append(f'{metric}_seconds_max{{{label}="{name}"}} {stats["max_seconds"]}')
+        lines.append("# TYPE crag_llm_calls_total counter")
+        for model, stats in snap["llm"].items():
+            lines.append(f'crag_llm_calls_total{{model="{model}"}} {stats["calls"]}')
+        lines.append("# TYPE crag_llm_tokens_total counter")
+        for model, stats in snap["llm"].items():
+            lines.append(f'crag_llm_tokens_total{{model="{model}",type="prompt"}} {stats["prompt_tokens"]}')
+            lines.append(f'crag_llm_tokens_total{{model="{model}",type="completion"}} {stats["completion_tokens"]}')
+        lines.append("# TYPE crag_llm_cost_usd_total counter")
+        for model, stats in snap["llm"].items():
+            lines.append(f'crag_llm_cost_usd_total{{model="{model}"}} {round(stats["cost_usd"], 6)}')
+        lines.append("# TYPE crag_cache_requests_total counter")
+        for name, stats in snap["caches"].items():
+            lines.append(f'crag_cache_requests_total{{cache="{name}",result="hit"}} {stats["hits"]}')
+            lines.append(f'crag_cache_requests_total{{cache="{name}",result="miss"}} {stats["misses"]}')
+        lines.append("# TYPE crag_branch_total counter")
+        for branch, count in snap["branches"].items():
+            lines.append(f'crag_branch_total{{branch="{branch}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def traced(question: str) -> Iterator[Trace]:
+    """
+    Trace one question: the trace is current inside the block, then it is
+    finished, logged, added to ``metrics`` and written to CRAG_TRACE_DIR.
+    """
+    trace = Trace(question)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except Exception as e:
+        trace.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # Generator closed from another context (e.g. a dropped stream)
+            _current_trace.set(None)
+        trace.seconds = round(time.perf_counter() - trace._t0, 4)
+        metrics.record_request(trace.seconds, trace.error is not None)
+        totals = trace.totals()
+        logger.info(
+            f"---TRACE {trace.id}: {trace.seconds:.2f}s, {totals['llm_calls']} LLM CALLS, "
+            f"{totals['prompt_tokens']}+{totals['completion_tokens']} TOKENS, "
+            f"${totals['cost_usd']:.4f}, BRANCH {trace.branch}---"
+        )
+        if TRACE_DIR:
+            write_trace(trace, Path(TRACE_DIR))
+
+
+def write_trace(trace: Trace, directory: Path):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"traces-{datetime.now(timezone.utc):%Y%m%d}.jsonl"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(trace.to_dict()) + "\n")
+
+
+@contextmanager
+def span(name: str, kind: str = "call", **attrs):
+    """Time a block as a span of the current trace and in ``metrics``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.record_span(name, kind, seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, kind, start, seconds, **attrs)
+
+
+def instrument_node(name: str, node):
+    """Wrap a graph node (sync or async) so each run is a "node" span."""
+    if inspect.iscoroutinefunction(node):
+
+        @wraps(node)
+        async def run_async(state):
+            with span(name, "node"):
+                return await node(state)
+
+        return run_async
+
+    @wraps(node)
+    def run(state):
+        with span(name, "node"):
+            return node(state)
+
+    return run
+
+
+def record_cache(name: str, hits: int = 0, misses: int = 0):
+    """Count cache hits and misses in the current trace and ``metrics``."""
+    metrics.record_cache(name, hits, misses)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_cache(name, hits, misses)
+
+
+def record_branch(branch: str):
+    """Record the route taken after grading."""
+    metrics.record_branch(branch)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.branch = branch
+
+
+def record_llm_call(model: Optional[str], prompt_tokens: int, completion_tokens: int, seconds: float, kind: str = "llm"):
+    call = {
+        "kind": kind,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost_usd": round(price(model, prompt_tokens, completion_tokens), 6),
+        "seconds": round(seconds, 4),
+    }
+    metrics.record_llm_call(call)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_llm_call(call)
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback recording every chat model call: model, latency and
+    token usage (``usage_metadata``, also sent when streaming with
+    ``stream_usage``). Installed for every run through a configure hook.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs: Dict[Any, Tuple[float, Optional[str]]] = {}
+
+    def _start(self, run_id, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model")
+        with self._lock:
+            self._runs[run_id] = (time.perf_counter(), model)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            started, model = self._runs.pop(run_id, (time.perf_counter(), None))
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+                if message is not None:
+                    model = message.response_metadata.get("model_name") or model
+        if not prompt_tokens and response.llm_output:
+            usage = response.llm_output.get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            model = response.llm_output.get("model_name") or model
+        record_llm_call(model, prompt_tokens, completion_tokens, time.perf_counter() - started)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+
+# Every callback manager picks the handler up from this context variable
+_handler: contextvars.ContextVar[Optional[TraceCallbackHandler]] = contextvars.ContextVar(
+    "crag_trace_handler", default=TraceCallbackHandler()
+)
+register_configure_hook(_handler, inheritable=True)
@@ -0,0 +1,47 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+
+def get_project_root() -> Path:
+    """Get the project root directory in a platform-agnostic way."""
+    # Go up twice: utils -> src -> project_root
+    return Path(__file__).parent.parent.parent
+
+
+def get_str(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Read a string setting from the environment."""
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def get_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment."""
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def get_float(name: str, default: float) -> float:
+    """Read a float setting from the environment."""
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def get_bool(name: str, default: bool) -> bool:
+    """Read a boolean setting ("1", "true", "yes", "on") from the environment."""
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_data_dir() -> Path:
+    """Directory holding the PDF corpus (CRAG_DATA_DIR, default <root>/data)."""
+    return Path(get_str("CRAG_DATA_DIR", str(get_project_root() / "data")))
+
+
+def get_cache_dir() -> Path:
+    """Directory for on-disk caches (CRAG_CACHE_DIR, default <root>/.crag_cache)."""
+    cache_dir = Path(get_str("CRAG_CACHE_DIR", str(get_project_root() / ".crag_cache")))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
@@ -0,0 +1,122 @@
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import batch
+
+
+def write_lines(path: Path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+def read_records(path: Path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+class ReadQuestionsTest(unittest.TestCase):
+    def test_ids_default_to_line_numbers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "questions.jsonl"
+            write_lines(path, ['{"question": "a"}', "", '{"id": "x", "question": "b"}', "not json", "[1]"])
+            questions = batch.read_questions(path)
+        self.assertEqual(questions, [
+            {"question": "a", "id": 1},
+            {"id": "x", "question": "b"},
+            {"id": 4},
+            {"id": 5},
+        ])
+
+
+class AnsweredIdsTest(unittest.TestCase):
+    def test_only_answered_records_count(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "answers.jsonl"
+            self.assertEqual(batch.answered_ids(path), set())
+            write_lines(path, [
+                '{"id": 1, "answer": "yes"}',
+                '{"id": 2, "error": "RuntimeError: boom"}',
+                '{"id": "x", "answer": "no"}',
+                '{"id": 3, "ans',
+            ])
+            self.assertEqual(batch.answered_ids(path), {"1", "x"})
+
+
+class ResumeTest(unittest.TestCase):
+    """Runs ``main`` twice over the same output file with a stand-in graph."""
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.input = Path(self._dir.name) / "questions.jsonl"
+        self.output = Path(self._dir.name) / "answers.jsonl"
+        write_lines(self.input, [json.dumps({"id": i, "question": f"q{i}"}) for i in range(6)])
+        self.asked = []
+        self.failing = {"q2", "q4"}
+
+        async def astream_answer(graph, question, config):
+            self.asked.append(question)
+            if question in self.failing:
+                raise RuntimeError("model unavailable")
+            yield "answer", f"answer to {question}"
+            yield "trace", {"nodes": {"generate": 0.1}, "llm_calls": 1, "branch": "generate"}
+
+        for name, value in {
+            "setup_environment": mock.DEFAULT,
+            "get_retriever": mock.DEFAULT,
+            "forget_thread": mock.DEFAULT,
+            "build_async_graph": mock.Mock(return_value=(object(), None, None)),
+            "astream_answer": astream_answer,
+        }.items():
+            patcher = mock.patch.object(batch, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def main(self, workers: int = 3):
+        argv = ["batch.py", str(self.input), str(self.output), "--workers", str(workers)]
+        with mock.patch.object(sys, "argv", argv), contextlib.redirect_stdout(io.StringIO()):
+            batch.main()
+
+    def test_rerun_skips_answered_and_retries_failures(self):
+        self.main()
+        records = read_records(self.output)
+        self.assertEqual(sorted(r["id"] for r in records), list(range(6)))
+        self.assertEqual({r["id"] for r in records if "error" in r}, {2, 4})
+        answered = next(r for r in records if r["id"] == 0)
+        self.assertEqual(answered["answer"], "answer to q0")
+        self.assertEqual(answered["timings"], {"generate": 0.1})
+        self.assertEqual(answered["branch"], "generate")
+
+        self.asked.clear()
+        self.failing = {"q4"}
+        self.main()
+        self.assertEqual(sorted(self.asked), ["q2", "q4"])
+        self.assertEqual(batch.answered_ids(self.output), {"0", "1", "2", "3", "5"})
+
+        self.asked.clear()
+        self.failing = set()
+        self.main()
+        self.assertEqual(self.asked, ["q4"])
+        self.assertEqual(batch.answered_ids(self.output), {str(i) for i in range(6)})
+
+        self.asked.clear()
+        self.main()
+        self.assertEqual(self.asked, [])
+        batch.build_async_graph.assert_called()
+
+    def test_interrupted_last_line_is_retried(self):
+        write_lines(self.output, [
+            json.dumps({"id": 0, "answer": "earlier"}),
+            '{"id": 1, "answer": "cut sho',
+        ])
+        self.failing = set()
+        self.main(workers=1)
+        self.assertEqual(self.asked, ["q1", "q2", "q3", "q4", "q5"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.components.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_compound_tokens_keep_their_parts(self):
+        self.assertEqual(tokenize("Part AB-1234, v2.1"), ["part", "ab-1234", "ab", "1234", "v2.1", "v2", "1"])
+
+
+class BM25IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = BM25Index()
+        self.index.add(
+            ["a", "b", "c"],
+            [
+                "the cat sat on the mat",
+                "dogs chase cats in the park",
+                "invoice AB-1234 is overdue",
+            ],
+        )
+
+    def test_ranks_matching_documents(self):
+        results = self.index.search("cat mat", k=3)
+        self.assertEqual([doc_id for doc_id, _ in results], ["a"])
+        self.assertGreater(results[0][1], 0)
+
+    def test_compound_token_search(self):
+        self.assertEqual(self.index.search("AB-1234")[0][0], "c")
+        self.assertEqual(self.index.search("1234")[0][0], "c")
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search("zebra"), [])
+
+    def test_k_limits_results(self):
+        self.assertEqual(len(self.index.search("the", k=1)), 1)
+
+    def test_remove(self):
+        self.index.remove(["a"])
+        self.assertNotIn("a", self.index)
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search("mat"), [])
+
+    def test_add_replaces_existing_id(self):
+        self.index.add(["a"], ["a zebra"])
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.search("mat"), [])
+        self.assertEqual(self.index.search("zebra")[0][0], "a")
+
+    def test_save_and_load_drop_removed_documents(self):
+        self.index.remove(["b"])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "bm25.idx"
+            self.index.save(path)
+            loaded = BM25Index.load(path)
+        self.assertEqual(len(loaded), 2)
+        self.assertNotIn("b", loaded)
+        for query in ("cat mat", "AB-1234", "park"):
+            self.assertEqual(loaded.search(query), self.index.search(query))
+
+    def test_load_rejects_other_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "bm25.idx"
+            path.write_bytes(b"not an index")
+            with self.assertRaises(ValueError):
+                BM25Index.load(path)
+
+
+class ReciprocalRankFusionTest(unittest.TestCase):
+    def test_scores_sum_over_rankings(self):
+        fused = dict(reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60))
+        self.assertAlmostEqual(fused["a"], 1 / 61)
+        self.assertAlmostEqual(fused["b"], 1 / 62 + 1 / 61)
+        self.assertAlmostEqual(fused["c"], 1 / 62)
+
+    def test_documents_in_both_rankings_come_first(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=60)
+        self.assertEqual([doc_id for doc_id, _ in fused], ["c", "a", "b", "d"])
+
+    def test_empty(self):
+        self.assertEqual(reciprocal_rank_fusion([]), [])
+        self.assertEqual(reciprocal_rank_fusion([[], []]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from langchain.schema import Document
+
+from src.components.context import deduplicate, pack_context, relevance
+from src.components.splitter import TokenCounter
+
+
+class WordEncoding:
+    """One token per whitespace-separated word; stands in for tiktoken offline."""
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts, num_threads=None):
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+def doc(text, words=10, **metadata):
+    return Document(page_content=" ".join([text] + [f"{text}{i}" for i in range(words - 1)]), metadata=metadata)
+
+
+def first_words(packed):
+    return [d.page_content.split()[0] for d in packed.documents]
+
+
+class PackContextTest(unittest.TestCase):
+    def setUp(self):
+        self.counter = TokenCounter(WordEncoding())
+
+    def pack(self, documents, **kwargs):
+        kwargs.setdefault("max_tokens", 1000)
+        kwargs.setdefault("min_tokens", 3)
+        return pack_context(documents, counter=self.counter, **kwargs)
+
+    def test_relevance_prefers_rrf_score(self):
+        self.assertEqual(relevance(doc("a", rrf_score=0.2, similarity=0.9)), 0.2)
+        self.assertEqual(relevance(doc("a", similarity=0.9)), 0.9)
+        self.assertIsNone(relevance(doc("a")))
+
+    def test_unscored_documents_come_first_then_by_score(self):
+        documents = [doc("low", rrf_score=0.1), doc("web1"), doc("high", rrf_score=0.9), doc("web2")]
+        packed = self.pack(documents)
+        self.assertEqual(first_words(packed), ["web1", "web2", "high", "low"])
+        self.assertEqual(packed.text.split("\n\n")[0], documents[1].page_content)
+
+    def test_unscored_last_when_disabled(self):
+        documents = [doc("low", rrf_score=0.1), doc("web1"), doc("high", rrf_score=0.9), doc("web2")]
+        packed = self.pack(documents, unscored_first=False)
+        self.assertEqual(first_words(packed), ["high", "low", "web1", "web2"])
+
+    def test_budget_truncates_then_drops(self):
+        documents = [doc("a", rrf_score=0.9), doc("b", rrf_score=0.8), doc("c", rrf_score=0.7)]
+        packed = self.pack(documents, max_tokens=15)
+        self.assertEqual(first_words(packed), ["a", "b"])
+        self.assertEqual(packed.tokens, 15)
+        self.assertEqual(packed.total_tokens, 30)
+        self.assertEqual(packed.saved, 15)
+        self.assertEqual(packed.truncated, 1)
+        self.assertEqual(packed.dropped, 1)
+        self.assertEqual(len(packed.text.split("\n\n")[1].split()), 5)
+
+    def test_remainder_below_min_tokens_is_not_filled(self):
+        documents = [doc("a", rrf_score=0.9), doc("b", rrf_score=0.8)]
+        packed = self.pack(documents, max_tokens=12, min_tokens=3)
+        self.assertEqual(first_words(packed), ["a"])
+        self.assertEqual(packed.truncated, 0)
+        self.assertEqual(packed.dropped, 1)
+
+    def test_near_duplicates_are_dropped(self):
+        original = doc("a", words=30, rrf_score=0.9)
+        copy = Document(page_content=original.page_content + " extra", metadata={"rrf_score": 0.5})
+        packed = self.pack([copy, original, doc("b", rrf_score=0.1)])
+        self.assertEqual(packed.duplicates, 1)
+        self.assertIs(packed.documents[0], original)
+        self.assertEqual(first_words(packed), ["a", "b"])
+
+    def test_blank_documents_are_ignored(self):
+        packed = self.pack([Document(page_content="  \n"), doc("a", rrf_score=0.5)])
+        self.assertEqual(first_words(packed), ["a"])
+        self.assertEqual(packed.total_tokens, 10)
+
+    def test_deduplicate_keeps_first_of_each_group(self):
+        a, b = doc("a", words=20), doc("b", words=20)
+        self.assertEqual(deduplicate([a, b, a], threshold=0.9), [a, b])
+
+
+if __name__ == "__main__":
+    unittest.main()
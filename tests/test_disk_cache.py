@@ -0,0 +1,76 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from src.utils.disk_cache import DiskCache
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = Path(self._dir.name) / "cache.sqlite"
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def open(self, **kwargs) -> DiskCache:
+        cache = DiskCache(self.path, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_round_trip(self):
+        cache = self.open()
+        cache.set_many([("a", b"1"), ("b", b"2")])
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": b"1", "b": b"2"})
+        self.assertEqual(cache.get("a"), b"1")
+        self.assertIsNone(cache.get("c"))
+        self.assertEqual(cache.stats.hits, 3)
+        self.assertEqual(cache.stats.misses, 2)
+
+    def test_evicts_least_recently_used_down_to_90_percent(self):
+        cache = self.open(max_entries=10, touch_interval=0.0)
+        cache.set_many((f"k{i}", b"v") for i in range(10))
+        time.sleep(0.01)
+        # Reading k0..k4 makes k5..k9 the least recently used
+        cache.get_many(f"k{i}" for i in range(5))
+        cache.set("new", b"v")
+        self.assertEqual(len(cache), 9)
+        self.assertEqual(set(cache.get_many(f"k{i}" for i in range(5))), {f"k{i}" for i in range(5)})
+        self.assertEqual(cache.get_many(["k5", "k6"]), {})
+        self.assertEqual(cache.get("new"), b"v")
+
+    def test_replaced_keys_do_not_evict(self):
+        cache = self.open(max_entries=5)
+        for _ in range(4):
+            cache.set_many((f"k{i}", b"v") for i in range(5))
+        self.assertEqual(len(cache), 5)
+        self.assertEqual(len(cache.get_many(f"k{i}" for i in range(5))), 5)
+
+    def test_count_survives_reopen(self):
+        cache = self.open(max_entries=10)
+        cache.set_many((f"k{i}", b"v") for i in range(10))
+        cache.close()
+        cache = self.open(max_entries=10)
+        cache.set("extra", b"v")
+        self.assertEqual(len(cache), 9)
+
+    def test_expired_entries_are_missing(self):
+        cache = self.open(ttl=0.05)
+        cache.set("a", b"1")
+        self.assertEqual(cache.get("a"), b"1")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+
+    def test_delete_and_clear(self):
+        cache = self.open()
+        cache.set_many([("a", b"1"), ("b", b"2")])
+        cache.delete("a")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
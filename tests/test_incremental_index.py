@@ -0,0 +1,150 @@
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+
+from langchain.schema import Document
+from langchain_core.embeddings import FakeEmbeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.components.incremental_index import IncrementalIndex, chunk_id, file_hash
+from src.components.numpy_store import NumpyVectorStore
+
+
+def write_pdf(path: Path, pages: List[str]):
+    """Write a minimal PDF with one line of Helvetica text per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>"
+        % (b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(len(pages))), len(pages)),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        stream = b"BT /F1 10 Tf 20 800 Td (%s) Tj ET" % text.encode("latin-1")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * i)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    data, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(data)
+
+
+class FlakyEmbeddings(FakeEmbeddings):
+    """Fails the ``fail_at``-th embed_documents call."""
+
+    calls: int = 0
+    fail_at: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise RuntimeError("embedding service down")
+        return super().embed_documents(texts)
+
+
+class ChunkIdTest(unittest.TestCase):
+    def test_deterministic(self):
+        self.assertEqual(chunk_id("ab" * 32, 2, 5, "/data/a.pdf"), chunk_id("ab" * 32, 2, 5, "/data/a.pdf"))
+
+    def test_distinct_per_position_and_path(self):
+        digest = "ab" * 32
+        ids = {
+            chunk_id(digest, 0, 0, "/data/a.pdf"),
+            chunk_id(digest, 0, 1, "/data/a.pdf"),
+            chunk_id(digest, 1, 0, "/data/a.pdf"),
+            chunk_id(digest, 0, 0, "/data/copy.pdf"),
+            chunk_id("cd" * 32, 0, 0, "/data/a.pdf"),
+        }
+        self.assertEqual(len(ids), 5)
+
+
+class IncrementalIndexTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self._dir.name)
+        self.embeddings = FlakyEmbeddings(size=8)
+        self.index = IncrementalIndex(
+            NumpyVectorStore(self.embeddings), RecursiveCharacterTextSplitter(chunk_size=40, chunk_overlap=0)
+        )
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def pdf(self, name: str, pages: List[str]) -> Path:
+        path = self.dir / name
+        write_pdf(path, pages)
+        return path
+
+    def chunk_ids(self, path: Path) -> List[str]:
+        return self.index.files[str(path.resolve())].chunk_ids
+
+    def test_split_pages_ids_follow_content_path_and_position(self):
+        pages = [Document(page_content="alpha beta gamma " * 6, metadata={"page": 3})]
+        first = list(self.index._split_pages("/data/a.pdf", "ab" * 32, pages))
+        again = list(self.index._split_pages("/data/a.pdf", "ab" * 32, pages))
+        other = list(self.index._split_pages("/data/b.pdf", "ab" * 32, pages))
+        ids = [c.metadata["chunk_id"] for c in first]
+        self.assertGreater(len(ids), 1)
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ids, [c.metadata["chunk_id"] for c in again])
+        self.assertTrue(set(ids).isdisjoint(c.metadata["chunk_id"] for c in other))
+        self.assertTrue(all(i.split(":")[2] == "3" for i in ids))
+
+    def test_readding_unchanged_file_is_a_no_op(self):
+        path = self.pdf("a.pdf", ["alpha beta gamma delta epsilon zeta eta theta iota kappa"])
+        written = self.index.add_file(path)
+        ids = self.chunk_ids(path)
+        self.assertEqual(written, len(ids))
+        self.assertTrue(all(i.startswith(file_hash(path)[:16]) for i in ids))
+        self.assertEqual(self.index.add_file(path), 0)
+        self.assertEqual(self.chunk_ids(path), ids)
+        self.assertEqual(len(self.index.vectorstore), len(ids))
+
+    def test_copies_keep_separate_chunks(self):
+        a = self.pdf("a.pdf", ["alpha beta gamma delta epsilon zeta eta theta iota kappa"])
+        b = self.pdf("b.pdf", ["alpha beta gamma delta epsilon zeta eta theta iota kappa"])
+        self.index.add_file(a)
+        self.index.add_file(b)
+        self.assertTrue(set(self.chunk_ids(a)).isdisjoint(self.chunk_ids(b)))
+        self.index.remove_file(a)
+        self.assertEqual(len(self.index.vectorstore), len(self.chunk_ids(b)))
+        self.assertEqual(len(self.index.bm25), len(self.chunk_ids(b)))
+
+    def test_changed_file_drops_stale_chunks(self):
+        path = self.pdf("a.pdf", ["alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu"])
+        self.index.add_file(path)
+        old = set(self.chunk_ids(path))
+        write_pdf(path, ["short page"])
+        self.index.replace_file(path)
+        new = set(self.chunk_ids(path))
+        self.assertTrue(old.isdisjoint(new))
+        self.assertEqual(len(self.index.vectorstore), len(new))
+        self.assertEqual(len(self.index.bm25), len(new))
+
+    def test_failed_ingestion_rolls_back(self):
+        kept = self.pdf("a.pdf", ["alpha beta gamma delta epsilon zeta eta theta iota kappa"])
+        self.index.add_file(kept)
+        before = len(self.index.vectorstore)
+        written, add = [], self.index.bm25.add
+        self.index.bm25.add = lambda ids, texts: (written.extend(ids), add(ids, texts))
+        # One chunk per batch: the first batch is written before the second fails
+        self.embeddings.calls, self.embeddings.fail_at = 0, 2
+        failing = self.pdf("b.pdf", ["nu xi omicron pi rho sigma tau upsilon", "phi chi psi omega"])
+        with self.assertRaises(RuntimeError):
+            self.index.add_files([failing], batch_size=1, max_workers=1, on_progress=None)
+        self.assertEqual(len(written), 1)
+        self.assertEqual(len(self.index.vectorstore), before)
+        self.assertEqual(len(self.index.bm25), before)
+        self.assertEqual(list(self.index.files), [str(kept.resolve())])
+
+
+if __name__ == "__main__":
+    unittest.main()